@@ -1,6 +1,7 @@
 # app.py
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import sys
 import threading
 import logging
 
@@ -8,10 +9,12 @@ import logging
 from state_manager import state_manager, ErrorType
 from config_manager import config_manager
 from decorators import validate_json_request, check_processing_status, handle_exceptions
-from certificate_automation import CertificateAutomation
-from db_operations import add_certification_record
+# certificate_automation（selenium、onnxruntime、cv2、win32print）和 db_operations（SQLAlchemy）
+# 在首次使用时才导入，Flask 启动后可以立即响应 /api/system_status
 
 app = Flask(__name__)
+# 限制请求体大小，超出时返回 413
+app.config['MAX_CONTENT_LENGTH'] = config_manager.captcha_upload_limits['max_bytes']
 CORS(app)
 
 # 配置日志
@@ -38,7 +41,18 @@ class CertificationService:
     """证件处理服务类"""
     
     def __init__(self):
-        self.automation = CertificateAutomation()  # 初始化自动化处理类，后续所有浏览器操作均通过该实例
+        self._automation = None
+        self._automation_lock = threading.Lock()
+
+    @property
+    def automation(self):
+        """自动化处理类实例，后续所有浏览器操作均通过该实例；首次访问时才导入浏览器和验证码模块"""
+        if self._automation is None:
+            with self._automation_lock:
+                if self._automation is None:
+                    from certificate_automation import CertificateAutomation
+                    self._automation = CertificateAutomation()
+        return self._automation
     
     def process_certification(self, username: str, password: str) -> None:
         """处理证件申请"""
@@ -95,6 +109,8 @@ class CertificationService:
         state = state_manager.get_state()
         
         try:
+            from db_operations import add_certification_record
+
             error_message = f"{state.error_type.value}:{state.error_message}" if state.error_type != ErrorType.NONE else ""
             
             add_certification_record(
@@ -110,6 +126,45 @@ class CertificationService:
 # 创建服务实例
 certification_service = CertificationService()
 
+def preload_captcha_models(warmup: bool = True):
+    """应用会话参数和结果缓存配置，并预加载、预热验证码模型，避免首次登录时才加载模型"""
+    try:
+        from captcha_recognizer.cache import result_cache
+        from captcha_recognizer.model_registry import model_registry
+        from captcha_recognizer.session import registry
+
+        registry.configure(**config_manager.ort_session_options)
+        model_registry.configure(**config_manager.model_registry_options)
+        if config_manager.result_cache_enabled:
+            result_cache.configure(**config_manager.result_cache_options)
+        if config_manager.captcha_workers > 0:
+            # 工作进程启动时各自加载并预热模型
+            from captcha_recognizer.workers import get_pool
+            get_pool(config_manager.captcha_workers, config_manager.slider_options,
+                     config_manager.ort_session_options, config_manager.captcha_worker_timeout)
+        elif warmup:
+            from captcha_recognizer.slider import preload
+            # 预热注册表中的生效模型（可能是之前切换过的模型）
+            slot = model_registry.get('slider-v2', **config_manager.slider_options)
+            preload(warmup=True, model_path=slot.active_path, **config_manager.slider_options)
+    except Exception as e:
+        logger.error(f"验证码模型预加载失败: {str(e)}", exc_info=True)
+
+def preload_in_background(warmup: bool = True):
+    """服务开始响应后在后台导入自动化模块并预加载验证码模型，首次登录不再等待导入"""
+    try:
+        certification_service.automation
+    except Exception as e:
+        logger.error(f"自动化模块加载失败: {str(e)}", exc_info=True)
+    preload_captcha_models(warmup)
+
+def captcha_stats(module_name: str, attribute: str, enabled):
+    """读取验证码模块的统计信息；模块尚未导入时说明还没有识别过，不为此触发导入"""
+    module = sys.modules.get(module_name)
+    if not enabled or module is None:
+        return None
+    return getattr(module, attribute).stats()
+
 def background_task(username: str, password: str):
     """后台任务执行函数"""
     logger.info(f"开始后台处理任务: 用户={username}")
@@ -156,7 +211,9 @@ def corporate_login(data):
         return jsonify({'error': '请先设置document_type'}), 400
     
     # 开始处理任务
-    if not state_manager.start_processing(username, 'corporate', state.document_type):
+    # profile 为 true 时记录本次任务每次验证码识别的性能分析 trace
+    if not state_manager.start_processing(username, 'corporate', state.document_type,
+                                          profile_captcha=bool(data.get('profile', False))):
         return jsonify({'message': '有任务正在处理中，请稍后再试'}), 429
     
     # 启动后台任务
@@ -187,7 +244,9 @@ def individual_login(data):
         return jsonify({'error': '请先设置document_type'}), 400
     
     # 开始处理任务
-    if not state_manager.start_processing(username, 'individual', state.document_type):
+    # profile 为 true 时记录本次任务每次验证码识别的性能分析 trace
+    if not state_manager.start_processing(username, 'individual', state.document_type,
+                                          profile_captcha=bool(data.get('profile', False))):
         return jsonify({'message': '有任务正在处理中，请稍后再试'}), 429
     
     # 启动后台任务
@@ -253,13 +312,209 @@ def system_status():
                 'cert_name': state.cert_name,
                 'trace_id': state.trace_id
             } if state.status.value != 'idle' else None
-        }
+        },
+        'captcha_cache': captcha_stats('captcha_recognizer.cache', 'result_cache',
+                                       config_manager.result_cache_enabled),
+        'captcha_cascade': captcha_stats('captcha_recognizer.cascade', 'cascade_stats',
+                                         config_manager.cascade_calibration),
+        'captcha_ensemble': captcha_stats('captcha_recognizer.ensemble', 'ensemble_stats', True),
+        'captcha_drag': captcha_stats('captcha_recognizer.drag_calibration', 'drag_calibrator', True)
+    }), 200
+
+def read_captcha_image():
+    """从请求中读取验证码图片字节：multipart 的 image 字段、JSON 的 base64 image 字段或原始请求体"""
+    import base64
+
+    upload = request.files.get('image')
+    if upload is not None:
+        return upload.read()
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        encoded = data.get('image') or ''
+        if ',' in encoded and encoded.startswith('data:'):
+            # data:image/png;base64,xxxx
+            encoded = encoded.split(',', 1)[1]
+        try:
+            return base64.b64decode(encoded, validate=True)
+        except ValueError:
+            return b''
+    return request.get_data()
+
+@app.route('/api/captcha/solve', methods=['POST'])
+@handle_exceptions
+def captcha_solve():
+    """验证码缺口识别接口，并发请求在时间窗口内合并成批次推理"""
+    import time
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    from captcha_recognizer.backend import image_size, image_to_array
+    from captcha_recognizer.batcher import QueueFullError, get_batcher
+
+    start = time.perf_counter()
+    image_bytes = read_captcha_image()
+    if not image_bytes:
+        return jsonify({'error': '缺少验证码图片（image 文件、base64 或原始图片字节）'}), 400
+    # 解码前只读文件头检查尺寸，避免解码超大图片
+    size = image_size(image_bytes)
+    if size is None:
+        return jsonify({'error': '无法识别的图片格式（支持 PNG、JPEG、GIF、BMP、WebP）'}), 400
+    max_side = config_manager.captcha_upload_limits['max_side']
+    if max(size) > max_side or min(size) <= 0:
+        return jsonify({'error': f'图片尺寸 {size[0]}x{size[1]} 超出限制（最大边长 {max_side}）'}), 400
+    image = image_to_array(image_bytes)
+    if image is None:
+        return jsonify({'error': '无法解码验证码图片'}), 400
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    if profile_requested():
+        if not config_manager.captcha_profiling['solve_api']:
+            return jsonify({'error': '识别接口未开启性能分析（PROFILE_SOLVE_API）'}), 403
+        return captcha_solve_profiled(image, start, decode_ms)
+
+    cache_key = None
+    if config_manager.result_cache_enabled:
+        from captcha_recognizer.cache import result_cache
+
+        cache_key = result_cache.key(image)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({
+                'box': cached[0],
+                'conf': cached[1],
+                'cached': True,
+                'timing': {'decode_ms': round(decode_ms, 3),
+                           'total_ms': round((time.perf_counter() - start) * 1000, 3)},
+            }), 200
+
+    options = dict(config_manager.captcha_solve_options)
+    timeout = options.pop('timeout')
+    # 批处理器的模型取自模型注册表，首次创建前应用注册表配置
+    get_model_slot('slider-v2')
+    batcher = get_batcher(config_manager.slider_options, **options)
+    try:
+        future = batcher.submit(image)
+    except QueueFullError:
+        return jsonify({'error': '验证码识别队列已满，请稍后再试'}), 429
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        return jsonify({'error': '验证码识别超时'}), 504
+
+    if cache_key is not None:
+        result_cache.put(cache_key, result['box'], result['conf'])
+    result['cached'] = False
+    result['timing']['decode_ms'] = round(decode_ms, 3)
+    result['timing']['total_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return jsonify(result), 200
+
+def profile_requested() -> bool:
+    """请求是否要求性能分析：查询参数 ?profile=1 或 JSON 的 profile 字段"""
+    if request.args.get('profile', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.is_json and bool((request.get_json(silent=True) or {}).get('profile', False))
+
+# 同一时间只处理一个性能分析请求（每次都要新建并预热 ORT 分析会话）
+_solve_profile_slot = threading.Semaphore(1)
+
+def captcha_solve_profiled(image, start: float, decode_ms: float):
+    """
+    单独识别并记录性能分析 trace，不经过结果缓存；在批处理线程中执行，占用批处理队列的容量，
+    队列已满或已有分析请求在处理时返回 429
+    """
+    import time
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    from captcha_recognizer.batcher import QueueFullError, get_batcher
+    from captcha_recognizer.profiling import profile_attempt
+
+    if not _solve_profile_slot.acquire(blocking=False):
+        return jsonify({'error': '已有性能分析请求在处理中，请稍后再试'}), 429
+    options = config_manager.captcha_profiling
+    trace_id = request.headers.get('X-Trace-Id', 'solve')
+
+    def run():
+        try:
+            slot = get_model_slot('slider-v2')
+            with profile_attempt(trace_id, options['trace_dir'], ort=options['ort'],
+                                 max_traces=options['max_traces'], source='api') as profile:
+                box, conf = slot.identify(image)
+                profile.result(box=box, conf=conf, image_shape=list(image.shape))
+            return box, conf, profile.path
+        finally:
+            _solve_profile_slot.release()
+
+    solve_options = dict(config_manager.captcha_solve_options)
+    timeout = solve_options.pop('timeout')
+    try:
+        future = get_batcher(config_manager.slider_options, **solve_options).submit_call(run)
+    except QueueFullError:
+        _solve_profile_slot.release()
+        return jsonify({'error': '验证码识别队列已满，请稍后再试'}), 429
+    try:
+        box, conf, trace_path = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # 已开始执行的分析会在完成后释放名额
+        return jsonify({'error': '验证码识别超时'}), 504
+    return jsonify({
+        'box': [float(v) for v in box],
+        'conf': float(conf),
+        'cached': False,
+        'trace': trace_path,
+        'timing': {'decode_ms': round(decode_ms, 3),
+                   'total_ms': round((time.perf_counter() - start) * 1000, 3)},
     }), 200
 
+@app.route('/api/captcha/stats', methods=['GET'])
+@handle_exceptions
+def captcha_solve_stats():
+    """验证码识别接口的批处理统计和延迟直方图"""
+    batcher = sys.modules.get('captcha_recognizer.batcher')
+    return jsonify({'solve': batcher.batcher_stats() if batcher is not None else None}), 200
+
+def get_model_slot(name: str):
+    from captcha_recognizer.model_registry import model_registry
+
+    model_registry.configure(**config_manager.model_registry_options)
+    options = config_manager.slider_options if name == 'slider-v2' else {}
+    return model_registry.get(name, **options)
+
+@app.route('/api/models', methods=['GET'])
+@handle_exceptions
+def models_status():
+    """验证码模型注册表状态：生效模型、候选模型和影子评估统计"""
+    registry = sys.modules.get('captcha_recognizer.model_registry')
+    return jsonify(registry.model_registry.status() if registry is not None else {}), 200
+
+@app.route('/api/models/<name>/<action>', methods=['POST'])
+@handle_exceptions
+def models_action(name, action):
+    """
+    验证码模型热切换
+    candidate: 加载候选模型并开始影子评估，JSON 参数 path（相对 captcha_recognizer/models）、sample_rate、tolerance
+    promote / rollback / discard: 切换为候选模型 / 切回上一个模型 / 丢弃候选模型
+    """
+    if action not in ('candidate', 'promote', 'rollback', 'discard'):
+        return jsonify({'error': f'无效的操作: {action}'}), 404
+    try:
+        slot = get_model_slot(name)
+        if action == 'candidate':
+            data = request.get_json(silent=True) or {}
+            if not data.get('path'):
+                return jsonify({'error': '缺少必要参数: path'}), 400
+            status = slot.load_candidate(data['path'], data.get('sample_rate'), data.get('tolerance'))
+        else:
+            status = getattr(slot, action)()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(status), 200
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': '接口不存在'}), 404
 
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': '请求体过大'}), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({'error': '服务器内部错误'}), 500
@@ -272,5 +527,10 @@ if __name__ == '__main__':
     
     # 启动Flask应用
     flask_config = config_manager.flask_config
+
+    # 后台导入自动化模块、预加载验证码模型（debug 模式下只在 reloader 子进程中加载）
+    if not flask_config['debug'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=preload_in_background, args=(config_manager.preload_models,), daemon=True).start()
+
     logger.info(f"启动Flask应用: http://{flask_config['host']}:{flask_config['port']}")
     app.run(**flask_config)
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+验证码模型的推理后端
+
+SliderV2 和 Recognizer 都通过 load_backend 获取后端，同一个模型可以运行在任意后端上:
+    onnxruntime - 共享 SessionRegistry 中的 InferenceSession（支持 IOBinding）
+    cv2         - cv2.dnn.readNetFromONNX
+    openvino    - OpenVINO CPU 插件（需要安装 openvino）
+    auto        - 启动时在当前 CPU 上依次计时所有可用后端，选最快的
+"""
+import logging
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from captcha_recognizer import profiling
+from captcha_recognizer.session import get_session
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('onnxruntime', 'cv2', 'openvino')
+
+
+def image_to_array(source: Union[str, Path, bytes, np.ndarray] = None) -> np.ndarray:
+    if isinstance(source, (str, Path)):
+        # 从文件路径读取
+        return cv2.imread(str(source))
+    elif isinstance(source, bytes):
+        # 从字节流读取
+        np_arr = np.frombuffer(source, np.uint8)
+        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    elif isinstance(source, np.ndarray):
+        # 如果已经是 numpy 数组，直接使用
+        return source
+    else:
+        raise TypeError("Unsupported source type. Only str, Path, bytes, or numpy.ndarray are supported.")
+
+
+# JPEG 中带图片尺寸的 SOF 段（C4 / C8 / CC 不是 SOF）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    只读文件头获取图片的 (宽, 高)，不解码像素；支持 PNG / JPEG / GIF / BMP / WebP，其他格式或头部不完整时返回 None
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'BM' and len(data) >= 26:
+        width, height = struct.unpack('<ii', data[18:26])
+        return abs(width), abs(height)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF:
+                i += 1
+            elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # 没有长度字段的标记
+                i += 2
+            elif marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            else:
+                i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+def model_signature(path: str) -> Tuple[Optional[Tuple], Optional[List[str]]]:
+    """读取模型的输入形状（动态维度为 None）和输出名称，未安装 onnx 时返回 (None, None)"""
+    try:
+        import onnx
+    except ImportError:
+        return None, None
+    graph = onnx.load(path, load_external_data=False).graph
+    dims = graph.input[0].type.tensor_type.shape.dim
+    shape = tuple(d.dim_value if d.HasField('dim_value') else None for d in dims)
+    return shape, [output.name for output in graph.output]
+
+
+class Backend:
+    """
+    推理后端接口
+
+    input_shape: 模型输入形状，动态维度为 None（cv2 后端未安装 onnx 时为 None）
+    max_batch: 单次 run 实际支持的最大批次，None 表示按 input_shape 的批次维度
+    run(blob): 输入 NCHW float32 张量，按模型输出顺序返回 numpy 数组列表
+    """
+    name = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.input_shape: Optional[Tuple] = None
+        # 有些导出的模型声明了动态 batch 轴，但图内 Reshape 固定为 1，运行时探测到后改为 1
+        self.max_batch: Optional[int] = None
+
+    def run(self, blob: np.ndarray) -> List[np.ndarray]:
+        raise NotImplementedError
+
+
+class OnnxRuntimeBackend(Backend):
+    name = 'onnxruntime'
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        super().__init__(path)
+        # threads 为 None 时使用会话注册表当前的 intra_op_threads
+        self.session = get_session(path) if threads is None else get_session(path, intra_op_threads=threads)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(d if isinstance(d, int) and d > 0 else None for d in model_input.shape)
+
+    def run(self, blob: np.ndarray) -> List[np.ndarray]:
+        session = profiling.session_for(self.path, self.session)
+        return session.run(None, {self.input_name: blob})
+
+
+class Cv2Backend(Backend):
+    name = 'cv2'
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        # cv2.dnn 的线程数是全局设置（cv2.setNumThreads），这里不单独设置
+        super().__init__(path)
+        self.net = cv2.dnn.readNetFromONNX(path)
+        self.input_shape, output_names = model_signature(path)
+        self.output_names = output_names or list(self.net.getUnconnectedOutLayersNames())
+        # cv2.dnn.Net 的 setInput + forward 不是线程安全的
+        self._lock = threading.Lock()
+
+    def run(self, blob: np.ndarray) -> List[np.ndarray]:
+        with self._lock:
+            self.net.setInput(blob)
+            return list(self.net.forward(self.output_names))
+
+
+class OpenVinoBackend(Backend):
+    name = 'openvino'
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        super().__init__(path)
+        import openvino as ov
+
+        core = ov.Core()
+        model = core.read_model(path)
+        self.input_shape = tuple(d.get_length() if d.is_static else None for d in model.inputs[0].get_partial_shape())
+        # threads 为 None 或 0 时由 OpenVINO 决定线程数
+        config = {'INFERENCE_NUM_THREADS': int(threads)} if threads else {}
+        self.model = core.compile_model(model, 'CPU', config)
+        self._outputs = self.model.outputs
+
+    def run(self, blob: np.ndarray) -> List[np.ndarray]:
+        # CompiledModel.__call__ 内部为每次调用创建推理请求，可在多线程中使用
+        results = self.model(blob)
+        return [results[output] for output in self._outputs]
+
+
+BACKEND_CLASSES = {
+    'onnxruntime': OnnxRuntimeBackend,
+    'cv2': Cv2Backend,
+    'openvino': OpenVinoBackend,
+}
+
+_backends: Dict[Tuple[str, str], Backend] = {}
+_auto_choices: Dict[str, str] = {}
+_lock = threading.RLock()
+
+
+def benchmark_backend(backend: Backend, shape: Tuple[int, ...], repeat: int = 5) -> float:
+    """用全零输入计时，返回每次推理的最短耗时（毫秒）"""
+    blob = np.zeros(shape, dtype=np.float32)
+    backend.run(blob)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.run(blob)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def fastest_backend(path: str, shape: Tuple[int, ...], repeat: int = 5, threads: Optional[int] = None) -> Backend:
+    """在当前 CPU 上计时所有可用后端，返回最快的后端"""
+    timings = {}
+    best = None
+    for name in BACKENDS:
+        try:
+            backend = load_backend(path, name, threads=threads)
+            timings[name] = benchmark_backend(backend, shape, repeat)
+        except Exception as e:
+            logger.info(f"推理后端 {name} 不可用: {e}")
+            continue
+        if best is None or timings[name] < timings[best.name]:
+            best = backend
+    if best is None:
+        raise RuntimeError(f"没有可用的推理后端: {path}")
+    logger.info(f"自动选择推理后端 {best.name}: {path}, 耗时(ms): "
+                f"{', '.join(f'{k}={v:.1f}' for k, v in timings.items())}")
+    return best
+
+
+def load_backend(path: str, backend: str = 'onnxruntime', shape: Optional[Tuple[int, ...]] = None,
+                 threads: Optional[int] = None) -> Backend:
+    """
+    获取（必要时创建）指定模型在指定后端上的共享实例
+    :param backend: BACKENDS 之一或 auto
+    :param shape: auto 模式计时用的输入形状，模型输入为动态尺寸时必须提供
+    :param threads: 推理线程数（onnxruntime 的 intra_op_threads / OpenVINO 的 INFERENCE_NUM_THREADS），
+        None 表示使用默认设置；不同线程数各对应一个实例
+    """
+    if backend != 'auto' and backend not in BACKENDS:
+        raise ValueError(f"无效的推理后端: {backend}，可选值: {BACKENDS + ('auto',)}")
+    with _lock:
+        if backend == 'auto':
+            if path in _auto_choices:
+                return load_backend(path, _auto_choices[path], threads=threads)
+            probe = load_backend(path, 'onnxruntime', threads=threads)
+            shape = tuple(d or s for d, s in zip(probe.input_shape, shape)) if shape else probe.input_shape
+            # 动态 batch 按 1 计时
+            shape = (shape[0] or 1,) + tuple(shape[1:])
+            if None in shape:
+                raise ValueError(f"模型输入为动态尺寸，auto 模式需要提供计时用的输入形状: {probe.input_shape}")
+            chosen = fastest_backend(path, shape, threads=threads)
+            _auto_choices[path] = chosen.name
+            return chosen
+
+        if backend == 'onnxruntime':
+            # 会话本身由 SessionRegistry 缓存，每次重新包装以跟随最新的会话参数
+            return OnnxRuntimeBackend(path, threads)
+        key = (os.path.abspath(path), backend, threads)
+        instance = _backends.get(key)
+        if instance is None:
+            instance = _backends[key] = BACKEND_CLASSES[backend](path, threads)
+        return instance
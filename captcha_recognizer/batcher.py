@@ -0,0 +1,284 @@
+"""
+验证码识别的动态微批处理
+
+/api/captcha/solve 的并发请求先进入有界队列，由 consumers 个批处理线程收集：
+第一张图片到达后最多再等待 max_wait_ms 毫秒或凑满 max_batch 张，然后合并成一个批次调用一次
+model.identify_batch。队列已满时 submit 抛出 QueueFullError，由接口返回 429。
+submit_call 提交的函数（例如带性能分析的单次识别）占用同一个队列，由批处理线程单独执行，不参与合批。
+
+模型实际只支持批次 1 时（model.batch_limit == 1，例如图内 Reshape 固定为 1 的 slider-v2.onnx），
+合批没有收益，批处理线程不再等待，直接逐张推理，并发由多个批处理线程提供（ORT 推理时释放 GIL）。
+
+    batcher = MicroBatcher(SliderV2(), max_batch=8, max_wait_ms=5, max_queue=64, consumers=4)
+    future = batcher.submit(image)
+    result = future.result(timeout=10)   # {'box', 'conf', 'timing': {...}}
+"""
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集超出范围的值
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class QueueFullError(RuntimeError):
+    """等待队列已满"""
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图（线程安全），分位数取所在桶的上界"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value_ms
+            self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank and count:
+                    return self.buckets[index] if index < len(self.buckets) else self.max
+            return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.quantile(0.5), self.quantile(0.95), self.quantile(0.99)
+        with self._lock:
+            labels = [f'le_{bucket}' for bucket in self.buckets] + ['inf']
+            return {
+                'count': self.count,
+                'mean_ms': round(self.total / self.count, 3) if self.count else None,
+                'max_ms': round(self.max, 3),
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+                'buckets': dict(zip(labels, self._counts)),
+            }
+
+
+class _Request:
+    __slots__ = ('image', 'call', 'future', 'submitted')
+
+    def __init__(self, image: Optional[np.ndarray], call=None):
+        self.image = image
+        self.call = call
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    把并发的识别请求合并成批次
+
+    :param model: 提供 identify_batch(images) -> [(box, conf), ...] 的模型，例如 SliderV2；
+        可选的 batch_limit 属性为模型单次实际支持的最大批次（None 表示不限）
+    :param max_batch: 单个批次的最大图片数
+    :param max_wait_ms: 第一张图片到达后等待后续图片的最长时间（毫秒）
+    :param max_queue: 等待队列容量，超出时 submit 抛出 QueueFullError
+    :param consumers: 批处理线程数
+    """
+
+    def __init__(self, model, max_batch: int = 8, max_wait_ms: float = 5.0, max_queue: int = 64,
+                 consumers: int = 4):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: 'queue.Queue[Optional[_Request]]' = queue.Queue(maxsize=max(1, max_queue))
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.rejected = 0
+        self.failed_batches = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.queue_latency = LatencyHistogram()
+        self.inference_latency = LatencyHistogram()
+        self.total_latency = LatencyHistogram()
+        self._threads = [threading.Thread(target=self._run, name=f'captcha-batcher-{i}', daemon=True)
+                         for i in range(max(1, consumers))]
+        for thread in self._threads:
+            thread.start()
+
+    def batch_limit(self) -> int:
+        """当前实际使用的最大批次：max_batch 与模型支持的批次中较小的一个"""
+        limit = getattr(self.model, 'batch_limit', None)
+        return min(self.max_batch, limit) if limit else self.max_batch
+
+    def submit(self, image: np.ndarray) -> Future:
+        """提交一张已解码的背景图，返回结果为 {'box', 'conf', 'timing'} 的 Future"""
+        return self._enqueue(_Request(image))
+
+    def submit_call(self, call) -> Future:
+        """提交一个无参数函数，在批处理线程中单独执行，返回结果为其返回值的 Future；与识别请求共用队列容量"""
+        return self._enqueue(_Request(None, call))
+
+    def _enqueue(self, request: _Request) -> Future:
+        if self._closed:
+            raise RuntimeError("验证码批处理已关闭")
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError("验证码识别队列已满")
+        return request.future
+
+    def _collect(self) -> Tuple[List[_Request], bool]:
+        """
+        阻塞到第一张图片到达，然后在等待窗口内尽量凑满一个批次（模型只支持批次 1 时不等待）
+        :return: (batch, stop)，stop 表示取到了关闭标记，处理完本批次后线程退出
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        limit = self.batch_limit()
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < limit:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self) -> None:
+        # 每个批处理线程取到一个关闭标记后退出
+        while True:
+            batch, stop = self._collect()
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            for request in batch:
+                if request.call is not None:
+                    self._call(request)
+            batch = [request for request in batch if request.call is None]
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    @staticmethod
+    def _call(request: _Request) -> None:
+        try:
+            request.future.set_result(request.call())
+        except Exception as e:
+            logger.error(f"验证码批处理线程执行任务失败: {e}", exc_info=True)
+            request.future.set_exception(e)
+
+    def _process(self, batch: List[_Request]) -> None:
+        start = time.perf_counter()
+        try:
+            results = self.model.identify_batch([request.image for request in batch])
+        except Exception as e:
+            with self._stats_lock:
+                self.failed_batches += 1
+            logger.error(f"验证码批量识别失败（{len(batch)} 张）: {e}", exc_info=True)
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        end = time.perf_counter()
+        if len(results) != len(batch):
+            with self._stats_lock:
+                self.failed_batches += 1
+            error = RuntimeError(f"批量识别返回 {len(results)} 个结果，期望 {len(batch)} 个")
+            for request in batch:
+                request.future.set_exception(error)
+            return
+        inference_ms = (end - start) * 1000
+        with self._stats_lock:
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+        self.inference_latency.observe(inference_ms)
+        for request, (box, conf) in zip(batch, results):
+            queue_ms = (start - request.submitted) * 1000
+            total_ms = (end - request.submitted) * 1000
+            self.queue_latency.observe(queue_ms)
+            self.total_latency.observe(total_ms)
+            request.future.set_result({
+                'box': [float(v) for v in box],
+                'conf': float(conf),
+                'timing': {
+                    'queue_ms': round(queue_ms, 3),
+                    'inference_ms': round(inference_ms, 3),
+                    'total_ms': round(total_ms, 3),
+                    'batch_size': len(batch),
+                },
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batch_sizes = dict(self.batch_sizes)
+        batches = sum(batch_sizes.values())
+        return {
+            'max_batch': self.max_batch,
+            'batch_limit': self.batch_limit(),
+            'consumers': len(self._threads),
+            'max_wait_ms': self.max_wait * 1000,
+            'queue_size': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'rejected': self.rejected,
+            'batches': batches,
+            'failed_batches': self.failed_batches,
+            'mean_batch_size': round(sum(size * count for size, count in batch_sizes.items()) / batches, 3)
+            if batches else None,
+            'batch_sizes': dict(sorted(batch_sizes.items())),
+            'queue_latency': self.queue_latency.stats(),
+            'inference_latency': self.inference_latency.stats(),
+            'total_latency': self.total_latency.stats(),
+        }
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        """停止接收新请求，处理完已排队的请求后退出批处理线程"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher(slider_options: Optional[Dict] = None, max_batch: int = 8, max_wait_ms: float = 5.0,
+                max_queue: int = 64, consumers: int = 4) -> MicroBatcher:
+    """获取进程内共享的批处理器，模型取自模型注册表，切换模型后批处理器随之使用新模型"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            from captcha_recognizer.model_registry import model_registry
+
+            slot = model_registry.get('slider-v2', **(slider_options or {}))
+            _batcher = MicroBatcher(slot, max_batch, max_wait_ms, max_queue, consumers)
+        return _batcher
+
+
+def batcher_stats() -> Optional[Dict[str, Any]]:
+    """批处理器统计，尚未创建时返回 None"""
+    return _batcher.stats() if _batcher is not None else None
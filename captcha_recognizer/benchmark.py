@@ -0,0 +1,687 @@
+"""
+验证码模型离线性能对比工具
+
+用法:
+    python -m captcha_recognizer.benchmark batch --images test-image --batch-size 8
+    python -m captcha_recognizer.benchmark masks --images test-image
+    python -m captcha_recognizer.benchmark matcher --images test-image
+    python -m captcha_recognizer.benchmark io --images test-image
+    python -m captcha_recognizer.benchmark shapes --images test-image --shapes 640x640 640x320 640x256
+    python -m captcha_recognizer.benchmark decode --images test-image
+    python -m captcha_recognizer.benchmark backends --images test-image
+    python -m captcha_recognizer.benchmark fused --images test-image
+    python -m captcha_recognizer.benchmark suite --images test-image --labels test-image/labels.json \
+        --models slider-v2 --backends onnxruntime cv2 --imgsz 640x640 --threads 1 4 --output bench.json
+
+suite 的标注文件为 JSON（{"文件名": 缺口x} 或 {"文件名": {"x": 缺口x}}）或 CSV（filename,gap_x 两列，可带表头）。
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_images(images_dir: str, limit: int = 0) -> List[np.ndarray]:
+    """读取目录下的验证码图片（按文件名排序）"""
+    names = sorted(name for name in os.listdir(images_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if limit:
+        names = names[:limit]
+    images = [cv2.imread(os.path.join(images_dir, name)) for name in names]
+    return [image for image in images if image is not None]
+
+
+def load_labels(labels_path: str) -> Dict[str, float]:
+    """读取缺口 x 坐标标注，返回 {文件名: 缺口x}"""
+    if labels_path.lower().endswith('.csv'):
+        labels = {}
+        with open(labels_path, encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 2:
+                    continue
+                try:
+                    labels[row[0].strip()] = float(row[1])
+                except ValueError:
+                    # 表头或无效行
+                    continue
+        return labels
+
+    with open(labels_path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: float(value['x'] if isinstance(value, dict) else value) for name, value in data.items()}
+
+
+def load_labeled_images(images_dir: str, labels_path: str, limit: int = 0) -> List[Tuple[str, np.ndarray, float]]:
+    """读取有标注的验证码图片，返回 [(文件名, 图片, 缺口x)]，按文件名排序"""
+    labels = load_labels(labels_path)
+    names = sorted(name for name in labels if os.path.exists(os.path.join(images_dir, name)))
+    if limit:
+        names = names[:limit]
+    samples = [(name, cv2.imread(os.path.join(images_dir, name)), labels[name]) for name in names]
+    return [(name, image, x) for name, image, x in samples if image is not None]
+
+
+def percentile_ms(seconds: List[float], q: float) -> float:
+    return round(float(np.percentile(seconds, q)) * 1000, 3)
+
+
+def environment_info() -> Dict:
+    """记录运行环境，便于对比不同时间、不同机器的结果"""
+    import onnxruntime as ort
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'onnxruntime': ort.__version__,
+    }
+
+
+def make_identify(model_name: str, backend: str, imgsz: str, threads: int):
+    """按组合构造识别函数，返回 (identify, 实际使用的后端, 实际推理尺寸)"""
+    from captcha_recognizer.session import parse_imgsz
+
+    # onnxruntime / OpenVINO 按线程数各建一个后端实例（Recognizer 单例也按 threads 区分），
+    # cv2.dnn 只能设置全局线程数（-1 恢复默认）
+    cv2.setNumThreads(threads if threads > 0 else -1)
+    if model_name == 'slider-v2':
+        from captcha_recognizer.slider import SliderV2
+
+        model = SliderV2(imgsz=imgsz, backend=backend, threads=threads)
+        return model.identify, model.backend.name, model.imgsz
+
+    from captcha_recognizer.recognizer import Recognizer
+
+    model = Recognizer(imgsz=imgsz, backend=backend, threads=threads)
+    return model.identify_gap, model.model_v1.name, parse_imgsz(imgsz)
+
+
+def run_suite(samples: List[Tuple[str, np.ndarray, float]], models: List[str], backends: List[str],
+              sizes: List[str], threads: List[int], tolerance: float = 3.0) -> Dict:
+    """
+    在有标注的样本上按 模型 × 后端 × 推理尺寸 × 线程数 逐一测试
+
+    每个组合报告单张耗时的 p50/p95/p99、每秒图片数、缺口 x 绝对误差和检出率；
+    无法运行的组合（后端未安装、模型不存在等）记录 error。
+    """
+    images = [image for _, image, _ in samples]
+    truth = np.array([x for _, _, x in samples], dtype=np.float64)
+    results = []
+    for model_name, backend, imgsz, thread_count in itertools.product(models, backends, sizes, threads):
+        result = {'model': model_name, 'backend': backend, 'imgsz': imgsz, 'threads': thread_count}
+        try:
+            identify, backend_name, actual_imgsz = make_identify(model_name, backend, imgsz, thread_count)
+            identify(images[0])
+        except Exception as e:
+            result['error'] = str(e)
+            results.append(result)
+            continue
+
+        seconds, gap_x = [], []
+        for image in images:
+            start = time.perf_counter()
+            box, _ = identify(image)
+            seconds.append(time.perf_counter() - start)
+            gap_x.append(float(box[0]) if box else np.nan)
+
+        gap_x = np.array(gap_x)
+        detected = ~np.isnan(gap_x)
+        errors = np.abs(gap_x[detected] - truth[detected])
+        result.update({
+            'backend_used': backend_name,
+            'imgsz_used': f'{actual_imgsz[1]}x{actual_imgsz[0]}',
+            'images': len(images),
+            'p50_ms': percentile_ms(seconds, 50),
+            'p95_ms': percentile_ms(seconds, 95),
+            'p99_ms': percentile_ms(seconds, 99),
+            'images_per_second': round(len(images) / sum(seconds), 2),
+            'detection_rate': round(float(detected.mean()), 4),
+            'gap_x_mae': round(float(errors.mean()), 3) if errors.size else None,
+            'gap_x_p95_error': round(float(np.percentile(errors, 95)), 3) if errors.size else None,
+            'within_tolerance_rate': round(float((errors <= tolerance).sum()) / len(images), 4),
+        })
+        results.append(result)
+    return {'environment': environment_info(), 'tolerance': tolerance, 'results': results}
+
+
+def compare_batch_throughput(model, images: List[np.ndarray], batch_size: int = 8, repeat: int = 3) -> Dict:
+    """
+    对比逐张 identify 与 identify_batch 的吞吐量
+
+    :param model: SliderV2 实例
+    :param images: 已解码的图片列表
+    :param batch_size: 每批图片数量
+    :param repeat: 重复次数，取最快的一次
+    :return: 两种方式的耗时、吞吐量和结果一致性
+    """
+    # 预热，排除首次推理的初始化开销
+    model.identify(images[0])
+    model.identify_batch(images[:batch_size])
+
+    loop_best = batch_best = float('inf')
+    loop_results = batch_results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loop_results = [model.identify(image) for image in images]
+        loop_best = min(loop_best, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch_results = []
+        for i in range(0, len(images), batch_size):
+            batch_results.extend(model.identify_batch(images[i:i + batch_size]))
+        batch_best = min(batch_best, time.perf_counter() - start)
+
+    mismatches = sum(
+        1 for (box_a, _), (box_b, _) in zip(loop_results, batch_results)
+        if len(box_a) != len(box_b) or (box_a and abs(float(box_a[0]) - float(box_b[0])) > 1e-3)
+    )
+    return {
+        'images': len(images),
+        'batch_size': batch_size,
+        'loop_seconds': round(loop_best, 4),
+        'batch_seconds': round(batch_best, 4),
+        'loop_images_per_second': round(len(images) / loop_best, 2),
+        'batch_images_per_second': round(len(images) / batch_best, 2),
+        'speedup': round(loop_best / batch_best, 3),
+        'mismatches': mismatches,
+    }
+
+
+def compare_lazy_masks(model, images: List[np.ndarray], repeat: int = 3) -> Dict:
+    """
+    对比提前解码掩膜与按需解码掩膜（LazyMasks）的单次识别耗时和内存峰值
+
+    :param model: SliderV2 实例
+    :param images: 已解码的图片列表
+    :param repeat: 重复次数，取最快的一次
+    :return: 两种方式的平均耗时（毫秒）、平均内存峰值（KB）以及需要解码掩膜的图片数
+    """
+
+    def run(image, lazy):
+        results = model.predict(image, imgsz=640, lazy_masks=lazy)
+        boxes, masks = results[0]
+        return model.select_box(boxes, masks), masks
+
+    report = {'images': len(images)}
+    for name, lazy in (('eager', False), ('lazy', True)):
+        run(images[0], lazy)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for image in images:
+                run(image, lazy)
+            best = min(best, time.perf_counter() - start)
+
+        peaks = []
+        resolved = 0
+        for image in images:
+            tracemalloc.start()
+            _, masks = run(image, lazy)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            resolved += int(not lazy or masks.resolved)
+
+        report[name] = {
+            'ms_per_call': round(best / len(images) * 1000, 3),
+            'peak_kb_per_call': round(float(np.mean(peaks)) / 1024, 1),
+            'masks_decoded': resolved,
+        }
+    return report
+
+
+def compare_matchers(model, images: List[np.ndarray], conf: float = 0.25) -> Dict:
+    """
+    在样本图片上对比位图匹配（raster_iou）与多边形匹配（polygon_iou）
+
+    每张图片以 x 最小的检测框为滑块，对其余所有检测框分别用两种方式计算形状 IoU，
+    统计两种方式挑出的缺口是否一致，以及 IoU 的差异和耗时。
+    """
+    from captcha_recognizer.slider import LazyMasks
+
+    report = {'images': len(images), 'compared': 0, 'same_pick': 0, 'iou_abs_diff': [],
+              'polygon_ms': 0.0, 'raster_ms': 0.0}
+    for image in images:
+        boxes, masks = model.predict(image, conf=conf, imgsz=640, lazy_masks=True)[0]
+        if len(boxes) < 3:
+            continue
+        masks = LazyMasks.resolve_masks(masks)
+        slider_index = int(np.argmin(boxes[:, 0]))
+        others = [i for i in range(len(boxes)) if i != slider_index]
+
+        start = time.perf_counter()
+        segments = model.masks_to_segments(masks)
+        polygon = np.array([model.polygon_iou(segments[slider_index], segments[i]) for i in others])
+        report['polygon_ms'] += (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        bitmaps = masks.bitmaps
+        raster = model.raster_iou(bitmaps[slider_index], [bitmaps[i] for i in others])
+        report['raster_ms'] += (time.perf_counter() - start) * 1000
+
+        report['compared'] += 1
+        report['same_pick'] += int(np.argmax(polygon) == np.argmax(raster))
+        report['iou_abs_diff'].extend(np.abs(polygon - raster).tolist())
+
+    diffs = report.pop('iou_abs_diff')
+    compared = max(report['compared'], 1)
+    report.update({
+        'same_pick_rate': round(report['same_pick'] / compared, 4),
+        'iou_abs_diff_mean': round(float(np.mean(diffs)), 4) if diffs else None,
+        'iou_abs_diff_max': round(float(np.max(diffs)), 4) if diffs else None,
+        'polygon_ms': round(report['polygon_ms'] / compared, 3),
+        'raster_ms': round(report['raster_ms'] / compared, 3),
+    })
+    return report
+
+
+def measure_allocations(run, images: List[np.ndarray]) -> Dict:
+    """
+    用 tracemalloc 逐次测量 run(image) 的内存分配
+
+    每次调用单独开启 tracemalloc：peak 为调用期间新分配内存的峰值，
+    retained 为调用结束后仍被返回结果持有的内存（例如 copy_outputs_to_cpu 复制出的数组）。
+    只统计经过 Python/numpy 分配器的内存，ORT 内部的分配不在其中。
+
+    :return: 每次调用的平均峰值（KB）、保留内存（KB）和保留的内存块数
+    """
+    peaks, retained, blocks = [], [], []
+    for image in images:
+        tracemalloc.start()
+        result = run(image)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        del result
+        peaks.append(peak)
+        retained.append(current)
+        blocks.append(sum(stat.count for stat in snapshot.statistics('filename')
+                          if not stat.traceback[0].filename.endswith('tracemalloc.py')))
+    return {
+        'peak_kb_per_call': round(float(np.mean(peaks)) / 1024, 1),
+        'retained_kb_per_call': round(float(np.mean(retained)) / 1024, 1),
+        'retained_blocks_per_call': round(float(np.mean(blocks)), 1),
+    }
+
+
+def compare_io_binding(images: List[np.ndarray], repeat: int = 3, imgsz=(640, 640)) -> Dict:
+    """
+    对比普通推理与 IOBinding 复用缓冲区推理的耗时和内存分配
+
+    分别测量预处理 + 模型推理阶段（inference）和包含后处理的完整识别（identify），
+    内存分配由 measure_allocations 逐次调用测量。
+
+    :return: 两种方式每个阶段每次调用的耗时（毫秒）和内存分配
+    """
+    from captcha_recognizer.slider import SliderV2
+
+    plain = SliderV2(io_binding=False)
+    bound = SliderV2(io_binding=True)
+
+    def run_plain(image):
+        prep_img = plain.preprocess(image, imgsz)
+        return plain.backend.run(prep_img)
+
+    def run_bound(image):
+        return bound.buffers(imgsz).run(image)
+
+    # 同一张图两种方式的输出应一致
+    max_diff = max(float(np.abs(a - b).max()) for a, b in zip(run_plain(images[0]), run_bound(images[0])))
+
+    report = {'images': len(images), 'max_output_diff': max_diff}
+    for name, run, model in (('plain', run_plain, plain), ('io_binding', run_bound, bound)):
+        stages = {}
+        for stage, fn in (('inference', run), ('identify', model.identify)):
+            fn(images[0])
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for image in images:
+                    fn(image)
+                best = min(best, time.perf_counter() - start)
+            stages[stage] = {'ms_per_call': round(best / len(images) * 1000, 3), **measure_allocations(fn, images)}
+        report[name] = stages
+    report['io_binding'].update(bound.buffers(imgsz).stats())
+    return report
+
+
+def compare_shapes(model_name: str, images: List[np.ndarray], shapes: List[str], repeat: int = 3) -> Dict:
+    """
+    对比不同推理尺寸（宽x高）的单张识别耗时和精度
+
+    以第一个尺寸的结果为基准，统计其余尺寸的检出率和缺口 x 坐标误差。
+    模型输入尺寸固定、不支持的尺寸标记为 unsupported。
+
+    :param model_name: slider-v2 或 slider-v1
+    :param shapes: 推理尺寸列表，例如 ['640x640', '640x320']
+    """
+    from captcha_recognizer.session import parse_imgsz
+
+    def make_model(imgsz):
+        if model_name == 'slider-v2':
+            from captcha_recognizer.slider import SliderV2
+
+            model = SliderV2(imgsz=imgsz)
+            return model.identify if model.imgsz == imgsz else None
+
+        from captcha_recognizer.recognizer import Recognizer
+
+        return Recognizer(imgsz=imgsz).identify_gap
+
+    report = {'model': model_name, 'images': len(images), 'reference': shapes[0], 'shapes': {}}
+    reference = None
+    for shape in shapes:
+        imgsz = parse_imgsz(shape)
+        identify = make_model(imgsz)
+        if identify is None:
+            report['shapes'][shape] = {'unsupported': True}
+            continue
+
+        identify(images[0])
+        best = float('inf')
+        results = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = [identify(image) for image in images]
+            best = min(best, time.perf_counter() - start)
+
+        gap_x = [float(box[0]) if box else None for box, _ in results]
+        if reference is None:
+            reference = gap_x
+        errors = [abs(x - ref) for x, ref in zip(gap_x, reference) if x is not None and ref is not None]
+        report['shapes'][shape] = {
+            'input_pixels': imgsz[0] * imgsz[1],
+            'ms_per_call': round(best / len(images) * 1000, 3),
+            'detection_rate': round(sum(x is not None for x in gap_x) / len(images), 4),
+            'gap_x_mean_abs_error': round(float(np.mean(errors)), 3) if errors else None,
+            'gap_x_max_abs_error': round(float(np.max(errors)), 3) if errors else None,
+        }
+    return report
+
+
+def compare_recognizer_decode(outputs: List[np.ndarray], scales: List[float], repeat: int = 3) -> Dict:
+    """
+    对比 Recognizer 逐行解码（decode_loop）与向量化解码（decode）的结果和耗时
+
+    :param outputs: 模型原始输出列表，每个形状为 (1, 4 + nc, N)
+    :param scales: 每个输出对应的缩放比例
+    """
+    from captcha_recognizer.recognizer import Recognizer
+
+    mismatches = sum(
+        Recognizer.decode_loop(output, scale) != Recognizer.decode(output, scale)
+        for output, scale in zip(outputs, scales)
+    )
+    report = {'outputs': len(outputs), 'rows': int(outputs[0].shape[2]), 'mismatches': mismatches}
+    for name, decode in (('loop', Recognizer.decode_loop), ('vectorized', Recognizer.decode)):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for output, scale in zip(outputs, scales):
+                decode(output, scale)
+            best = min(best, time.perf_counter() - start)
+        report[f'{name}_ms_per_call'] = round(best / len(outputs) * 1000, 3)
+    report['speedup'] = round(report['loop_ms_per_call'] / report['vectorized_ms_per_call'], 1)
+    return report
+
+
+def recognizer_outputs(images: List[np.ndarray]):
+    """用 slider-v1 模型生成原始输出；模型不存在时按 416 输入（3549 行、3 类）生成模拟输出"""
+    from captcha_recognizer.recognizer import Recognizer
+    from captcha_recognizer.session import model_path
+
+    if os.path.exists(model_path('slider-v1.onnx')):
+        model = Recognizer()
+        outputs, scales = [], []
+        for image in images:
+            blob, scale = model.preprocess(image, model.imgsz)
+            outputs.append(model.model_v1.run(blob)[0])
+            scales.append(scale)
+        return outputs, scales
+
+    rng = np.random.default_rng(0)
+    outputs = []
+    for _ in range(max(len(images), 1)):
+        xywh = rng.uniform(0, 416, (1, 4, 3549)).astype(np.float32)
+        class_scores = (rng.beta(0.3, 8, (1, 3, 3549))).astype(np.float32)
+        outputs.append(np.concatenate([xywh, class_scores], axis=1))
+    scales = [float(s) for s in rng.uniform(0.5, 2.0, len(outputs))]
+    return outputs, scales
+
+
+def compare_backends(images: List[np.ndarray], repeat: int = 3) -> Dict:
+    """
+    对比 SliderV2 在各推理后端上的单张识别耗时，以及与 onnxruntime 结果的缺口 x 坐标差异
+
+    未安装的后端标记为 unavailable。
+    """
+    from captcha_recognizer.backend import BACKENDS
+    from captcha_recognizer.slider import SliderV2
+
+    report = {'images': len(images), 'backends': {}}
+    reference = None
+    for name in BACKENDS:
+        try:
+            model = SliderV2(backend=name)
+        except Exception as e:
+            report['backends'][name] = {'unavailable': str(e)}
+            continue
+
+        model.identify(images[0])
+        best = float('inf')
+        results = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = [model.identify(image) for image in images]
+            best = min(best, time.perf_counter() - start)
+
+        gap_x = [float(box[0]) if box else None for box, _ in results]
+        reference = gap_x if reference is None else reference
+        errors = [abs(x - ref) for x, ref in zip(gap_x, reference) if x is not None and ref is not None]
+        report['backends'][name] = {
+            'ms_per_call': round(best / len(images) * 1000, 3),
+            'detection_rate': round(sum(x is not None for x in gap_x) / len(images), 4),
+            'gap_x_max_abs_error': round(float(np.max(errors)), 3) if errors else None,
+        }
+    return report
+
+
+def compare_fused(images: List[np.ndarray], repeat: int = 3) -> Dict:
+    """
+    对比 Python 流水线（letterbox、归一化、NMS、框还原）与融合模型的单张耗时和识别结果
+
+    predict_ms 只包含到 NMS 后检测框为止的耗时（掩膜延迟解码），identify_ms 为完整识别耗时。
+    """
+    from captcha_recognizer.slider import SliderV2
+
+    python_model = SliderV2(io_binding=False)
+    fused_model = SliderV2(fused=True)
+    if not fused_model.fused:
+        return {'error': '融合模型不存在，请先运行 python -m captcha_recognizer.compose'}
+
+    report = {'images': len(images)}
+    results = {}
+    for name, model in (('python', python_model), ('fused', fused_model)):
+        model.identify(images[0])
+        predict_best = identify_best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for image in images:
+                model.predict(image, conf=0.25, iou=0.8, lazy_masks=True)
+            predict_best = min(predict_best, time.perf_counter() - start)
+            start = time.perf_counter()
+            results[name] = [model.identify(image) for image in images]
+            identify_best = min(identify_best, time.perf_counter() - start)
+        report[name] = {
+            'predict_ms': round(predict_best / len(images) * 1000, 3),
+            'identify_ms': round(identify_best / len(images) * 1000, 3),
+        }
+
+    diffs = [float(np.max(np.abs(np.array(a[:4]) - np.array(b[:4]))))
+             for (a, _), (b, _) in zip(results['python'], results['fused']) if a and b]
+    report['speedup'] = round(report['python']['identify_ms'] / report['fused']['identify_ms'], 3)
+    report['detection_mismatches'] = sum(bool(a) != bool(b) for (a, _), (b, _) in
+                                         zip(results['python'], results['fused']))
+    report['box_max_abs_diff'] = round(max(diffs), 4) if diffs else None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='验证码模型离线性能对比')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help='逐张识别与批量识别的吞吐量对比')
+    batch_parser.add_argument('--images', required=True, help='验证码图片目录')
+    batch_parser.add_argument('--batch-size', type=int, default=8)
+    batch_parser.add_argument('--repeat', type=int, default=3)
+    batch_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    masks_parser = subparsers.add_parser('masks', help='提前解码与按需解码掩膜的耗时和内存对比')
+    masks_parser.add_argument('--images', required=True, help='验证码图片目录')
+    masks_parser.add_argument('--repeat', type=int, default=3)
+    masks_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    matcher_parser = subparsers.add_parser('matcher', help='位图匹配与多边形匹配的一致性和耗时对比')
+    matcher_parser.add_argument('--images', required=True, help='验证码图片目录')
+    matcher_parser.add_argument('--conf', type=float, default=0.25)
+    matcher_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    io_parser = subparsers.add_parser('io', help='普通推理与 IOBinding 复用缓冲区的耗时和内存分配对比')
+    io_parser.add_argument('--images', required=True, help='验证码图片目录')
+    io_parser.add_argument('--repeat', type=int, default=3)
+    io_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    shapes_parser = subparsers.add_parser('shapes', help='不同推理尺寸的耗时和精度对比（需要动态轴导出的模型）')
+    shapes_parser.add_argument('--images', required=True, help='验证码图片目录')
+    shapes_parser.add_argument('--model', choices=('slider-v2', 'slider-v1'), default='slider-v2')
+    shapes_parser.add_argument('--shapes', nargs='+', default=['640x640', '640x320', '640x256'],
+                               help='推理尺寸（宽x高），第一个作为精度基准')
+    shapes_parser.add_argument('--repeat', type=int, default=3)
+    shapes_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    decode_parser = subparsers.add_parser('decode', help='Recognizer 逐行解码与向量化解码的一致性和耗时对比')
+    decode_parser.add_argument('--images', required=True, help='验证码图片目录')
+    decode_parser.add_argument('--repeat', type=int, default=3)
+    decode_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    backends_parser = subparsers.add_parser('backends', help='SliderV2 在各推理后端上的耗时和结果对比')
+    backends_parser.add_argument('--images', required=True, help='验证码图片目录')
+    backends_parser.add_argument('--repeat', type=int, default=3)
+    backends_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    fused_parser = subparsers.add_parser('fused', help='Python 预处理/NMS 流水线与融合模型的耗时和结果对比')
+    fused_parser.add_argument('--images', required=True, help='验证码图片目录')
+    fused_parser.add_argument('--repeat', type=int, default=3)
+    fused_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    suite_parser = subparsers.add_parser('suite', help='在有标注的样本上测试各模型、后端、推理尺寸和线程数的耗时与精度')
+    suite_parser.add_argument('--images', required=True, help='验证码图片目录')
+    suite_parser.add_argument('--labels', help='缺口 x 标注文件（JSON/CSV），默认为图片目录下的 labels.json')
+    suite_parser.add_argument('--models', nargs='+', choices=('slider-v2', 'slider-v1'), default=['slider-v2'])
+    suite_parser.add_argument('--backends', nargs='+', default=['onnxruntime'])
+    suite_parser.add_argument('--imgsz', nargs='+', default=['640x640'], help='推理尺寸（宽x高）')
+    suite_parser.add_argument('--threads', nargs='+', type=int, default=[0], help='推理线程数，0 表示自动')
+    suite_parser.add_argument('--tolerance', type=float, default=3.0, help='缺口 x 允许误差（像素）')
+    suite_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+    suite_parser.add_argument('--output', help='结果 JSON 文件路径，默认只打印')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'batch':
+        from captcha_recognizer.slider import SliderV2
+
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_batch_throughput(SliderV2(), images, args.batch_size, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'masks':
+        from captcha_recognizer.slider import SliderV2
+
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_lazy_masks(SliderV2(), images, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'matcher':
+        from captcha_recognizer.slider import SliderV2
+
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_matchers(SliderV2(mask_engine='roi'), images, args.conf)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'io':
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_io_binding(images, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'shapes':
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_shapes(args.model, images, args.shapes, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'decode':
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        outputs, scales = recognizer_outputs(images)
+        report = compare_recognizer_decode(outputs, scales, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'backends':
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_backends(images, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'fused':
+        images = load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"目录中没有可用图片: {args.images}")
+        report = compare_fused(images, args.repeat)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'suite':
+        labels_path = args.labels or os.path.join(args.images, 'labels.json')
+        if not os.path.exists(labels_path):
+            parser.error(f"标注文件不存在: {labels_path}")
+        samples = load_labeled_images(args.images, labels_path, args.limit)
+        if not samples:
+            parser.error(f"目录中没有带标注的图片: {args.images}")
+        report = run_suite(samples, args.models, args.backends, args.imgsz, args.threads, args.tolerance)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+验证码识别结果缓存
+
+门户的滑块验证码来自有限的背景图池，同一张（或重新压缩后的）背景图会反复出现。
+以解码后背景图的感知哈希（DCT pHash）为键缓存缺口框，命中时不再运行模型推理。
+
+- 容量有上限，按 LRU 淘汰
+- 可选持久化到本地 JSON 文件，重启后继续使用；写入在后台合并进行，不阻塞识别
+- 只缓存置信度不低于 min_conf 的结果；滑动验证失败后调用 report_failure 淘汰该结果
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from captcha_recognizer import profiling
+from captcha_recognizer.storage import DebouncedWriter
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_VERSION = 1
+
+
+def perceptual_hash(image: np.ndarray, hash_size: int = 16) -> int:
+    """
+    计算图片的 DCT 感知哈希（hash_size * hash_size 位）
+
+    缩放到 4 倍 hash_size 的灰度图后做 DCT，取左上角低频系数与其中位数比较，
+    对 JPEG/PNG 重新压缩和轻微的颜色变化不敏感。缺口位置不同的同一背景图也必须区分开，
+    8x8 的哈希在缺口移动十几个像素时只差 2 位（与重新压缩的差异相当），因此默认取 16x16。
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    size = hash_size * 4
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    # 直流分量只反映整体亮度，不参与中位数
+    bits = low > np.median(low[1:])
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """
+    以感知哈希为键的缺口识别结果 LRU 缓存（线程安全）
+
+    键为 (图片高, 图片宽, 哈希值)，不同尺寸的图片不会互相命中。
+    max_distance 大于 0 时，汉明距离不超过该值的哈希也视为命中（近似重复）。
+    put / report_failure 后 save_delay 秒内的变化合并为一次后台写入。
+    """
+
+    def __init__(self, capacity: int = 1024, max_distance: int = 0, min_conf: float = 0.5,
+                 path: Optional[str] = None, hash_size: int = 16, save_delay: float = 2.0):
+        self._entries: 'OrderedDict[Tuple[int, int, int], Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.min_conf = min_conf
+        self.path = path
+        self.hash_size = hash_size
+        self.hits = self.misses = self.evictions = self.invalidations = self.rejected = 0
+        self._writer = DebouncedWriter(lambda: self.path, self._snapshot, save_delay, '验证码结果缓存')
+
+    def configure(self, capacity: Optional[int] = None, max_distance: Optional[int] = None,
+                  min_conf: Optional[float] = None, path: Optional[str] = None) -> None:
+        """更新缓存参数；指定 path 时从该文件加载已持久化的结果"""
+        with self._lock:
+            if capacity is not None:
+                self.capacity = capacity
+            if max_distance is not None:
+                self.max_distance = max_distance
+            if min_conf is not None:
+                self.min_conf = min_conf
+            self._evict()
+        if path is not None:
+            self.path = path
+            self.load()
+
+    def key(self, image: np.ndarray) -> Tuple[int, int, int]:
+        return image.shape[0], image.shape[1], perceptual_hash(image, self.hash_size)
+
+    def _find(self, key: Tuple[int, int, int]) -> Optional[Tuple[int, int, int]]:
+        if key in self._entries:
+            return key
+        if self.max_distance <= 0:
+            return None
+        best, best_distance = None, self.max_distance + 1
+        for candidate in self._entries:
+            if candidate[:2] == key[:2]:
+                distance = hamming_distance(candidate[2], key[2])
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[Tuple[List[float], float]]:
+        """查找缓存的 (box, conf)，未命中返回 None"""
+        with self._lock:
+            found = self._find(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(found)
+            self.hits += 1
+            entry = self._entries[found]
+            return list(entry['box']), entry['conf']
+
+    def put(self, key: Tuple[int, int, int], box: List[float], conf: float) -> bool:
+        """缓存识别结果，置信度低于 min_conf 或没有识别出缺口时不缓存"""
+        if not box or conf < self.min_conf:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self._entries[key] = {'box': [float(v) for v in box[:4]], 'conf': float(conf)}
+            self._entries.move_to_end(key)
+            self._evict()
+        self._writer.schedule()
+        return True
+
+    def report_failure(self, key: Tuple[int, int, int]) -> bool:
+        """滑动验证失败：淘汰该背景图对应的缓存结果，下次重新推理"""
+        with self._lock:
+            found = self._find(key)
+            if found is None:
+                return False
+            del self._entries[found]
+            self.invalidations += 1
+        logger.info(f"验证码缓存结果已失效: {found[1]}x{found[0]} {found[2]:x}")
+        self._writer.schedule()
+        return True
+
+    def identify(self, model, image: np.ndarray, **kwargs) -> Tuple[List[float], float, Tuple[int, int, int]]:
+        """
+        带缓存的 model.identify，返回 (box, conf, key)，key 用于滑动失败后调用 report_failure
+        """
+        with profiling.stage('cache_lookup'):
+            key = self.key(image)
+            cached = self.get(key)
+        if cached is not None:
+            return cached[0], cached[1], key
+        box, conf = model.identify(image, **kwargs)
+        self.put(key, box, conf)
+        return box, conf, key
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'rejected': self.rejected,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'version': CACHE_FILE_VERSION,
+                'hash_size': self.hash_size,
+                'entries': [[h, w, f'{value:x}', entry['box'], entry['conf']]
+                            for (h, w, value), entry in self._entries.items()],
+            }
+
+    def save(self) -> None:
+        """立即把全部结果写入 path"""
+        self._writer.flush(force=True)
+
+    def load(self) -> None:
+        """从 path 加载持久化的结果，文件不存在或格式不符时忽略"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"验证码结果缓存文件不可用，已忽略: {self.path}, {e}")
+            return
+        if data.get('version') != CACHE_FILE_VERSION or data.get('hash_size') != self.hash_size:
+            logger.warning(f"验证码结果缓存文件版本不匹配，已忽略: {self.path}")
+            return
+        with self._lock:
+            for h, w, value, box, conf in data.get('entries', []):
+                self._entries[(h, w, int(value, 16))] = {'box': box, 'conf': conf}
+            self._evict()
+            size = len(self._entries)
+        logger.info(f"已加载验证码结果缓存: {self.path}, {size} 条")
+
+
+# 创建全局结果缓存实例
+result_cache = ResultCache()
@@ -0,0 +1,334 @@
+"""
+两级缺口识别：先用 Canny 边缘 + cv2.matchTemplate 做亚毫秒级的快速识别，
+匹配分数达到标定阈值时直接采用，否则回退到 SliderV2.identify
+
+模板和阈值由 calibrate 在样本图片上标定：以 SliderV2 的识别结果为参照，平均各缺口的边缘图得到模板，
+再选出使快速识别结果（与 SliderV2 的缺口 x 误差不超过 tolerance）达到目标准确率的最低分数阈值。
+匹配分数（最佳与次佳匹配的相关系数之差）不是概率，快速识别作答时返回的置信度由标定样本换算：
+分数不低于该值的样本中与 SliderV2 一致的比例（单调不减，与模型置信度同为 0~1）。
+
+用法:
+    python -m captcha_recognizer.cascade calibrate --images test-image --output captcha_recognizer/models/cascade.json
+    python -m captcha_recognizer.cascade evaluate --images test-image --calibration captcha_recognizer/models/cascade.json
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from captcha_recognizer import profiling
+from captcha_recognizer.backend import image_to_array
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_VERSION = 1
+
+STAGES = ('classical', 'onnx')
+
+
+def edge_map(image: np.ndarray) -> np.ndarray:
+    """灰度 + 轻度模糊后的 Canny 边缘图（float32，0/1）"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (3, 3), 0), 50, 150)
+    return (edges > 0).astype(np.float32)
+
+
+class ClassicalGapFinder:
+    """
+    边缘模板匹配的缺口识别
+
+    分数为最佳匹配与次佳匹配（排除最佳位置附近一个模板宽度）的相关系数之差，
+    背景纹理与缺口相似、存在多个候选位置时分数低，不会被采用。
+    """
+
+    def __init__(self, template: np.ndarray, threshold: float, min_x: int, image_height: int,
+                 confidence_curve: Optional[List[List[float]]] = None, default_confidence: float = 0.0):
+        self.template = template.astype(np.float32)
+        self.threshold = threshold
+        self.min_x = min_x
+        self.image_height = image_height
+        # [[分数, 置信度], ...]，分数升序
+        self.confidence_curve = np.array(confidence_curve or [], dtype=np.float64).reshape(-1, 2)
+        self.default_confidence = default_confidence
+
+    def confidence(self, score: float) -> float:
+        """把匹配分数换算为 0~1 的置信度，标定文件没有换算表时返回 default_confidence"""
+        if not len(self.confidence_curve):
+            return self.default_confidence
+        return float(np.interp(score, self.confidence_curve[:, 0], self.confidence_curve[:, 1]))
+
+    def find(self, image: np.ndarray) -> Tuple[List[float], float]:
+        """
+        返回 (box, score)，图片过小无法匹配时返回 ([], 0.0)
+
+        先在半分辨率的边缘图上匹配并计算分数，再在全分辨率下只于粗匹配位置附近细化坐标。
+        """
+        scale = image.shape[0] / self.image_height
+        template = self.template
+        if abs(scale - 1) > 1e-3:
+            template = cv2.resize(template, (max(1, round(template.shape[1] * scale)),
+                                             max(1, round(template.shape[0] * scale))))
+        th, tw = template.shape
+        min_x = int(round(self.min_x * scale))
+        edges = edge_map(image)[:, min_x:]
+        if edges.shape[0] < th or edges.shape[1] < tw:
+            return [], 0.0
+
+        coarse_edges = cv2.resize(edges, (edges.shape[1] // 2, edges.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        coarse_template = cv2.resize(template, (max(1, tw // 2), max(1, th // 2)), interpolation=cv2.INTER_AREA)
+        response = cv2.matchTemplate(coarse_edges, coarse_template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (cx, cy) = cv2.minMaxLoc(response)
+        # 屏蔽最佳位置附近后取次佳匹配
+        half_w = coarse_template.shape[1]
+        response[:, max(0, cx - half_w):cx + half_w + 1] = -1
+        second = float(response.max())
+
+        # 全分辨率细化：粗匹配位置 ±2 像素内重新匹配
+        x0, y0 = max(0, cx * 2 - 2), max(0, cy * 2 - 2)
+        window = edges[y0:min(edges.shape[0], cy * 2 + 2 + th + 1), x0:min(edges.shape[1], cx * 2 + 2 + tw + 1)]
+        _, _, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED))
+        x, y = x0 + dx + min_x, y0 + dy
+        return [float(x), float(y), float(x + tw), float(y + th)], float(best - max(second, 0.0))
+
+
+class CascadeStats:
+    """各阶段的作答次数和耗时统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls = 0
+            self._answered = {stage: 0 for stage in STAGES}
+            self._seconds = {stage: 0.0 for stage in STAGES}
+            self._runs = {stage: 0 for stage in STAGES}
+
+    def record(self, stage: str, seconds: float, answered: bool) -> None:
+        with self._lock:
+            self._runs[stage] += 1
+            self._seconds[stage] += seconds
+            if answered:
+                self._answered[stage] += 1
+                self._calls += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = {'calls': self._calls}
+            for stage in STAGES:
+                runs = self._runs[stage]
+                report[stage] = {
+                    'runs': runs,
+                    'answered': self._answered[stage],
+                    'answer_rate': round(self._answered[stage] / self._calls, 4) if self._calls else None,
+                    'ms_per_run': round(self._seconds[stage] / runs * 1000, 3) if runs else None,
+                }
+            return report
+
+
+# 全局阶段统计
+cascade_stats = CascadeStats()
+
+
+_calibrations: Dict[Tuple[str, float], ClassicalGapFinder] = {}
+_calibrations_lock = threading.Lock()
+
+
+def load_calibration(path: str) -> Optional[ClassicalGapFinder]:
+    """
+    加载标定文件，不存在或版本不符时返回 None（只使用 ONNX 模型）
+
+    只缓存加载成功的结果（按路径和修改时间），之后创建或重新标定的文件不需要重启即可生效。
+    """
+    if not path or not os.path.exists(path):
+        logger.info(f"缺口快速识别未标定，只使用 ONNX 模型: {path}")
+        return None
+    key = (path, os.path.getmtime(path))
+    with _calibrations_lock:
+        finder = _calibrations.get(key)
+    if finder is not None:
+        return finder
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != CALIBRATION_VERSION:
+        logger.warning(f"缺口快速识别标定文件版本不匹配，已忽略: {path}")
+        return None
+    threshold = float('inf') if data['threshold'] is None else data['threshold']
+    # 没有换算表的旧标定文件：作答的分数都不低于阈值，按标定时的目标准确率作为置信度
+    finder = ClassicalGapFinder(np.array(data['template'], dtype=np.float32), threshold,
+                                data['min_x'], data['image_height'], data.get('confidence_curve'),
+                                data.get('target_precision', 0.0))
+    with _calibrations_lock:
+        for stale in [cached for cached in _calibrations if cached[0] == path]:
+            del _calibrations[stale]
+        _calibrations[key] = finder
+    return finder
+
+
+class CascadeDetector:
+    """
+    两级缺口识别，接口与 SliderV2.identify 相同
+
+    :param model: 回退使用的 SliderV2 实例
+    :param calibration: 标定文件路径或 ClassicalGapFinder，为 None 时直接使用模型
+    """
+
+    def __init__(self, model, calibration: Union[str, ClassicalGapFinder, None] = None,
+                 stats: CascadeStats = cascade_stats):
+        self.model = model
+        self.finder = load_calibration(calibration) if isinstance(calibration, str) else calibration
+        self.stats = stats
+
+    def identify(self, source: Union[str, Path, bytes, np.ndarray], **kwargs) -> Tuple[List[float], float]:
+        box, conf, _ = self.identify_stage(source, **kwargs)
+        return box, conf
+
+    def identify_stage(self, source: Union[str, Path, bytes, np.ndarray], **kwargs) -> Tuple[List[float], float, str]:
+        """返回 (box, conf, stage)，stage 为作答的阶段；快速识别作答时 conf 为换算后的置信度"""
+        image = image_to_array(source)
+        if self.finder is not None:
+            start = time.perf_counter()
+            with profiling.stage('classical'):
+                box, score = self.finder.find(image)
+            accepted = bool(box) and score >= self.finder.threshold
+            self.stats.record('classical', time.perf_counter() - start, accepted)
+            if accepted:
+                return box, self.finder.confidence(score), 'classical'
+
+        start = time.perf_counter()
+        box, conf = self.model.identify(image, **kwargs)
+        self.stats.record('onnx', time.perf_counter() - start, True)
+        return box, conf, 'onnx'
+
+
+def calibrate(model, images: List[np.ndarray], tolerance: float = 3.0, target_precision: float = 0.98,
+              min_samples: int = 20) -> Dict:
+    """
+    以 SliderV2 的识别结果为参照标定模板和分数阈值
+    :param tolerance: 与参照缺口 x 的误差不超过该值（像素）视为正确
+    :param target_precision: 分数不低于阈值的样本中，正确样本的最低比例
+    :param min_samples: 达到阈值的样本少于该数量时不启用快速识别（阈值为无穷大）
+    :return: 标定结果，可直接写入标定文件
+    """
+    references = [(image, model.identify(image)[0]) for image in images]
+    references = [(image, box) for image, box in references if box]
+    if not references:
+        raise RuntimeError("没有可用于标定的识别结果")
+
+    image_height = int(np.median([image.shape[0] for image, _ in references]))
+    widths, heights = zip(*[(box[2] - box[0], box[3] - box[1]) for _, box in references])
+    size = (max(1, int(round(np.median(widths)))), max(1, int(round(np.median(heights)))))
+
+    crops = []
+    for image, box in references:
+        scale = image_height / image.shape[0]
+        edges = edge_map(cv2.resize(image, None, fx=scale, fy=scale) if scale != 1 else image)
+        x1, y1, x2, y2 = (int(round(v * scale)) for v in box)
+        crop = edges[max(0, y1):y2, max(0, x1):x2]
+        if crop.size:
+            crops.append(cv2.resize(crop, size, interpolation=cv2.INTER_AREA))
+    template = np.mean(crops, axis=0)
+
+    # 跳过图片左侧的滑块本身，只在最靠左的缺口之前留出半个模板宽度
+    min_x = max(0, int(min(box[0] * image_height / image.shape[0] for image, box in references) - size[0] / 2))
+    finder = ClassicalGapFinder(template, float('inf'), min_x, image_height)
+    samples = []
+    for image, box in references:
+        found, score = finder.find(image)
+        samples.append((score, bool(found) and abs(found[0] - box[0]) <= tolerance))
+
+    # 从高分到低分累计，取仍满足目标准确率的最低分数作为阈值
+    samples.sort(key=lambda item: -item[0])
+    threshold, correct = float('inf'), 0
+    for i, (score, ok) in enumerate(samples, 1):
+        correct += ok
+        if i >= min_samples and correct / i >= target_precision:
+            threshold = score
+    accepted = sum(score >= threshold for score, _ in samples)
+
+    # 分数 -> 置信度: 分数不低于该值的样本的准确率（加一平滑），从低分到高分取累计最大值保证单调
+    scores = np.array([score for score, _ in samples])
+    hits = np.cumsum([ok for _, ok in samples])
+    precision = (hits + 1) / (np.arange(1, len(samples) + 1) + 2)
+    scores, precision = scores[::-1], np.maximum.accumulate(precision[::-1])
+    points = np.linspace(0, len(scores) - 1, min(len(scores), 20)).round().astype(int)
+    curve = [[round(float(scores[i]), 4), round(float(precision[i]), 4)] for i in np.unique(points)]
+    return {
+        'version': CALIBRATION_VERSION,
+        'image_height': image_height,
+        'min_x': min_x,
+        # 达不到目标准确率时为 None，只使用 ONNX 模型
+        'threshold': threshold if np.isfinite(threshold) else None,
+        'tolerance': tolerance,
+        'target_precision': target_precision,
+        'samples': len(samples),
+        'accepted_rate': round(accepted / len(samples), 4),
+        'confidence_curve': curve,
+        'template': np.round(template, 4).tolist(),
+    }
+
+
+def evaluate(detector: CascadeDetector, images: List[np.ndarray], tolerance: float = 3.0) -> Dict:
+    """在样本图片上运行两级识别，统计各阶段作答比例、耗时和快速识别相对 SliderV2 的准确率"""
+    stats = CascadeStats()
+    cascade = CascadeDetector(detector.model, detector.finder, stats)
+    correct = classical = 0
+    for image in images:
+        box, _, stage = cascade.identify_stage(image)
+        if stage == 'classical':
+            classical += 1
+            reference, _ = detector.model.identify(image)
+            correct += bool(reference) and abs(box[0] - reference[0]) <= tolerance
+    report = stats.stats()
+    report['classical']['precision'] = round(correct / classical, 4) if classical else None
+    return report
+
+
+def main(argv=None):
+    from captcha_recognizer.benchmark import load_images
+    from captcha_recognizer.slider import SliderV2
+
+    parser = argparse.ArgumentParser(description='缺口快速识别的标定与评估')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    calibrate_parser = subparsers.add_parser('calibrate', help='以 SliderV2 结果为参照标定模板和阈值')
+    calibrate_parser.add_argument('--images', required=True, help='验证码图片目录（一般为 IMG_DIR）')
+    calibrate_parser.add_argument('--output', required=True, help='标定文件路径')
+    calibrate_parser.add_argument('--tolerance', type=float, default=3.0, help='缺口 x 允许误差（像素）')
+    calibrate_parser.add_argument('--precision', type=float, default=0.98, help='目标准确率')
+    calibrate_parser.add_argument('--min-samples', type=int, default=20)
+    calibrate_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='统计两级识别各阶段的作答比例和耗时')
+    evaluate_parser.add_argument('--images', required=True, help='验证码图片目录')
+    evaluate_parser.add_argument('--calibration', required=True, help='标定文件路径')
+    evaluate_parser.add_argument('--tolerance', type=float, default=3.0)
+    evaluate_parser.add_argument('--limit', type=int, default=0, help='最多读取的图片数量，0 表示全部')
+
+    args = parser.parse_args(argv)
+    images = load_images(args.images, args.limit)
+    if not images:
+        parser.error(f"目录中没有可用图片: {args.images}")
+
+    if args.command == 'calibrate':
+        report = calibrate(SliderV2(), images, args.tolerance, args.precision, args.min_samples)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f)
+        report.pop('template')
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'evaluate':
+        detector = CascadeDetector(SliderV2(), args.calibration)
+        print(json.dumps(evaluate(detector, images, args.tolerance), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+把预处理和 NMS 合并进验证码模型的 ONNX 图（融合模型）
+
+用法:
+    python -m captcha_recognizer.compose --model slider-v2
+    python -m captcha_recognizer.compose --model slider-v2 --variant fp16 --max-det 100
+
+生成 models/slider-v2.fused.onnx（其他精度变体为 slider-v2.<variant>.fused.onnx），图内依次完成:
+    uint8 BGR HWC 原图 -> RGB -> letterbox（等比缩放 + 114 灰边填充）-> /255 -> 原模型
+    -> xywh 转 xyxy -> NonMaxSuppression -> 检测框还原到原图坐标并裁剪
+
+融合模型的输入与输出:
+    image           uint8 [H, W, 3]   cv2 解码得到的 BGR 原图，H、W 为动态维度
+    conf_threshold  float [1]         置信度阈值（严格大于）
+    iou_threshold   float [1]         NMS 的 IoU 阈值
+    boxes           float [N, 4]      原图坐标的 xyxy 检测框，按置信度降序
+    scores          float [N]
+    coefficients    float [N, 32]     掩膜系数
+    protos          float [1, 32, mh, mw]  掩膜原型
+
+生成后会在 --images 目录（或随机图片）上与 Python 流水线对比检测框，差异超过 --atol 时返回非零状态。
+"""
+import argparse
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+from captcha_recognizer.session import MODEL_VARIANTS, variant_path
+
+# 图内新增节点和常量的名称前缀，避免与原模型重名
+PREFIX = 'fused_'
+PAD_VALUE = 114.0
+
+
+class _GraphBuilder:
+    """按顺序追加节点和常量，名称自动加前缀"""
+
+    def __init__(self):
+        self.nodes: List[onnx.NodeProto] = []
+        self.initializers: List[onnx.TensorProto] = []
+        self._count = 0
+
+    def const(self, value, dtype=np.float32, name: Optional[str] = None) -> str:
+        self._count += 1
+        name = PREFIX + (name or f'const_{self._count}')
+        self.initializers.append(numpy_helper.from_array(np.array(value, dtype=dtype), name))
+        return name
+
+    def op(self, op_type: str, inputs: List[str], name: Optional[str] = None, outputs: int = 1, **attrs):
+        self._count += 1
+        base = PREFIX + (name or f'{op_type.lower()}_{self._count}')
+        names = [base] if outputs == 1 else [f'{base}_{i}' for i in range(outputs)]
+        self.nodes.append(helper.make_node(op_type, inputs, names, name=base, **attrs))
+        return names[0] if outputs == 1 else names
+
+
+def _preprocess(b: _GraphBuilder, image: str, imgsz: Tuple[int, int]) -> Tuple[str, str, str, str, str]:
+    """
+    图内 letterbox，与 SliderV2.preprocess 一致
+    :return: (模型输入, 原图高, 原图宽, 缩放比例, 检测框还原用的 [pad_x, pad_y, pad_x, pad_y])
+    """
+    th, tw = (float(v) for v in imgsz)
+    shape = b.op('Shape', [image])
+    height = b.op('Cast', [b.op('Gather', [shape, b.const(0, np.int64)], axis=0)], to=TensorProto.FLOAT)
+    width = b.op('Cast', [b.op('Gather', [shape, b.const(1, np.int64)], axis=0)], to=TensorProto.FLOAT)
+    gain = b.op('Min', [b.op('Div', [b.const(th), height]), b.op('Div', [b.const(tw), width])], name='gain')
+
+    # 缩放后的尺寸，限制在 [1, 目标尺寸]
+    new_h = b.op('Min', [b.op('Max', [b.op('Round', [b.op('Mul', [height, gain])]), b.const(1.0)]), b.const(th)])
+    new_w = b.op('Min', [b.op('Max', [b.op('Round', [b.op('Mul', [width, gain])]), b.const(1.0)]), b.const(tw)])
+
+    # 奇数填充时多出的一个像素放在下/右侧
+    dh, dw = b.op('Sub', [b.const(th), new_h]), b.op('Sub', [b.const(tw), new_w])
+    top = b.op('Round', [b.op('Div', [dh, b.const(2.0)])])
+    left = b.op('Round', [b.op('Div', [dw, b.const(2.0)])])
+    bottom, right = b.op('Sub', [dh, top]), b.op('Sub', [dw, left])
+
+    def as_int(values: List[str]) -> str:
+        stacked = b.op('Concat', [b.op('Unsqueeze', [v, b.const([0], np.int64)]) for v in values], axis=0)
+        return b.op('Cast', [stacked], to=TensorProto.INT64)
+
+    sizes = b.op('Concat', [b.const([1, 3], np.int64), as_int([new_h, new_w])], axis=0)
+    pads = b.op('Concat', [b.const([0, 0], np.int64), as_int([top, left]),
+                           b.const([0, 0], np.int64), as_int([bottom, right])], axis=0)
+
+    # BGR HWC uint8 -> RGB NCHW float
+    rgb = b.op('Gather', [b.op('Cast', [image], to=TensorProto.FLOAT), b.const([2, 1, 0], np.int64)], axis=2)
+    nchw = b.op('Unsqueeze', [b.op('Transpose', [rgb], perm=[2, 0, 1]), b.const([0], np.int64)])
+    resized = b.op('Resize', [nchw, '', '', sizes], mode='linear', coordinate_transformation_mode='half_pixel')
+    # cv2.resize 的 uint8 输出是取整后的值
+    resized = b.op('Clip', [b.op('Round', [resized]), b.const(0.0), b.const(255.0)])
+    padded = b.op('Pad', [resized, pads, b.const(PAD_VALUE)], mode='constant')
+    model_input = b.op('Div', [padded, b.const(255.0)], name='model_input')
+
+    # 与 SliderV2.scale_boxes 相同的还原偏移
+    pad_x = b.op('Round', [b.op('Div', [b.op('Sub', [b.const(tw), b.op('Mul', [width, gain])]), b.const(2.0)])])
+    pad_y = b.op('Round', [b.op('Div', [b.op('Sub', [b.const(th), b.op('Mul', [height, gain])]), b.const(2.0)])])
+    box_pad = b.op('Concat', [b.op('Unsqueeze', [v, b.const([0], np.int64)]) for v in (pad_x, pad_y, pad_x, pad_y)],
+                   axis=0)
+    return model_input, height, width, gain, box_pad
+
+
+def _postprocess(b: _GraphBuilder, preds: str, nc: int, mask_dim: int, max_det: int, height: str, width: str,
+                 gain: str, box_pad: str, conf: str, iou: str) -> Tuple[str, str, str]:
+    """图内 NMS，返回 (boxes, scores, coefficients)"""
+    rows = b.op('Transpose', [preds], perm=[0, 2, 1])
+    xywh, cls, coefficients = b.op('Split', [rows, b.const([4, nc, mask_dim], np.int64)], axis=2, outputs=3)
+    xy = b.op('Slice', [xywh, b.const([0], np.int64), b.const([2], np.int64), b.const([2], np.int64)])
+    half_wh = b.op('Mul', [b.op('Slice', [xywh, b.const([2], np.int64), b.const([4], np.int64),
+                                          b.const([2], np.int64)]), b.const(0.5)])
+    xyxy = b.op('Concat', [b.op('Sub', [xy, half_wh]), b.op('Add', [xy, half_wh])], axis=2)
+
+    # 单类别模型，与 non_max_suppression 的 class-agnostic 结果相同
+    scores = b.op('ReduceMax', [cls], axes=[2], keepdims=1)
+    selected = b.op('NonMaxSuppression', [xyxy, b.op('Transpose', [scores], perm=[0, 2, 1]),
+                                          b.const([max_det], np.int64), iou, conf], center_point_box=0)
+    index = b.op('Gather', [selected, b.const(2, np.int64)], axis=1)
+
+    def pick(tensor: str, name: str) -> str:
+        return b.op('Gather', [b.op('Squeeze', [tensor, b.const([0], np.int64)]), index], axis=0, name=name)
+
+    boxes = b.op('Div', [b.op('Sub', [pick(xyxy, 'letterbox_boxes'), box_pad]), gain])
+    limit = b.op('Concat', [b.op('Unsqueeze', [v, b.const([0], np.int64)]) for v in (width, height, width, height)],
+                 axis=0)
+    boxes = b.op('Min', [b.op('Max', [boxes, b.const(0.0)]), limit], name='boxes')
+    scores = b.op('Squeeze', [pick(scores, 'picked_scores'), b.const([1], np.int64)], name='scores')
+    return boxes, scores, pick(coefficients, 'coefficients')
+
+
+def build_fused_model(src: str, dst: str, imgsz: Optional[Tuple[int, int]] = None, max_det: int = 300) -> str:
+    """
+    由分割模型生成融合模型
+    :param imgsz: 推理尺寸 (高, 宽)，默认取模型的固定输入尺寸
+    """
+    model = onnx.load(src)
+    graph = model.graph
+    model_input = graph.input[0]
+    dims = [d.dim_value or None for d in model_input.type.tensor_type.shape.dim]
+    imgsz = imgsz or tuple(dims[2:])
+    if None in imgsz:
+        raise ValueError(f"模型输入为动态尺寸，需要指定 imgsz: {dims}")
+
+    preds_output, protos_output = graph.output[0], graph.output[1]
+    preds_dims = [d.dim_value for d in preds_output.type.tensor_type.shape.dim]
+    mask_dim = protos_output.type.tensor_type.shape.dim[1].dim_value
+    nc = preds_dims[1] - 4 - mask_dim
+    if nc <= 0 or mask_dim <= 0:
+        raise ValueError(f"无法从模型输出推断类别数和掩膜维度: {preds_dims}")
+
+    b = _GraphBuilder()
+    image = 'image'
+    preprocessed, height, width, gain, box_pad = _preprocess(b, image, imgsz)
+    pre_nodes = list(b.nodes)
+    b.nodes.clear()
+    boxes, scores, coefficients = _postprocess(b, preds_output.name, nc, mask_dim, max_det, height, width, gain,
+                                               box_pad, 'conf_threshold', 'iou_threshold')
+
+    # 原模型的输入改为接收图内预处理的结果
+    for node in graph.node:
+        for i, name in enumerate(node.input):
+            if name == model_input.name:
+                node.input[i] = preprocessed
+    nodes = pre_nodes + list(graph.node) + b.nodes
+    del graph.node[:]
+    graph.node.extend(nodes)
+    graph.initializer.extend(b.initializers)
+
+    del graph.input[:]
+    graph.input.extend([
+        helper.make_tensor_value_info(image, TensorProto.UINT8, ['height', 'width', 3]),
+        helper.make_tensor_value_info('conf_threshold', TensorProto.FLOAT, [1]),
+        helper.make_tensor_value_info('iou_threshold', TensorProto.FLOAT, [1]),
+    ])
+    del graph.output[:]
+    graph.output.extend([
+        helper.make_tensor_value_info(boxes, TensorProto.FLOAT, ['detections', 4]),
+        helper.make_tensor_value_info(scores, TensorProto.FLOAT, ['detections']),
+        helper.make_tensor_value_info(coefficients, TensorProto.FLOAT, ['detections', mask_dim]),
+        protos_output,
+    ])
+    # 原模型的中间形状标注可能写死了 batch 等维度，交给 ORT 重新推断
+    del graph.value_info[:]
+
+    # 图内 letterbox 的尺寸，SliderV2 只在推理尺寸一致时使用融合模型
+    helper.set_model_props(model, {'imgsz': f'{imgsz[1]}x{imgsz[0]}'})
+
+    onnx.checker.check_model(model)
+    onnx.save(model, dst)
+    return dst
+
+
+def fused_output_path(src: str) -> str:
+    """融合模型与源模型放在同一目录，例如 slider-v2.fp16.onnx -> slider-v2.fp16.fused.onnx"""
+    return f'{os.path.splitext(src)[0]}.fused.onnx'
+
+
+def check_fused(images: List[np.ndarray], variant: str = 'fp32', atol: float = 1.0) -> dict:
+    """
+    在图片上对比融合流水线与 Python 流水线的识别结果
+    :param atol: 缺口框坐标允许的最大差异（像素）
+    """
+    from captcha_recognizer.slider import SliderV2
+
+    reference = SliderV2(variant=variant)
+    fused = SliderV2(variant=variant, fused=True)
+    if not fused.fused:
+        raise RuntimeError("融合模型不可用")
+    max_diff, mismatches = 0.0, 0
+    for image in images:
+        box_a, _ = reference.identify(image)
+        box_b, _ = fused.identify(image)
+        if bool(box_a) != bool(box_b):
+            mismatches += 1
+            continue
+        if box_a:
+            diff = float(np.max(np.abs(np.array(box_a[:4]) - np.array(box_b[:4]))))
+            max_diff = max(max_diff, diff)
+            mismatches += diff > atol
+    return {'images': len(images), 'mismatches': mismatches, 'max_box_diff': round(max_diff, 4), 'atol': atol,
+            'passed': mismatches == 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成内置预处理和 NMS 的融合模型')
+    parser.add_argument('--model', choices=('slider-v2',), default='slider-v2')
+    parser.add_argument('--variant', choices=MODEL_VARIANTS, default='fp32')
+    parser.add_argument('--max-det', type=int, default=300, help='NMS 后最多保留的检测框数量')
+    parser.add_argument('--images', help='一致性检查用的图片目录，默认使用随机图片')
+    parser.add_argument('--limit', type=int, default=50, help='一致性检查最多使用的图片数量')
+    parser.add_argument('--atol', type=float, default=1.0, help='缺口框坐标允许的最大差异（像素）')
+    args = parser.parse_args(argv)
+
+    src = variant_path(args.model, args.variant)
+    dst = build_fused_model(src, fused_output_path(src), max_det=args.max_det)
+    print(f"已生成融合模型: {dst}")
+
+    if args.images:
+        from captcha_recognizer.benchmark import load_images
+        images = load_images(args.images, args.limit)
+    else:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 256, (160, 320, 3), dtype=np.uint8) for _ in range(min(args.limit, 8))]
+    report = check_fused(images, args.variant, args.atol)
+    print(report)
+    if not report['passed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""
+滑块拖动距离标定
+
+拖动距离原本按固定公式计算: (缺口 x - 滑块初始 x) * 网页图片宽度 / 原始图片宽度，
+初始 x 或缩放的系统误差会让每次滑动都偏同样的像素。这里记录每次滑动的识别框、计算距离、
+实际轨迹和是否通过，再从记录中拟合:
+
+    distance = gain * (web_width / image_width) * (raw_x - offset) + correction(distance)
+
+- offset / gain: 用通过的滑动（实际拖动距离 ≈ 真实距离）做稳健最小二乘拟合，再在其附近网格搜索，
+  使失败的滑动也得到解释（consistency 最高）
+- correction: 按距离分段、使该分段 consistency 最高的平移量（样本少的分段向 0 收缩），修正非线性误差
+- 评价指标 consistency: 通过的滑动预测误差不超过 tolerance、失败的滑动超过 tolerance 的比例
+
+拖动距离总是按当前参数计算时，通过与否只说明真实距离离当前参数不远，看不出偏向哪一边，
+拟合结果只会在当前参数附近随机游走。标定运行时可按 explore_rate 的比例对 offset / gain 加随机扰动（探索），
+拖动距离的变化不超过 tolerance；通过率随扰动方向的变化给出修正方向。记录中的 dither 为本次扰动。
+探索会降低被扰动的滑动的通过率（模拟中整体约 2 个百分点），默认关闭，只在需要重新标定时临时开启。
+
+自动标定每累计 refit_every 条新记录在后台重新拟合一次：每 holdout_every 条记录留出一条不参与拟合，
+新参数在留出记录上的 consistency 严格高于当前参数时才替换并保存。
+
+手动标定:
+    python -m captcha_recognizer.drag_calibration fit --records captcha_slides.jsonl --output captcha_drag.json
+    python -m captcha_recognizer.drag_calibration evaluate --records captcha_slides.jsonl --calibration captcha_drag.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from captcha_recognizer.storage import write_json
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_VERSION = 1
+
+# 增益超出该范围的拟合结果视为数据异常，不采用
+GAIN_RANGE = (0.8, 1.25)
+
+# 留出记录少于该数量时不替换当前参数
+MIN_HOLDOUT = 10
+
+_refit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='captcha-drag-refit')
+
+
+class DragModel:
+    """
+    拖动距离模型
+    :param offset: 滑块初始位置（原始图片像素）
+    :param gain: 缩放比例的修正系数
+    :param corrections: 按距离分段的修正 [[距离, 修正量], ...]（网页像素），分段之间线性插值
+    """
+
+    def __init__(self, offset: float, gain: float = 1.0, corrections: Sequence[Sequence[float]] = (),
+                 meta: Optional[Dict[str, Any]] = None):
+        self.offset = float(offset)
+        self.gain = float(gain)
+        self.corrections = [(float(d), float(c)) for d, c in corrections]
+        self.meta = meta or {}
+
+    def base_distance(self, raw_x: float, image_width: float, web_width: float) -> float:
+        scale = web_width / image_width if image_width else 1.0
+        return self.gain * scale * (float(raw_x) - self.offset)
+
+    def correction(self, distance: float) -> float:
+        if not self.corrections:
+            return 0.0
+        points, values = zip(*self.corrections)
+        return float(np.interp(distance, points, values))
+
+    def distance(self, raw_x: float, image_width: float, web_width: float) -> float:
+        """计算拖动距离（网页像素）"""
+        base = self.base_distance(raw_x, image_width, web_width)
+        return base + self.correction(base)
+
+    def predict(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        return np.array([self.distance(r['raw_x'], r['image_width'], r['web_width']) for r in records])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': CALIBRATION_VERSION,
+            'offset': round(self.offset, 4),
+            'gain': round(self.gain, 6),
+            'corrections': [[round(d, 2), round(c, 3)] for d, c in self.corrections],
+            **self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional['DragModel']:
+        if data.get('version') != CALIBRATION_VERSION:
+            return None
+        meta = {key: value for key, value in data.items()
+                if key not in ('version', 'offset', 'gain', 'corrections')}
+        return cls(data['offset'], data.get('gain', 1.0), data.get('corrections', ()), meta)
+
+
+class SlideStore:
+    """滑动记录，每行一条 JSON，只追加"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=float)
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                logger.error(f"保存滑动记录失败: {e}")
+
+    def load(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取最近的 limit 条完整记录（缺少必要字段或无法解析的行会被跳过）"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with self._lock, open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if all(record.get(key) is not None for key in ('raw_x', 'image_width', 'web_width', 'dragged')):
+                    records.append(record)
+        return records[-limit:] if limit else records
+
+
+def consistency(model: DragModel, records: List[Dict[str, Any]], tolerance: float) -> Optional[float]:
+    """通过的滑动预测误差不超过 tolerance、失败的滑动超过 tolerance 的比例"""
+    if not records:
+        return None
+    errors = np.abs(model.predict(records) - np.array([r['dragged'] for r in records], dtype=np.float64))
+    passed = np.array([bool(r['passed']) for r in records])
+    return round(float(np.mean(np.where(passed, errors <= tolerance, errors > tolerance))), 4)
+
+
+def split_holdout(records: List[Dict[str, Any]], every: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """按记录顺序每 every 条留出一条（与时间交错，不受参数漂移影响），返回 (拟合用, 留出)"""
+    if every < 2:
+        return records, []
+    train = [r for i, r in enumerate(records) if i % every != every - 1]
+    holdout = [r for i, r in enumerate(records) if i % every == every - 1]
+    return train, holdout
+
+
+def fit(records: List[Dict[str, Any]], default_offset: float, tolerance: float = 3.0, min_samples: int = 20,
+        bin_width: float = 40.0, min_bin_samples: int = 5) -> Tuple[Optional[DragModel], Dict[str, Any]]:
+    """
+    从滑动记录拟合拖动距离模型
+    :return: (model, report)，通过的滑动少于 min_samples 或拟合结果异常时 model 为 None
+    """
+    passed = [r for r in records if r.get('passed')]
+    report: Dict[str, Any] = {'records': len(records), 'passed': len(passed)}
+    if len(passed) < min_samples:
+        report['reason'] = f'通过的滑动少于 {min_samples} 条'
+        return None, report
+
+    scale = np.array([r['web_width'] / r['image_width'] for r in passed], dtype=np.float64)
+    raw_x = np.array([r['raw_x'] for r in passed], dtype=np.float64)
+    dragged = np.array([r['dragged'] for r in passed], dtype=np.float64)
+
+    # dragged = gain * scale * raw_x - gain * offset * scale，逐轮剔除残差过大的样本
+    features = np.stack([scale * raw_x, -scale], axis=1)
+    keep = np.ones(len(passed), dtype=bool)
+    for _ in range(3):
+        (gain, gain_offset), *_ = np.linalg.lstsq(features[keep], dragged[keep], rcond=None)
+        residuals = dragged - features @ np.array([gain, gain_offset])
+        mad = float(np.median(np.abs(residuals[keep] - np.median(residuals[keep]))))
+        new_keep = np.abs(residuals) <= max(3 * 1.4826 * mad, tolerance)
+        if new_keep.sum() < min_samples or np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    report['inliers'] = int(keep.sum())
+    if not GAIN_RANGE[0] <= gain <= GAIN_RANGE[1]:
+        report['reason'] = f'拟合的增益 {gain:.3f} 超出 {GAIN_RANGE}'
+        return None, report
+
+    offset, gain = refine(records, gain_offset / gain, gain, tolerance)
+    model = DragModel(offset, gain)
+
+    # 分段修正：与 offset / gain 相同，取使该分段所有滑动 consistency 最高的平移量。
+    # 通过的滑动的残差偏向拟合前的参数，只用它们的中位数会把旧的偏差加回来；样本少的分段向 0 收缩
+    base = np.array([model.base_distance(r['raw_x'], r['image_width'], r['web_width']) for r in records])
+    residuals = np.array([r['dragged'] for r in records], dtype=np.float64) - base
+    outcomes = np.array([bool(r['passed']) for r in records])
+    shifts = np.linspace(-tolerance, tolerance, 25)
+    corrections = []
+    for start in np.arange(np.floor(base.min() / bin_width) * bin_width, base.max() + 1, bin_width):
+        in_bin = (base >= start) & (base < start + bin_width)
+        count = int(in_bin.sum())
+        if count < min_bin_samples:
+            continue
+        errors = np.abs(residuals[in_bin][None, :] - shifts[:, None])
+        score = np.where(outcomes[in_bin], errors <= tolerance, errors > tolerance).mean(axis=1)
+        best = np.flatnonzero(score == score.max())
+        shift = shifts[best[np.argmin(np.abs(shifts[best]))]]
+        shrink = count / (count + min_bin_samples)
+        corrections.append((float(np.median(base[in_bin])), shrink * float(shift)))
+    if len(corrections) >= 2:
+        model.corrections = corrections
+
+    errors = np.abs(model.predict(passed) - dragged)
+    model.meta = {
+        'samples': len(records),
+        'passed': len(passed),
+        'consistency': consistency(model, records, tolerance),
+        'error_p50': round(float(np.median(errors)), 3),
+        'error_p90': round(float(np.percentile(errors, 90)), 3),
+        'fitted_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    report.update(model.to_dict())
+    report['default_consistency'] = consistency(DragModel(default_offset), records, tolerance)
+    return model, report
+
+
+def refine(records: List[Dict[str, Any]], offset: float, gain: float, tolerance: float,
+           offset_span: float = 4.0, gain_span: float = 0.03, steps: int = 33) -> Tuple[float, float]:
+    """在 (offset, gain) 附近网格搜索 consistency 最高的参数，并列时取离最小二乘解最近的"""
+    scale = np.array([r['web_width'] / r['image_width'] for r in records], dtype=np.float64)
+    raw_x = np.array([r['raw_x'] for r in records], dtype=np.float64)
+    dragged = np.array([r['dragged'] for r in records], dtype=np.float64)
+    passed = np.array([bool(r['passed']) for r in records])
+
+    offsets = offset + np.linspace(-offset_span, offset_span, steps)
+    gains = gain * (1 + np.linspace(-gain_span, gain_span, steps))
+    # (gains, offsets, records)
+    errors = np.abs(gains[:, None, None] * scale * (raw_x - offsets[None, :, None]) - dragged)
+    score = np.where(passed, errors <= tolerance, errors > tolerance).mean(axis=2)
+    distance = np.abs(np.linspace(-1, 1, steps))[:, None] + np.abs(np.linspace(-1, 1, steps))[None, :]
+    best = np.flatnonzero(score == score.max())
+    i, j = np.unravel_index(best[np.argmin(distance.ravel()[best])], score.shape)
+    return float(offsets[j]), float(gains[i])
+
+
+class DragCalibrator:
+    """记录滑动结果并维护当前生效的拖动距离模型（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records_path = None
+        self.calibration_path = None
+        self.default_offset = 12.0
+        self.auto = True
+        self.refit_every = 20
+        self.min_samples = 20
+        self.tolerance = 3.0
+        self.window = 2000
+        self.holdout_every = 4
+        self.explore_rate = 0.0
+        self.explore_offset = 2.0
+        self.explore_gain = 0.02
+        self.store: Optional[SlideStore] = None
+        self._model: Optional[DragModel] = None
+        self._new_records = 0
+        self._refitting = False
+
+    def configure(self, records_path: Optional[str] = None, calibration_path: Optional[str] = None,
+                  default_offset: float = 12.0, auto: bool = True, refit_every: int = 20, min_samples: int = 20,
+                  tolerance: float = 3.0, window: int = 2000, holdout_every: int = 4, explore_rate: float = 0.0,
+                  explore_offset: float = 2.0, explore_gain: float = 0.02) -> None:
+        """更新参数；标定文件路径变化时重新加载"""
+        with self._lock:
+            self.default_offset = default_offset
+            self.auto = auto
+            self.refit_every = max(1, refit_every)
+            self.min_samples = min_samples
+            self.tolerance = tolerance
+            self.window = window
+            self.holdout_every = holdout_every
+            self.explore_rate = explore_rate
+            self.explore_offset = explore_offset
+            self.explore_gain = explore_gain
+            if records_path != self.records_path:
+                self.records_path = records_path
+                self.store = SlideStore(records_path) if records_path else None
+            if calibration_path != self.calibration_path:
+                self.calibration_path = calibration_path
+                self._model = self._load(calibration_path)
+
+    @staticmethod
+    def _load(path: Optional[str]) -> Optional[DragModel]:
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                model = DragModel.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"拖动距离标定文件不可用，已忽略: {path}, {e}")
+            return None
+        if model is None:
+            logger.warning(f"拖动距离标定文件版本不匹配，已忽略: {path}")
+        return model
+
+    @property
+    def model(self) -> DragModel:
+        """当前生效的模型，未标定时为 offset=INITIAL_SLIDER_X 的默认公式"""
+        return self._model or DragModel(self.default_offset)
+
+    def plan(self, raw_x: float, image_width: float, web_width: float) -> Tuple[float, Dict[str, Any]]:
+        """
+        计算本次拖动距离，按 explore_rate 的比例对 offset / gain 加随机扰动，距离变化限制在 tolerance 内
+        :return: (distance, info)，info 为写入滑动记录的当前参数、未扰动的距离和扰动量（未扰动时 dither 为 None）
+        """
+        model = self.model
+        nominal = model.distance(raw_x, image_width, web_width)
+        info = {'offset': model.offset, 'gain': model.gain, 'nominal_distance': round(nominal, 3), 'dither': None}
+        if self.store is None or random.random() >= self.explore_rate:
+            return nominal, info
+
+        dither = {'offset': random.uniform(-self.explore_offset, self.explore_offset),
+                  'gain': random.uniform(-self.explore_gain, self.explore_gain)}
+        explored = DragModel(model.offset + dither['offset'], model.gain * (1 + dither['gain']), model.corrections)
+        distance = float(np.clip(explored.distance(raw_x, image_width, web_width),
+                                 nominal - self.tolerance, nominal + self.tolerance))
+        info['dither'] = {key: round(value, 4) for key, value in dither.items()}
+        return distance, info
+
+    def record(self, record: Dict[str, Any]) -> None:
+        """保存一条滑动记录，累计足够的新记录后在后台重新拟合"""
+        if self.store is None:
+            return
+        record.setdefault('time', time.time())
+        self.store.append(record)
+        with self._lock:
+            self._new_records += 1
+            due = self.auto and not self._refitting and self._new_records >= self.refit_every
+            if due:
+                self._refitting = True
+                self._new_records = 0
+        if due:
+            _refit_executor.submit(self._refit_in_background)
+
+    def _refit_in_background(self) -> None:
+        try:
+            self.refit()
+        except Exception as e:
+            logger.error(f"拖动距离自动标定失败: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._refitting = False
+
+    def refit(self) -> Dict[str, Any]:
+        """用最近的记录重新拟合，在留出记录上 consistency 严格高于当前模型时替换并保存"""
+        records = self.store.load(self.window) if self.store else []
+        train, holdout = split_holdout(records, self.holdout_every)
+        candidate, report = fit(train, self.default_offset, self.tolerance, self.min_samples)
+        report['applied'] = False
+        if candidate is None:
+            logger.info(f"拖动距离未重新标定: {report.get('reason')}")
+            return report
+
+        current = consistency(self.model, holdout, self.tolerance)
+        score = consistency(candidate, holdout, self.tolerance)
+        candidate.meta['holdout'] = len(holdout)
+        candidate.meta['holdout_consistency'] = score
+        report.update(holdout=len(holdout), holdout_consistency=score, current_consistency=current)
+        if len(holdout) < MIN_HOLDOUT or score <= current:
+            logger.info(f"拖动距离新标定在 {len(holdout)} 条留出记录上不优于当前参数（{score} <= {current}），未采用")
+            return report
+        with self._lock:
+            self._model = candidate
+        self.save(candidate)
+        report['applied'] = True
+        logger.info(f"拖动距离已重新标定: offset={candidate.offset:.2f}, gain={candidate.gain:.4f}, "
+                    f"分段修正 {len(candidate.corrections)} 段, 留出记录 consistency {current} -> {score}")
+        return report
+
+    def save(self, model: DragModel) -> None:
+        if not self.calibration_path:
+            return
+        try:
+            write_json(self.calibration_path, model.to_dict(), ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"保存拖动距离标定文件失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        model = self.model
+        return {
+            'calibrated': self._model is not None,
+            'offset': round(model.offset, 3),
+            'gain': round(model.gain, 5),
+            'corrections': len(model.corrections),
+            'new_records': self._new_records,
+            'explore_rate': self.explore_rate,
+            **model.meta,
+        }
+
+
+# 全局拖动距离标定
+drag_calibrator = DragCalibrator()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从滑动记录标定拖动距离')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = sub.add_parser('fit', help='拟合并写出标定文件')
+    fit_parser.add_argument('--records', default='captcha_slides.jsonl')
+    fit_parser.add_argument('--output', default='captcha_drag.json')
+    fit_parser.add_argument('--default-offset', type=float, default=12.0, help='未标定时的滑块初始 x')
+    fit_parser.add_argument('--tolerance', type=float, default=3.0, help='滑动通过的误差范围（网页像素）')
+    fit_parser.add_argument('--min-samples', type=int, default=20)
+    fit_parser.add_argument('--dry-run', action='store_true', help='只打印拟合结果，不写文件')
+
+    eval_parser = sub.add_parser('evaluate', help='评价标定文件和默认公式')
+    eval_parser.add_argument('--records', default='captcha_slides.jsonl')
+    eval_parser.add_argument('--calibration', default='captcha_drag.json')
+    eval_parser.add_argument('--default-offset', type=float, default=12.0)
+    eval_parser.add_argument('--tolerance', type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    records = SlideStore(args.records).load()
+    if args.command == 'fit':
+        model, report = fit(records, args.default_offset, args.tolerance, args.min_samples)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        if model is not None and not args.dry_run:
+            calibrator = DragCalibrator()
+            calibrator.calibration_path = args.output
+            calibrator.save(model)
+            print(f"已写入 {args.output}")
+        return 0 if model is not None else 1
+
+    model = DragCalibrator._load(args.calibration)
+    print(json.dumps({
+        'records': len(records),
+        'default_consistency': consistency(DragModel(args.default_offset), records, args.tolerance),
+        'calibrated_consistency': consistency(model, records, args.tolerance) if model else None,
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+"""
+SliderV2 + Recognizer（slider-v1）双模型集成识别
+
+两个模型在同一张背景图上并行推理（ORT 和 cv2.dnn 推理时都会释放 GIL），
+缺口左边缘相差不超过 tolerance 像素时直接采用主模型的结果；不一致时:
+- policy=confidence: 按校准后的置信度选择，胜出方的校准置信度仍低于 min_conf 时改为刷新验证码
+- policy=refresh: 直接刷新验证码，不冒险拖动
+
+置信度校准来自真实的滑动结果：滑动通过后，与拖动位置一致的模型记为正确；滑动失败时，
+作答的模型（以及与它一致的模型）记为错误。每个模型按原始置信度分桶统计正确率，
+样本少时向原始置信度收缩。校准表可以持久化到 JSON 文件。
+
+    detector = EnsembleDetector(slider_v2, slider_v1, tolerance=4)
+    box, conf = detector.identify(image)           # 返回空框表示建议刷新
+    ensemble_stats.report_outcome(detector.last_decision(), passed=True)
+
+统计中的 prevented 为不一致时改用副模型且滑动通过的次数（只用主模型时这些滑动会拖到另一个位置），
+estimated_prevented 再加上刷新次数乘以“不一致时采用主模型”的实测失败率；
+single 为未开启集成时的滑动结果，用于对比单模型的失败率。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from captcha_recognizer.backend import image_to_array
+from captcha_recognizer.model_registry import boxes_agree
+from captcha_recognizer.storage import DebouncedWriter
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_VERSION = 1
+
+ENSEMBLE_POLICIES = ('confidence', 'refresh')
+
+# agree: 两个模型一致; primary / secondary: 不一致时采用的模型; refresh: 不一致时刷新验证码;
+# fallback: 副模型出错时只用主模型; bypass: 结果缓存或快速识别命中，没有经过集成; single: 未开启集成
+DECISIONS = ('agree', 'primary', 'secondary', 'refresh', 'fallback', 'bypass', 'single')
+
+_ensemble_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='captcha-ensemble')
+
+
+class ConfidenceCalibration:
+    """
+    按置信度分桶统计各模型的实际正确率
+
+    校准置信度 = (正确次数 + prior * 原始置信度) / (样本数 + prior)，桶内样本越多越接近实测正确率
+    """
+
+    def __init__(self, bins: int = 10, prior: float = 5.0):
+        self.bins = bins
+        self.prior = prior
+        self._counts: Dict[str, np.ndarray] = {}
+        self._hits: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _bin(self, conf: float) -> int:
+        return min(self.bins - 1, max(0, int(float(conf) * self.bins)))
+
+    def calibrated(self, model: str, conf: float) -> float:
+        with self._lock:
+            if model not in self._counts:
+                return float(conf)
+            index = self._bin(conf)
+            count, hits = self._counts[model][index], self._hits[model][index]
+        return float((hits + self.prior * conf) / (count + self.prior))
+
+    def update(self, model: str, conf: float, correct: bool) -> None:
+        with self._lock:
+            if model not in self._counts:
+                self._counts[model] = np.zeros(self.bins, dtype=np.int64)
+                self._hits[model] = np.zeros(self.bins, dtype=np.int64)
+            index = self._bin(conf)
+            self._counts[model][index] += 1
+            self._hits[model][index] += int(correct)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'version': CALIBRATION_VERSION,
+                'bins': self.bins,
+                'models': {model: {'counts': self._counts[model].tolist(), 'hits': self._hits[model].tolist()}
+                           for model in self._counts},
+            }
+
+    def load_dict(self, data: Dict[str, Any]) -> bool:
+        if data.get('version') != CALIBRATION_VERSION or data.get('bins') != self.bins:
+            return False
+        with self._lock:
+            for model, table in data.get('models', {}).items():
+                self._counts[model] = np.array(table['counts'], dtype=np.int64)
+                self._hits[model] = np.array(table['hits'], dtype=np.int64)
+        return True
+
+
+class EnsembleStats:
+    """集成识别的决策统计、滑动结果统计和置信度校准（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.calibration = ConfidenceCalibration()
+        self.path = None
+        self._writer = DebouncedWriter(lambda: self.path, self.calibration.to_dict, label='集成识别校准文件',
+                                       ensure_ascii=False)
+        self.reset()
+        self.configure(path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.decisions = {decision: 0 for decision in DECISIONS}
+            self.outcomes = {decision: {'passed': 0, 'failed': 0} for decision in DECISIONS}
+            self.offsets: List[float] = []
+            self.secondary_ms: List[float] = []
+
+    def configure(self, path: Optional[str] = None) -> None:
+        """设置校准表持久化文件并加载已有的校准数据"""
+        if not path or path == self.path:
+            return
+        self.path = path
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                if not self.calibration.load_dict(json.load(f)):
+                    logger.warning(f"集成识别校准文件版本不匹配，已忽略: {path}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"集成识别校准文件不可用，已忽略: {path}, {e}")
+
+    def save(self) -> None:
+        """立即持久化置信度校准表"""
+        self._writer.flush(force=True)
+
+    def record(self, decision: Dict[str, Any]) -> None:
+        with self._lock:
+            self.decisions[decision['decision']] += 1
+            if decision.get('offset') is not None:
+                self.offsets.append(decision['offset'])
+                del self.offsets[:-1000]
+            if decision.get('secondary_ms') is not None:
+                self.secondary_ms.append(decision['secondary_ms'])
+                del self.secondary_ms[:-1000]
+
+    def report_outcome(self, decision: Optional[Dict[str, Any]], passed: bool, tolerance: float = 4.0) -> None:
+        """
+        记录一次滑动的结果
+        :param decision: identify 时的决策（EnsembleDetector.last_decision()），未开启集成时传 None
+        :param passed: 滑动验证是否通过
+        """
+        if decision is None:
+            decision = {'decision': 'single', 'answers': {}}
+        key = 'passed' if passed else 'failed'
+        with self._lock:
+            self.outcomes[decision['decision']][key] += 1
+
+        chosen = decision.get('box')
+        if not chosen:
+            return
+        for model, (box, conf) in decision['answers'].items():
+            if not box:
+                continue
+            agrees = boxes_agree(box, chosen, decision.get('tolerance', tolerance))
+            if passed:
+                self.calibration.update(model, conf, agrees)
+            elif agrees:
+                self.calibration.update(model, conf, False)
+        self._writer.schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = dict(self.decisions)
+            outcomes = {decision: dict(counts) for decision, counts in self.outcomes.items()}
+            offsets = list(self.offsets)
+            secondary_ms = list(self.secondary_ms)
+
+        def fail_rate(*names):
+            failed = sum(outcomes[name]['failed'] for name in names)
+            total = failed + sum(outcomes[name]['passed'] for name in names)
+            return round(failed / total, 4) if total else None
+
+        primary_disagree_fail_rate = fail_rate('primary')
+        prevented = outcomes['secondary']['passed']
+        estimated = prevented
+        if primary_disagree_fail_rate is not None:
+            estimated += decisions['refresh'] * primary_disagree_fail_rate
+        identified = sum(decisions[name] for name in DECISIONS if name not in ('bypass', 'single'))
+        return {
+            'decisions': decisions,
+            'agreement_rate': round(decisions['agree'] / identified, 4) if identified else None,
+            'outcomes': outcomes,
+            'ensemble_fail_rate': fail_rate('agree', 'primary', 'secondary', 'fallback'),
+            'single_fail_rate': fail_rate('single'),
+            'primary_disagree_fail_rate': primary_disagree_fail_rate,
+            'prevented': prevented,
+            'estimated_prevented': round(estimated, 2),
+            'disagree_offset_p50': round(float(np.median(offsets)), 3) if offsets else None,
+            'secondary_ms_mean': round(float(np.mean(secondary_ms)), 3) if secondary_ms else None,
+        }
+
+
+# 全局集成识别统计
+ensemble_stats = EnsembleStats()
+
+
+class EnsembleDetector:
+    """
+    双模型集成识别，接口与 SliderV2.identify 相同
+
+    :param primary: 主模型（SliderV2、模型注册表中的槽位或工作进程池）
+    :param secondary: 副模型（Recognizer 或其槽位），出错时只用主模型
+    :param tolerance: 两个模型缺口左边缘相差不超过该值（像素）视为一致
+    :param policy: 不一致时的处理，ENSEMBLE_POLICIES 之一
+    :param min_conf: policy=confidence 时胜出方的最低校准置信度，低于该值时刷新验证码
+    :param allow_refresh: 为 False 时（例如最后一次尝试）不一致也不刷新，按校准置信度选择
+    """
+
+    def __init__(self, primary, secondary, tolerance: float = 4.0, policy: str = 'confidence',
+                 min_conf: float = 0.5, allow_refresh: bool = True,
+                 names: Tuple[str, str] = ('slider-v2', 'slider-v1'), stats: EnsembleStats = ensemble_stats):
+        if policy not in ENSEMBLE_POLICIES:
+            raise ValueError(f"未知的集成策略: {policy}，可选值: {ENSEMBLE_POLICIES}")
+        self.primary = primary
+        self.secondary = secondary
+        self.tolerance = tolerance
+        self.policy = policy
+        self.min_conf = min_conf
+        self.allow_refresh = allow_refresh
+        self.names = names
+        self.stats = stats
+        self._local = threading.local()
+
+    def last_decision(self) -> Optional[Dict[str, Any]]:
+        """当前线程最近一次识别的决策，滑动结束后交给 EnsembleStats.report_outcome"""
+        return getattr(self._local, 'decision', None)
+
+    def _run_secondary(self, image: np.ndarray) -> Tuple[List[float], float, float]:
+        start = time.perf_counter()
+        box, conf = self.secondary.identify(image)
+        return list(box), float(conf), (time.perf_counter() - start) * 1000
+
+    def identify(self, source: Union[str, Path, bytes, np.ndarray], **kwargs) -> Tuple[List[float], float]:
+        image = image_to_array(source)
+        future = _ensemble_executor.submit(self._run_secondary, image)
+        box, conf = self.primary.identify(image, **kwargs)
+        box, conf = list(box), float(conf)
+        primary_name, secondary_name = self.names
+        decision = {'answers': {primary_name: (box, conf)}, 'tolerance': self.tolerance}
+
+        try:
+            secondary_box, secondary_conf, decision['secondary_ms'] = future.result()
+        except Exception as e:
+            logger.warning(f"副模型 {secondary_name} 识别失败，只使用主模型: {e}")
+            return self._decide(decision, 'fallback', box, conf)
+        decision['answers'][secondary_name] = (secondary_box, secondary_conf)
+
+        if boxes_agree(box, secondary_box, self.tolerance):
+            return self._decide(decision, 'agree', box, conf)
+
+        if box and secondary_box:
+            decision['offset'] = abs(float(box[0]) - float(secondary_box[0]))
+        primary_score = self.stats.calibration.calibrated(primary_name, conf) if box else 0.0
+        secondary_score = self.stats.calibration.calibrated(secondary_name, secondary_conf) if secondary_box else 0.0
+        decision['scores'] = {primary_name: round(primary_score, 4), secondary_name: round(secondary_score, 4)}
+        logger.info(f"集成识别不一致: {primary_name}={box[:1]}({primary_score:.3f}), "
+                    f"{secondary_name}={secondary_box[:1]}({secondary_score:.3f})")
+
+        if self.allow_refresh and (self.policy == 'refresh' or max(primary_score, secondary_score) < self.min_conf):
+            return self._decide(decision, 'refresh', [], 0.0)
+        if secondary_score > primary_score:
+            return self._decide(decision, 'secondary', secondary_box, secondary_conf)
+        return self._decide(decision, 'primary', box, conf)
+
+    def _decide(self, decision: Dict[str, Any], name: str, box: List[float], conf: float) -> Tuple[List[float], float]:
+        decision.update({'decision': name, 'box': box, 'conf': conf})
+        self._local.decision = decision
+        self.stats.record(decision)
+        return box, conf
@@ -0,0 +1,401 @@
+"""
+可热切换的验证码模型注册表
+
+每个模型名（slider-v2 / slider-v1）对应一个 ModelSlot，调用方通过 slot.identify 使用当前生效的模型。
+不重启服务即可加载候选模型并进入影子评估：
+
+    slot = model_registry.get('slider-v2', **config_manager.slider_options)
+    box, conf = slot.identify(image)                        # 始终由生效模型返回结果
+    slot.load_candidate('slider-v2.new.onnx', sample_rate=0.2)
+    slot.status()['shadow']                                 # 候选模型的耗时和与生效模型的一致率
+    slot.promote()                                          # 原子切换为候选模型
+    slot.rollback()                                         # 切回上一个模型
+
+影子阶段按 sample_rate 抽样真实验证码，在后台单线程中运行候选模型，不占用识别的关键路径；
+后台积压时直接跳过抽样。切换只替换一个引用，正在进行的识别继续使用切换前的模型。
+生效模型的路径可以持久化到 JSON 文件，重启后继续使用。
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from captcha_recognizer.backend import image_to_array
+from captcha_recognizer.batcher import LatencyHistogram
+from captcha_recognizer.session import MODELS_DIR, variant_path
+from captcha_recognizer.storage import write_json
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = ('slider-v2', 'slider-v1')
+
+# 后台影子评估最多积压的任务数，超过后跳过抽样
+MAX_SHADOW_PENDING = 4
+
+_shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='captcha-shadow')
+
+
+def build_model(name: str, model_path: Optional[str] = None, **options):
+    """按模型名构造识别模型，model_path 为空时使用 options 中的精度变体"""
+    if name == 'slider-v2':
+        from captcha_recognizer.slider import SliderV2
+        return SliderV2(model_path=model_path, **options)
+    if name == 'slider-v1':
+        from captcha_recognizer.recognizer import Recognizer
+        return Recognizer(model_path=model_path, **options)
+    raise ValueError(f"未知的模型: {name}，可选值: {MODEL_NAMES}")
+
+
+def _inside_models_dir(path: str) -> bool:
+    models_dir = os.path.realpath(MODELS_DIR)
+    try:
+        return os.path.commonpath([os.path.realpath(path), models_dir]) == models_dir
+    except ValueError:
+        # Windows 下不同盘符的路径
+        return False
+
+
+def resolve_model_path(path: str) -> str:
+    """
+    解析候选模型路径：只接受 captcha_recognizer/models 下的相对路径（解析符号链接后也不能跳出该目录），
+    文件必须存在
+    """
+    if not path or os.path.isabs(path):
+        raise ValueError(f"模型路径必须是相对 captcha_recognizer/models 的路径: {path}")
+    resolved = os.path.realpath(os.path.join(MODELS_DIR, path))
+    if not _inside_models_dir(resolved):
+        raise ValueError(f"模型路径不能超出 captcha_recognizer/models: {path}")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"模型文件不存在: {path}")
+    return resolved
+
+
+def boxes_agree(box_a: List[float], box_b: List[float], tolerance: float) -> bool:
+    """两个缺口框的左边缘相差不超过 tolerance 像素视为一致，都未识别出缺口也视为一致"""
+    if not box_a or not box_b:
+        return not box_a and not box_b
+    return abs(float(box_a[0]) - float(box_b[0])) <= tolerance
+
+
+class ShadowStats:
+    """候选模型影子评估的统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = self.agreements = self.errors = self.skipped = 0
+        self.offsets: List[float] = []
+        self.active_latency = LatencyHistogram()
+        self.candidate_latency = LatencyHistogram()
+
+    def record(self, agree: bool, offset: Optional[float], active_ms: float, candidate_ms: float) -> None:
+        self.active_latency.observe(active_ms)
+        self.candidate_latency.observe(candidate_ms)
+        with self._lock:
+            self.samples += 1
+            self.agreements += agree
+            if offset is not None:
+                self.offsets.append(offset)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def record_skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            offsets = np.abs(np.array(self.offsets)) if self.offsets else None
+            summary = {
+                'samples': self.samples,
+                'agreements': self.agreements,
+                'agreement_rate': round(self.agreements / self.samples, 4) if self.samples else None,
+                'errors': self.errors,
+                'skipped': self.skipped,
+                'mean_abs_offset_px': round(float(offsets.mean()), 3) if offsets is not None else None,
+                'p95_abs_offset_px': round(float(np.percentile(offsets, 95)), 3) if offsets is not None else None,
+            }
+        summary['active_latency'] = self.active_latency.stats()
+        summary['candidate_latency'] = self.candidate_latency.stats()
+        return summary
+
+
+class ModelSlot:
+    """
+    一个模型名的生效模型、上一个模型和候选模型
+
+    identify / identify_batch 与 SliderV2 的接口相同，可以直接替代模型传给
+    ResultCache.identify、CascadeDetector 和 MicroBatcher。
+    """
+
+    def __init__(self, name: str, options: Optional[Dict] = None, path: Optional[str] = None,
+                 sample_rate: float = 0.2, tolerance: float = 3.0, on_change=None):
+        self.name = name
+        self.options = dict(options or {})
+        self.sample_rate = sample_rate
+        self.tolerance = tolerance
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._active: Optional[Tuple[Any, str]] = None
+        self._active_source = path
+        self._previous: Optional[Tuple[Any, str]] = None
+        self._candidate: Optional[Tuple[Any, str]] = None
+        self._pending = 0
+        self.shadow = ShadowStats()
+        self.swaps = 0
+
+    def _load(self, path: Optional[str]) -> Tuple[Any, str]:
+        path = path or variant_path(self.name, self.options.get('variant', 'fp32'))
+        return build_model(self.name, model_path=path, **self.options), path
+
+    @property
+    def active(self) -> Tuple[Any, str]:
+        """(生效模型, 模型路径)，首次访问时加载"""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    try:
+                        if self._active_source is not None and not _inside_models_dir(self._active_source):
+                            raise ValueError('模型路径超出 captcha_recognizer/models')
+                        self._active = self._load(self._active_source)
+                    except Exception as e:
+                        if self._active_source is None:
+                            raise
+                        # 持久化的模型文件不可用时回到默认模型
+                        logger.error(f"加载已切换的模型失败，使用默认模型: {self._active_source}, {e}")
+                        self._active = self._load(None)
+                active = self._active
+        return active
+
+    @property
+    def model(self):
+        return self.active[0]
+
+    def restore(self, path: Optional[str]) -> bool:
+        """模型还没有加载且没有切换过时，把持久化的生效模型路径设为 path，返回是否生效"""
+        with self._lock:
+            if self._active is not None or self.swaps or path is None:
+                return False
+            self._active_source = path
+            return True
+
+    def identify(self, source, **kwargs) -> Tuple[List[float], float]:
+        model, _ = self.active
+        candidate = self._sample()
+        if candidate is None:
+            return model.identify(source, **kwargs)
+
+        image = image_to_array(source)
+        start = time.perf_counter()
+        box, conf = model.identify(image, **kwargs)
+        active_ms = (time.perf_counter() - start) * 1000
+        self._shadow(candidate, image, box, active_ms, kwargs)
+        return box, conf
+
+    @property
+    def batch_limit(self) -> Optional[int]:
+        """生效模型单次实际支持的最大批次，没有 identify_batch 的模型为 1，None 表示不限"""
+        model, _ = self.active
+        if not hasattr(model, 'identify_batch'):
+            return 1
+        return getattr(model, 'batch_limit', None)
+
+    def identify_batch(self, sources: List, **kwargs) -> List[Tuple[List[float], float]]:
+        model, _ = self.active
+        images = [image_to_array(source) for source in sources]
+        start = time.perf_counter()
+        if hasattr(model, 'identify_batch'):
+            results = model.identify_batch(images, **kwargs)
+        else:
+            results = [model.identify(image, **kwargs) for image in images]
+        per_image_ms = (time.perf_counter() - start) * 1000 / max(1, len(images))
+        for image, (box, _) in zip(images, results):
+            candidate = self._sample()
+            if candidate is not None:
+                self._shadow(candidate, image, box, per_image_ms, kwargs)
+        return results
+
+    def _sample(self) -> Optional[Tuple[Any, str]]:
+        candidate = self._candidate
+        if candidate is None or random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            if self._pending >= MAX_SHADOW_PENDING:
+                self.shadow.record_skip()
+                return None
+            self._pending += 1
+        return candidate
+
+    def _shadow(self, candidate: Tuple[Any, str], image: np.ndarray, active_box: List[float], active_ms: float,
+                kwargs: Dict) -> None:
+        kwargs = {key: value for key, value in kwargs.items() if key != 'show'}
+        _shadow_executor.submit(self._evaluate, candidate, image, active_box, active_ms, kwargs)
+
+    def _evaluate(self, candidate: Tuple[Any, str], image: np.ndarray, active_box: List[float], active_ms: float,
+                  kwargs: Dict) -> None:
+        try:
+            start = time.perf_counter()
+            box, _ = candidate[0].identify(image, **kwargs)
+            candidate_ms = (time.perf_counter() - start) * 1000
+            # 评估期间候选模型已被切换或丢弃时不再记录
+            if self._candidate is candidate:
+                offset = float(box[0]) - float(active_box[0]) if box and active_box else None
+                self.shadow.record(boxes_agree(active_box, box, self.tolerance), offset, active_ms, candidate_ms)
+        except Exception as e:
+            self.shadow.record_error()
+            logger.warning(f"候选模型影子评估失败: {candidate[1]}, {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def load_candidate(self, path: str, sample_rate: Optional[float] = None,
+                       tolerance: Optional[float] = None) -> Dict[str, Any]:
+        """加载候选模型（先用空白图片试运行一次），并重新开始影子评估"""
+        path = resolve_model_path(path)
+        model, path = self._load(path)
+        model.identify(np.zeros((160, 320, 3), dtype=np.uint8))
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+            if tolerance is not None:
+                self.tolerance = float(tolerance)
+            self._candidate = (model, path)
+            self.shadow = ShadowStats()
+        logger.info(f"已加载候选模型 {self.name}: {path}，抽样比例 {self.sample_rate}")
+        return self.status()
+
+    def promote(self) -> Dict[str, Any]:
+        """把候选模型切换为生效模型，原生效模型保留用于回滚"""
+        self.active
+        with self._lock:
+            if self._candidate is None:
+                raise ValueError(f"模型 {self.name} 没有候选模型")
+            self._previous, self._active, self._candidate = self._active, self._candidate, None
+            self.swaps += 1
+            evaluation = self.shadow.stats()
+        logger.info(f"模型 {self.name} 已切换: {self._previous[1]} -> {self._active[1]}，"
+                    f"影子评估一致率 {evaluation['agreement_rate']}（{evaluation['samples']} 个样本）")
+        self._changed()
+        return self.status()
+
+    def rollback(self) -> Dict[str, Any]:
+        """切回上一个生效模型"""
+        with self._lock:
+            if self._previous is None:
+                raise ValueError(f"模型 {self.name} 没有可回滚的模型")
+            self._active, self._previous = self._previous, self._active
+            self.swaps += 1
+        logger.info(f"模型 {self.name} 已回滚: {self._previous[1]} -> {self._active[1]}")
+        self._changed()
+        return self.status()
+
+    def discard(self) -> Dict[str, Any]:
+        """丢弃候选模型，结束影子评估"""
+        with self._lock:
+            self._candidate = None
+        return self.status()
+
+    def _changed(self) -> None:
+        if self._on_change is not None:
+            self._on_change()
+
+    @property
+    def active_path(self) -> Optional[str]:
+        return self._active[1] if self._active is not None else self._active_source
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            candidate, previous = self._candidate, self._previous
+        return {
+            'active': self.active_path,
+            'previous': previous[1] if previous is not None else None,
+            'candidate': candidate[1] if candidate is not None else None,
+            'sample_rate': self.sample_rate,
+            'tolerance': self.tolerance,
+            'swaps': self.swaps,
+            'shadow': self.shadow.stats() if candidate is not None else None,
+        }
+
+
+class ModelRegistry:
+    """
+    模型名到 ModelSlot 的注册表
+
+    :param path: 持久化生效模型路径的 JSON 文件，为空时只保存在内存中
+    :param sample_rate: 影子评估的默认抽样比例
+    :param tolerance: 判定两个模型结果一致的缺口 x 误差（像素）
+    """
+
+    def __init__(self, path: Optional[str] = None, sample_rate: float = 0.2, tolerance: float = 3.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.tolerance = tolerance
+        self._slots: Dict[str, ModelSlot] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, path: Optional[str] = None, sample_rate: Optional[float] = None,
+                  tolerance: Optional[float] = None) -> None:
+        """
+        更新参数；持久化文件变化时，已创建但还没有加载模型的 slot 改用文件中的生效模型
+        （配置之前就调用了 get 的情况）
+        """
+        if path is not None and path != self.path:
+            self.path = path
+            saved = self._saved()
+            with self._lock:
+                for name, slot in self._slots.items():
+                    slot.restore(saved.get(name))
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if tolerance is not None:
+            self.tolerance = tolerance
+
+    def get(self, name: str, **options) -> ModelSlot:
+        """获取模型名对应的 slot，首次调用时用 options 作为模型构造参数"""
+        if name not in MODEL_NAMES:
+            raise ValueError(f"未知的模型: {name}，可选值: {MODEL_NAMES}")
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is None:
+                slot = self._slots[name] = ModelSlot(name, options, self._saved().get(name), self.sample_rate,
+                                                     self.tolerance, on_change=self.save)
+            return slot
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            slots = dict(self._slots)
+        return {name: slot.status() for name, slot in slots.items()}
+
+    def _saved(self) -> Dict[str, str]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"模型注册表文件不可用，已忽略: {self.path}, {e}")
+            return {}
+
+    def save(self) -> None:
+        """持久化各模型的生效路径（先写临时文件再替换）"""
+        if not self.path:
+            return
+        data = self._saved()
+        with self._lock:
+            data.update({name: slot.active_path for name, slot in self._slots.items() if slot.swaps})
+        try:
+            write_json(self.path, data, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"保存模型注册表失败: {e}")
+
+
+# 创建全局模型注册表实例
+model_registry = ModelRegistry()
@@ -0,0 +1,325 @@
+"""
+验证码识别的按需性能分析
+
+开启后每次验证码识别生成一个 JSON trace（以任务 trace_id 命名，写到 LOG_DIR/captcha_traces），包含:
+- 各阶段耗时: preprocess / inference / nms / mask / pick 等（阶段可以嵌套，depth 表示层级）
+- ORT 内置性能分析器统计的算子耗时（每次识别使用单独开启分析的会话，不影响共享会话）
+
+ORT 会话结束分析后不能重新开始，因此每次识别都要新建分析会话。为了让 inference 阶段只反映推理本身，
+profile_attempt 在开始计时前为已加载的每个模型创建并预热分析会话，这部分耗时单独记为 session_setup 阶段
+（start_ms 为负，不计入 total_ms），预热推理的算子事件也不计入统计。计时开始后才首次用到的模型不做 ORT 分析，
+直接使用共享会话（trace 的 ort.unprepared 列出这些模型）。IOBinding 路径同样在分析会话上运行。
+
+    with profile_attempt(trace_id, trace_dir, ort=True, attempt=1) as profile:
+        box, conf = model.identify(image)
+        profile.result(box=box, conf=conf)
+
+max_traces 限制目录中保留的 trace 数量，写出新 trace 后删除最早的。
+
+识别代码通过 stage('nms') 标记阶段，没有进行中的分析时 stage 不做任何事。
+分析只记录调用 profile_attempt 的线程，工作进程和影子评估线程中的推理不会计入。
+
+汇总多个 trace:
+    python -m captcha_recognizer.profiling --dir logs/captcha_traces --top 15
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class CaptchaProfile:
+    """一次验证码识别的阶段耗时和 ORT 算子耗时"""
+
+    def __init__(self, trace_id: str, trace_dir: str, ort: bool = True, max_traces: Optional[int] = None, **meta):
+        self.trace_id = trace_id or 'no-trace'
+        self.trace_dir = trace_dir
+        self.ort = ort
+        self.max_traces = max_traces
+        self.meta = meta
+        self.stages: List[Dict[str, Any]] = []
+        self.outcome: Dict[str, Any] = {}
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.depth = 0
+        self._sessions: Dict[str, Any] = {}
+        self._unprepared: List[str] = []
+        self._resources: Dict[Any, Any] = {}
+
+    def add_stage(self, name: str, start: float, seconds: float, depth: int) -> None:
+        self.stages.append({'name': name, 'start_ms': round((start - self.start) * 1000, 3),
+                            'ms': round(seconds * 1000, 3), 'depth': depth})
+
+    def prepare(self, paths: Optional[List[str]] = None) -> None:
+        """
+        在计时开始前为 paths（默认为会话注册表中已加载的模型）创建并预热开启 ORT 性能分析的会话，
+        耗时记为 session_setup 阶段，之后的阶段从预热完成时开始计时
+        """
+        if not self.ort:
+            return
+        from captcha_recognizer.session import registry
+
+        start = time.perf_counter()
+        for path in registry.loaded_paths() if paths is None else paths:
+            path = os.path.abspath(path)
+            prefix = os.path.join(self.trace_dir, f'ort_{safe_name(self.trace_id)}_{os.path.basename(path)}')
+            try:
+                session = registry.profiling_session(path, prefix)
+                registry.warmup(session)
+            except Exception as e:
+                logger.warning(f"创建 ORT 性能分析会话失败，使用共享会话: {path}, {e}")
+                continue
+            self._sessions[path] = session
+        setup = time.perf_counter() - start
+        self.start = time.perf_counter()
+        self.stages.append({'name': 'session_setup', 'start_ms': -round(setup * 1000, 3),
+                            'ms': round(setup * 1000, 3), 'depth': 0})
+
+    def session(self, path: str, default):
+        """返回预先创建的开启了 ORT 性能分析的会话，没有预先创建时返回共享会话 default"""
+        if not self.ort:
+            return default
+        path = os.path.abspath(path)
+        session = self._sessions.get(path)
+        if session is None:
+            if path not in self._unprepared:
+                self._unprepared.append(path)
+            return default
+        return session
+
+    def resource(self, key, factory):
+        """本次分析期间缓存的对象（例如绑定到分析会话的 IOBinding 缓冲区），首次访问时调用 factory 创建"""
+        value = self._resources.get(key)
+        if value is None:
+            value = self._resources[key] = factory()
+        return value
+
+    def result(self, **outcome) -> None:
+        """记录识别结果，写入 trace"""
+        self.outcome.update(outcome)
+
+    def _ort_operators(self) -> Dict[str, Any]:
+        operators: Dict[str, Dict[str, Any]] = {}
+        runs_ms = 0.0
+        for path, session in self._sessions.items():
+            profile_file = session.end_profiling()
+            try:
+                with open(profile_file, encoding='utf-8') as f:
+                    events = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取 ORT 性能分析文件失败: {profile_file}, {e}")
+                continue
+            finally:
+                if os.path.exists(profile_file):
+                    os.remove(profile_file)
+            model = os.path.basename(path)
+            # 第一次 model_run 是 prepare 中的预热推理，它及之前的事件不计入
+            runs = [event for event in events if event.get('cat') == 'Session' and event.get('name') == 'model_run']
+            warmup_end = runs[0]['ts'] + runs[0].get('dur', 0) if runs else 0
+            for event in events:
+                if event.get('ts', 0) <= warmup_end:
+                    continue
+                if event.get('cat') == 'Session' and event.get('name') == 'model_run':
+                    runs_ms += event.get('dur', 0) / 1000
+                if event.get('cat') != 'Node' or not event.get('name', '').endswith('_kernel_time'):
+                    continue
+                node = event['name'][:-len('_kernel_time')]
+                op = operators.setdefault(f'{model}:{node}', {
+                    'model': model, 'node': node, 'op_type': event.get('args', {}).get('op_name', ''),
+                    'ms': 0.0, 'calls': 0})
+                op['ms'] += event.get('dur', 0) / 1000
+                op['calls'] += 1
+        ops = sorted(operators.values(), key=lambda op: op['ms'], reverse=True)
+        for op in ops:
+            op['ms'] = round(op['ms'], 3)
+        return {'model_run_ms': round(runs_ms, 3), 'operators': ops, 'unprepared': self._unprepared}
+
+    def finish(self) -> Optional[str]:
+        """结束分析并写出 trace 文件，返回文件路径"""
+        trace = {
+            'trace_id': self.trace_id,
+            'started_at': self.started_at.isoformat(timespec='milliseconds'),
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'meta': self.meta,
+            'outcome': self.outcome,
+            'stages': self.stages,
+            'ort': self._ort_operators() if self._sessions or self._unprepared else None,
+        }
+        name = f"{safe_name(self.trace_id)}_{self.started_at.strftime('%Y%m%d-%H%M%S-%f')}.json"
+        path = os.path.join(self.trace_dir, name)
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f, ensure_ascii=False, indent=2, default=float)
+        except OSError as e:
+            logger.error(f"写入验证码性能分析 trace 失败: {e}")
+            return None
+        logger.info(f"验证码性能分析 trace 已保存: {path}，总耗时 {trace['total_ms']} ms")
+        if self.max_traces:
+            prune_traces(self.trace_dir, self.max_traces)
+        return path
+
+
+def prune_traces(trace_dir: str, keep: int) -> int:
+    """只保留最新的 keep 个 trace 文件（ORT 的原始分析文件读取后已删除），返回删除的数量"""
+    paths = [path for path in glob.glob(os.path.join(trace_dir, '*.json'))
+             if not os.path.basename(path).startswith('ort_')]
+    if len(paths) <= keep:
+        return 0
+    paths.sort(key=os.path.getmtime)
+    removed = 0
+    for path in paths[:len(paths) - keep]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def safe_name(value: str) -> str:
+    return re.sub(r'[^0-9A-Za-z_.-]', '_', str(value))
+
+
+def active() -> Optional[CaptchaProfile]:
+    """当前线程进行中的分析，没有时返回 None"""
+    return getattr(_local, 'profile', None)
+
+
+def session_for(path: str, session):
+    """有进行中的分析时返回开启了 ORT 性能分析的会话，否则返回 session"""
+    profile = active()
+    return session if profile is None else profile.session(path, session)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """标记一个识别阶段，没有进行中的分析时不计时"""
+    profile = active()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    profile.depth += 1
+    try:
+        yield
+    finally:
+        profile.depth -= 1
+        profile.add_stage(name, start, time.perf_counter() - start, profile.depth)
+
+
+@contextmanager
+def profile_attempt(trace_id: str, trace_dir: str, ort: bool = True, models: Optional[List[str]] = None,
+                    max_traces: Optional[int] = None, **meta) -> Iterator[CaptchaProfile]:
+    """
+    在当前线程分析一次识别，结束时写出 trace；profile.path 为 trace 文件路径
+    :param models: 需要 ORT 分析的模型文件，默认为会话注册表中已加载的模型
+    :param max_traces: 目录中最多保留的 trace 数量，None 表示不限
+    """
+    profile = CaptchaProfile(trace_id, trace_dir, ort, max_traces, **meta)
+    profile.prepare(models)
+    previous = active()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+        profile.path = profile.finish()
+
+
+def load_traces(trace_dir: str) -> List[Dict[str, Any]]:
+    traces = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, '*.json'))):
+        try:
+            with open(path, encoding='utf-8') as f:
+                trace = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if 'stages' in trace:
+            trace['file'] = os.path.basename(path)
+            traces.append(trace)
+    return traces
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    array = np.array(values, dtype=np.float64)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(array.mean()), 3),
+        'p50_ms': round(float(np.percentile(array, 50)), 3),
+        'p95_ms': round(float(np.percentile(array, 95)), 3),
+        'max_ms': round(float(array.max()), 3),
+    }
+
+
+def summarize(traces: List[Dict[str, Any]], top: int = 15) -> Dict[str, Any]:
+    """汇总多个 trace: 各阶段耗时分布、最慢的算子和算子类型、最慢的 trace"""
+    if not traces:
+        return {'traces': 0}
+    stages: Dict[str, List[float]] = {}
+    for trace in traces:
+        for item in trace['stages']:
+            stages.setdefault(item['name'], []).append(item['ms'])
+
+    operators: Dict[str, Dict[str, Any]] = {}
+    op_types: Dict[str, float] = {}
+    profiled = 0
+    for trace in traces:
+        if not trace.get('ort'):
+            continue
+        profiled += 1
+        for op in trace['ort']['operators']:
+            key = f"{op['model']}:{op['node']}"
+            entry = operators.setdefault(key, {'model': op['model'], 'node': op['node'], 'op_type': op['op_type'],
+                                               'total_ms': 0.0, 'traces': 0})
+            entry['total_ms'] += op['ms']
+            entry['traces'] += 1
+            op_types[op['op_type']] = op_types.get(op['op_type'], 0.0) + op['ms']
+
+    slowest_ops = sorted(operators.values(), key=lambda op: op['total_ms'], reverse=True)[:top]
+    for op in slowest_ops:
+        op['mean_ms'] = round(op['total_ms'] / op['traces'], 3)
+        op['total_ms'] = round(op['total_ms'], 3)
+
+    return {
+        'traces': len(traces),
+        'ort_profiled_traces': profiled,
+        'total': _distribution([trace['total_ms'] for trace in traces]),
+        'stages': {name: _distribution(values)
+                   for name, values in sorted(stages.items(), key=lambda item: -float(np.mean(item[1])))},
+        'slowest_operators': slowest_ops,
+        'slowest_op_types': [{'op_type': op_type, 'mean_ms': round(ms / profiled, 3)}
+                             for op_type, ms in sorted(op_types.items(), key=lambda item: -item[1])[:top]],
+        'slowest_traces': [{'file': trace['file'], 'trace_id': trace['trace_id'], 'total_ms': trace['total_ms']}
+                           for trace in sorted(traces, key=lambda trace: -trace['total_ms'])[:top]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='汇总验证码识别的性能分析 trace')
+    parser.add_argument('--dir', default=os.path.join('logs', 'captcha_traces'), help='trace 目录')
+    parser.add_argument('--trace-id', help='只汇总文件名以该 trace_id 开头的 trace')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.dir)
+    if args.trace_id:
+        traces = [trace for trace in traces if trace['file'].startswith(safe_name(args.trace_id))]
+    print(json.dumps(summarize(traces, args.top), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+生成验证码模型的低精度变体（INT8 / FP16），并与 FP32 模型做一致性检查
+
+用法:
+    python -m captcha_recognizer.quantize --model slider-v2 --variant int8-static --calib-dir test-image
+    python -m captcha_recognizer.quantize --model slider-v1 --variant int8-dynamic --calib-dir test-image
+
+变体写到 models 目录（例如 slider-v2.int8-static.onnx），同时生成 .parity.json 检查报告。
+检查不通过的变体会改名为 .rejected.onnx，加载时不会被选中。
+"""
+import argparse
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import onnx
+
+from captcha_recognizer.benchmark import load_images
+from captcha_recognizer.session import model_path
+
+QUANTIZED_VARIANTS = ('fp16', 'int8-dynamic', 'int8-static')
+
+
+def slider_v2_preprocess(image: np.ndarray) -> np.ndarray:
+    from captcha_recognizer.slider import SliderV2
+
+    return SliderV2.preprocess(image, (640, 640))
+
+
+def slider_v1_preprocess(image: np.ndarray) -> np.ndarray:
+    from captcha_recognizer.recognizer import Recognizer
+
+    return Recognizer.preprocess(image)[0]
+
+
+PREPROCESS = {
+    'slider-v2': slider_v2_preprocess,
+    'slider-v1': slider_v1_preprocess,
+}
+
+
+def make_calibration_reader(images: List[np.ndarray], input_name: str, preprocess: Callable):
+    """构造静态量化用的校准数据读取器"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class CaptchaCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(images)
+
+        def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+            image = next(self._images, None)
+            return None if image is None else {input_name: preprocess(image)}
+
+    return CaptchaCalibrationReader()
+
+
+def build_variant(name: str, variant: str, calib_images: List[np.ndarray]) -> str:
+    """
+    由 FP32 模型生成指定精度的变体
+    :param name: 模型名称，slider-v2 或 slider-v1
+    :param variant: fp16 / int8-dynamic / int8-static
+    :param calib_images: 静态量化的校准图片
+    :return: 变体模型路径
+    """
+    src = model_path(f'{name}.onnx')
+    dst = model_path(f'{name}.{variant}.onnx')
+
+    if variant == 'fp16':
+        try:
+            from onnxconverter_common import float16
+        except ImportError:
+            raise RuntimeError("生成 FP16 模型需要安装 onnxconverter-common: pip install onnxconverter-common")
+        model = float16.convert_float_to_float16(onnx.load(src), keep_io_types=True)
+        onnx.save(model, dst)
+
+    elif variant == 'int8-dynamic':
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+
+    elif variant == 'int8-static':
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        if not calib_images:
+            raise RuntimeError("静态量化需要校准图片")
+        input_name = onnx.load(src, load_external_data=False).graph.input[0].name
+        reader = make_calibration_reader(calib_images, input_name, PREPROCESS[name])
+        quantize_static(src, dst, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        raise ValueError(f"无效的模型变体: {variant}，可选值: {QUANTIZED_VARIANTS}")
+
+    return dst
+
+
+def identify_with(name: str, variant: str) -> Callable:
+    """返回使用指定变体识别缺口的函数，结果为 (box, conf)"""
+    if name == 'slider-v2':
+        from captcha_recognizer.slider import SliderV2
+
+        model = SliderV2(variant=variant)
+        return model.identify
+
+    from captcha_recognizer.recognizer import Recognizer
+
+    model = Recognizer(variant=variant)
+    return model.identify_gap
+
+
+def check_parity(name: str, variant: str, images: List[np.ndarray], max_gap_error: float = 2.0,
+                 max_detection_drop: float = 0.02) -> Dict:
+    """
+    对比变体与 FP32 模型在同一批图片上的缺口 x 坐标和检出率
+    :param max_gap_error: 允许的缺口 x 平均绝对误差（像素）
+    :param max_detection_drop: 允许的检出率下降幅度
+    :return: 检查报告，accepted 为是否通过
+    """
+    reference = identify_with(name, 'fp32')
+    candidate = identify_with(name, variant)
+
+    errors = []
+    reference_hits = candidate_hits = 0
+    for image in images:
+        ref_box, _ = reference(image)
+        box, _ = candidate(image)
+        reference_hits += int(bool(ref_box))
+        candidate_hits += int(bool(box))
+        if ref_box and box:
+            errors.append(abs(float(box[0]) - float(ref_box[0])))
+
+    total = max(len(images), 1)
+    reference_rate = reference_hits / total
+    candidate_rate = candidate_hits / total
+    gap_error = float(np.mean(errors)) if errors else 0.0
+    report = {
+        'model': name,
+        'variant': variant,
+        'images': len(images),
+        'fp32_detection_rate': round(reference_rate, 4),
+        'variant_detection_rate': round(candidate_rate, 4),
+        'gap_x_mean_abs_error': round(gap_error, 3),
+        'gap_x_max_abs_error': round(float(np.max(errors)), 3) if errors else 0.0,
+        'max_gap_error': max_gap_error,
+        'max_detection_drop': max_detection_drop,
+    }
+    report['accepted'] = bool(gap_error <= max_gap_error and reference_rate - candidate_rate <= max_detection_drop)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成验证码模型的 INT8 / FP16 变体并做一致性检查')
+    parser.add_argument('--model', choices=sorted(PREPROCESS), required=True)
+    parser.add_argument('--variant', choices=QUANTIZED_VARIANTS, required=True)
+    parser.add_argument('--calib-dir', required=True, help='校准图片目录（一般为 IMG_DIR）')
+    parser.add_argument('--calib-limit', type=int, default=200, help='最多使用的校准图片数量')
+    parser.add_argument('--eval-dir', help='一致性检查图片目录，默认与校准目录相同')
+    parser.add_argument('--eval-limit', type=int, default=0, help='最多使用的检查图片数量，0 表示全部')
+    parser.add_argument('--max-gap-error', type=float, default=2.0, help='允许的缺口 x 平均绝对误差（像素）')
+    parser.add_argument('--max-detection-drop', type=float, default=0.02, help='允许的检出率下降幅度')
+    args = parser.parse_args(argv)
+
+    calib_images = load_images(args.calib_dir, args.calib_limit)
+    eval_images = load_images(args.eval_dir, args.eval_limit) if args.eval_dir else calib_images
+    if not eval_images:
+        parser.error("没有可用于一致性检查的图片")
+
+    dst = build_variant(args.model, args.variant, calib_images)
+    try:
+        report = check_parity(args.model, args.variant, eval_images, args.max_gap_error, args.max_detection_drop)
+    except Exception as e:
+        # 变体无法加载或推理同样视为不通过
+        report = {'model': args.model, 'variant': args.variant, 'accepted': False, 'error': str(e)}
+
+    with open(f'{os.path.splitext(dst)[0]}.parity.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not report['accepted']:
+        os.replace(dst, f'{os.path.splitext(dst)[0]}.rejected.onnx')
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,13 @@
-import os
 from pathlib import Path
-from typing import Union
+from typing import Optional, Tuple, Union
 
 import cv2.dnn
 import numpy as np
 
+from captcha_recognizer import profiling
+from captcha_recognizer.backend import Backend, image_to_array, load_backend
+from captcha_recognizer.session import parse_imgsz, variant_path
+
 CONF_THRESHOLD = 0.25
 IOU_THRESHOLD = 0.45
 NMS_THRESHOLD = 0.5
@@ -12,57 +15,87 @@ NAMES = {0: 't', 1: 'f', 2: 's'}
 
 
 class SingletonMeta(type):
+    # 每组构造参数各对应一个实例
     _instances = {}
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super().__call__(*args, **kwargs)
-        return cls._instances[cls]
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        if key not in cls._instances:
+            cls._instances[key] = super().__call__(*args, **kwargs)
+        return cls._instances[key]
 
 
 class Recognizer(metaclass=SingletonMeta):
-    def __init__(self):
-        root_dir = os.path.dirname(os.path.dirname(__file__))
-        slider_v1_model_path = os.path.join(root_dir, 'captcha_recognizer', 'models', 'slider-v1.onnx')
-        self.model_v1: cv2.dnn.Net = cv2.dnn.readNetFromONNX(slider_v1_model_path)
-
-    @staticmethod
-    def image_to_array(source: Union[str, Path, bytes, np.ndarray] = None):
-        if isinstance(source, (str, Path)):
-            # 从文件路径读取
-            return cv2.imread(str(source))
-        elif isinstance(source, bytes):
-            # 从字节流读取
-            np_arr = np.frombuffer(source, np.uint8)
-            return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        elif isinstance(source, np.ndarray):
-            # 如果已经是 numpy 数组，直接使用
-            return source
-        else:
-            raise TypeError("Unsupported source type. Only str, Path, bytes, or numpy.ndarray are supported.")
+    def __init__(self, variant: str = 'fp32', imgsz: Union[int, str, Tuple[int, int]] = 416, backend: str = 'cv2',
+                 model_path: Optional[str] = None, threads: Optional[int] = None):
+        """
+        :param variant: 模型精度变体
+        :param imgsz: 推理尺寸，416 / (224, 416)（高, 宽）/ '416x224'（宽x高），矩形尺寸需要动态轴导出的模型
+        :param backend: 推理后端，captcha_recognizer.backend.BACKENDS 之一或 auto
+        :param model_path: 指定模型文件（例如模型注册表中的候选模型），优先于 variant
+        :param threads: 推理线程数，None 表示使用默认设置（见 load_backend）；作为构造参数也区分单例
+        """
+        slider_v1_model_path = model_path or variant_path('slider-v1', variant)
+        self.imgsz = parse_imgsz(imgsz)
+        self.model_v1: Backend = load_backend(slider_v1_model_path, backend, shape=(1, 3) + self.imgsz,
+                                              threads=threads)
 
-    def predict(self, model, source: Union[str, Path, bytes, np.ndarray] = None, conf=CONF_THRESHOLD):
+    image_to_array = staticmethod(image_to_array)
 
-        # Read the input image
-        original_image: np.ndarray = self.image_to_array(source)
+    @staticmethod
+    def preprocess(original_image: np.ndarray, imgsz: Tuple[int, int] = (416, 416)) -> Tuple[np.ndarray, float]:
+        """
+        把图片放到与推理尺寸同宽高比的画布左上角并生成模型输入
+        :param imgsz: 推理尺寸 (高, 宽)
+        :return: (blob, scale)，scale 为原图相对模型输入的缩放比例（宽高方向相同）
+        """
         [height, width, _] = original_image.shape
+        input_h, input_w = imgsz
 
-        # Prepare a square image for inference
-        length = max((height, width))
-        image = np.zeros((length, length, 3), np.uint8)
+        # Prepare a canvas with the same aspect ratio as the model input
+        canvas_h, canvas_w, scale = Recognizer.canvas_shape(height, width, imgsz)
+        image = np.zeros((canvas_h, canvas_w, 3), np.uint8)
         image[0:height, 0:width] = original_image
 
-        # Calculate scale factor
-        scale = length / 416
-
         # Preprocess the image and prepare blob for model
-        blob = cv2.dnn.blobFromImage(image, scalefactor=1 / 255, size=(416, 416), swapRB=True)
-        model.setInput(blob)
+        blob = cv2.dnn.blobFromImage(image, scalefactor=1 / 255, size=(input_w, input_h), swapRB=True)
+        return blob, scale
 
-        # Perform inference
-        outputs = model.forward()
+    @staticmethod
+    def canvas_shape(height: int, width: int, imgsz: Tuple[int, int]) -> Tuple[int, int, float]:
+        """
+        与推理尺寸同宽高比、能放下原图的最小画布
+        用整数运算取整，避免 ceil(input * (side / input)) 的浮点误差把画布多算 1 像素
+        :return: (canvas_h, canvas_w, scale)
+        """
+        input_h, input_w = imgsz
+        if height * input_w >= width * input_h:
+            # 高度决定缩放比例
+            return height, max(width, -(-input_w * height // input_h)), height / input_h
+        return max(height, -(-input_h * width // input_w)), width, width / input_w
+
+    @staticmethod
+    def decode(outputs: np.ndarray, scale: float, conf: float = CONF_THRESHOLD) -> Tuple[list, list, list]:
+        """
+        把模型输出 (1, 4 + nc, N) 解码为置信度不低于 conf 的候选框（向量化实现）
+        :return: (boxes, scores, class_ids)，boxes 为原图坐标 [x1, y1, x2, y2]（向零取整）
+        """
+        rows = outputs[0].T
+        class_scores = rows[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(rows)), class_ids]
+        keep = scores >= conf
+
+        xywh = rows[keep, :4]
+        half_wh = 0.5 * xywh[:, 2:4]
+        boxes = np.concatenate([xywh[:, :2] - half_wh, xywh[:, :2] + half_wh], axis=1) * scale
+        return boxes.astype(np.int64).tolist(), scores[keep].tolist(), class_ids[keep].tolist()
 
-        # Prepare output array
+    @staticmethod
+    def decode_loop(outputs: np.ndarray, scale: float, conf: float = CONF_THRESHOLD) -> Tuple[list, list, list]:
+        """
+        逐行解码的原始实现，仅用于校验 decode 的结果和性能对比
+        """
         outputs = np.array([cv2.transpose(outputs[0])])
         rows = outputs.shape[1]
 
@@ -72,7 +105,8 @@ class Recognizer(metaclass=SingletonMeta):
 
         # Iterate through output to collect bounding boxes, confidence scores, and class IDs
         for i in range(rows):
-            classes_scores = outputs[0][i][4:]
+            # 显式转成列向量，OpenCV 各版本下 maxClassIndex 都是行号
+            classes_scores = outputs[0][i][4:].reshape(-1, 1)
             (minScore, maxScore, minClassLoc, (x, maxClassIndex)) = cv2.minMaxLoc(classes_scores)
             if maxScore >= conf:
                 box = [
@@ -85,8 +119,26 @@ class Recognizer(metaclass=SingletonMeta):
                 scores.append(maxScore)
                 class_ids.append(maxClassIndex)
 
-        # Apply NMS (Non-maximum suppression)
-        result_boxes = cv2.dnn.NMSBoxes(boxes, scores, CONF_THRESHOLD, IOU_THRESHOLD, NMS_THRESHOLD)
+        return boxes, scores, class_ids
+
+    def predict(self, model, source: Union[str, Path, bytes, np.ndarray] = None, conf=CONF_THRESHOLD):
+
+        # Read the input image
+        with profiling.stage('decode'):
+            original_image: np.ndarray = self.image_to_array(source)
+        with profiling.stage('preprocess'):
+            blob, scale = self.preprocess(original_image, self.imgsz)
+
+        # Perform inference
+        with profiling.stage('inference'):
+            outputs = model.run(blob)[0]
+
+        with profiling.stage('nms'):
+            # Decode candidate boxes
+            boxes, scores, class_ids = self.decode(outputs, scale, conf)
+
+            # Apply NMS (Non-maximum suppression)
+            result_boxes = cv2.dnn.NMSBoxes(boxes, scores, CONF_THRESHOLD, IOU_THRESHOLD, NMS_THRESHOLD)
 
         detections = []
 
@@ -133,6 +185,10 @@ class Recognizer(metaclass=SingletonMeta):
 
         return box_with_max_conf['box'], box_with_max_conf['confidence']
 
+    def identify(self, source, conf=CONF_THRESHOLD, **kwargs):
+        """与 SliderV2.identify 相同的接口，返回 (box, box_conf)"""
+        return self.identify_gap(source, conf=conf)
+
     # 通过宽度和高度，相差的比例，按照权重1:1计算差异值
     @staticmethod
     def calculate_difference(slider, box):
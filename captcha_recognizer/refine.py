@@ -0,0 +1,174 @@
+"""
+缺口左边缘的亚像素细化
+
+模型在 640 的 letterbox 输入上预测检测框，缩放回原图后左边缘有 1~2 像素的量化误差，
+在滑块容差的边缘足以让滑动失败。细化只看原图中检测框左边缘附近的一条窄带:
+
+1. 取检测框中间部分的行（去掉上下 trim 比例，避开凸起和圆角），在 [x1 - search, x1 + search] 内
+   计算水平梯度（中心差分），按列求平均得到梯度剖面。缺口边缘在各行的梯度方向一致，会被保留，
+   背景纹理方向随机，平均后相互抵消
+2. 剖面绝对值的峰值（离预测位置越远权重越低）用抛物线插值得到亚像素位置
+3. 质量分 = 一致性 * 峰值相对剖面中位数的对比度，取值 0~1，低于 min_quality 时保留模型的 x。
+   一致性为峰值所在列中与平均梯度同号的行的比例减去随机水平 0.5 后放大到 0~1，
+   纯纹理的一致性在 0 附近，不会因为对比度高而通过
+
+    x, quality = refine_gap_edge(image, box)
+
+离线评估（有缺口 x 标注的图片，标注格式与 benchmark suite 相同）:
+    python -m captcha_recognizer.refine evaluate --images test-image --labels test-image/labels.json
+
+线上对比：开启 EDGE_REFINE_CONTROL_RATE（默认 0）后 automation 按该比例随机留出不细化的对照组，
+滑动记录中带 edge_refined 和 slide_number，汇总首次滑动的通过率:
+    python -m captcha_recognizer.refine report --records captcha_slides.jsonl
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def refine_gap_edge(image: np.ndarray, box: Sequence[float], search: float = 6.0, min_quality: float = 0.3,
+                    trim: float = 0.2) -> Tuple[float, float]:
+    """
+    细化缺口左边缘
+    :param image: 原始分辨率的 BGR 或灰度图
+    :param box: 模型预测的缺口框 [x1, y1, x2, y2]（原图坐标）
+    :param search: 在预测 x 左右多少像素内搜索边缘
+    :param min_quality: 质量分低于该值时返回原始 x
+    :return: (x, quality)，x 与 box[0] 同为像素边界坐标
+    """
+    x1, y1, x2, y2 = (float(v) for v in box[:4])
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape[:2]
+
+    box_height = y2 - y1
+    top = max(0, int(round(y1 + trim * box_height)))
+    bottom = min(height, int(round(y2 - trim * box_height)))
+    left = max(0, int(np.floor(x1 - search)) - 1)
+    right = min(width, int(np.ceil(x1 + search)) + 2)
+    if bottom - top < 3 or right - left < 5:
+        return x1, 0.0
+
+    band = gray[top:bottom, left:right].astype(np.float32)
+    # 第 i 列为原图 left + 1 + i 列的中心差分
+    gradient = (band[:, 2:] - band[:, :-2]) * 0.5
+    profile = gradient.mean(axis=0)
+    strength = np.abs(profile)
+    # 像素中心坐标 c 的边缘在边界坐标中为 c + 0.5
+    positions = left + 1 + np.arange(len(profile)) + 0.5
+    prior = 1.0 - 0.5 * np.clip(np.abs(positions - x1) / search, 0, 1) ** 2
+    peak = int(np.argmax(strength * prior))
+    if strength[peak] <= 1e-6:
+        return x1, 0.0
+
+    delta = 0.0
+    if 0 < peak < len(strength) - 1:
+        a, b, c = strength[peak - 1], strength[peak], strength[peak + 1]
+        denominator = a - 2 * b + c
+        if denominator < 0:
+            delta = float(np.clip(0.5 * (a - c) / denominator, -0.5, 0.5))
+
+    # 同号比例在纯噪声上约为 0.5，以随机水平为 0 点
+    agreement = float(np.mean(np.sign(gradient[:, peak]) == np.sign(profile[peak])))
+    coherence = max(0.0, 2 * agreement - 1)
+    contrast = float((strength[peak] - np.median(strength)) / strength[peak])
+    quality = float(np.clip(coherence * contrast, 0.0, 1.0))
+    if quality < min_quality:
+        return x1, quality
+    return float(positions[peak] + delta), quality
+
+
+def evaluate(model, samples: List[Tuple[str, np.ndarray, float]], tolerance: float = 2.0, search: float = 6.0,
+             min_quality: float = 0.3) -> Dict[str, Any]:
+    """
+    在有标注的图片上对比细化前后的缺口 x
+    :param samples: [(文件名, 图片, 缺口x)]，见 benchmark.load_labeled_images
+    :param tolerance: 与标注相差不超过该值（像素）视为首次滑动能通过
+    """
+    raw_errors, refined_errors, qualities, refine_ms = [], [], [], []
+    for _, image, label in samples:
+        box, _ = model.identify(image)
+        if not box:
+            continue
+        start = time.perf_counter()
+        x, quality = refine_gap_edge(image, box, search, min_quality)
+        refine_ms.append((time.perf_counter() - start) * 1000)
+        raw_errors.append(abs(float(box[0]) - label))
+        refined_errors.append(abs(x - label))
+        qualities.append(quality)
+
+    def summary(errors):
+        errors = np.array(errors)
+        return {
+            'pass_rate': round(float(np.mean(errors <= tolerance)), 4),
+            'mean_error': round(float(errors.mean()), 3),
+            'p90_error': round(float(np.percentile(errors, 90)), 3),
+        }
+
+    if not raw_errors:
+        return {'samples': len(samples), 'identified': 0}
+    return {
+        'samples': len(samples),
+        'identified': len(raw_errors),
+        'tolerance': tolerance,
+        'model': summary(raw_errors),
+        'refined': summary(refined_errors),
+        'applied_rate': round(float(np.mean(np.array(qualities) >= min_quality)), 4),
+        'mean_quality': round(float(np.mean(qualities)), 4),
+        'refine_ms': round(float(np.mean(refine_ms)), 3),
+    }
+
+
+def first_attempt_report(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按是否细化分组统计首次滑动（slide_number == 1）和全部滑动的通过率"""
+    report = {}
+    for refined in (True, False):
+        group = [r for r in records if 'edge_refined' in r and bool(r['edge_refined']) == refined]
+        first = [r for r in group if r.get('slide_number') == 1]
+        report['refined' if refined else 'control'] = {
+            'slides': len(group),
+            'pass_rate': round(float(np.mean([bool(r['passed']) for r in group])), 4) if group else None,
+            'first_attempts': len(first),
+            'first_attempt_pass_rate': round(float(np.mean([bool(r['passed']) for r in first])), 4)
+            if first else None,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='缺口左边缘亚像素细化的评估')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    eval_parser = sub.add_parser('evaluate', help='在有标注的图片上对比细化前后的误差和通过率')
+    eval_parser.add_argument('--images', default='test-image')
+    eval_parser.add_argument('--labels', help='缺口 x 标注文件，默认为图片目录下的 labels.json')
+    eval_parser.add_argument('--limit', type=int, default=0)
+    eval_parser.add_argument('--tolerance', type=float, default=2.0)
+    eval_parser.add_argument('--search', type=float, default=6.0)
+    eval_parser.add_argument('--min-quality', type=float, default=0.3)
+
+    report_parser = sub.add_parser('report', help='从滑动记录统计细化组和对照组的首次通过率')
+    report_parser.add_argument('--records', default='captcha_slides.jsonl')
+    args = parser.parse_args(argv)
+
+    if args.command == 'evaluate':
+        import os
+
+        from captcha_recognizer.benchmark import load_labeled_images
+        from captcha_recognizer.slider import SliderV2
+
+        samples = load_labeled_images(args.images, args.labels or os.path.join(args.images, 'labels.json'),
+                                      args.limit)
+        report = evaluate(SliderV2(), samples, args.tolerance, args.search, args.min_quality)
+    else:
+        from captcha_recognizer.drag_calibration import SlideStore
+
+        report = first_attempt_report(SlideStore(args.records).load())
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+# 模型精度变体，由 captcha_recognizer.quantize 生成并通过一致性检查
+MODEL_VARIANTS = ('fp32', 'fp16', 'int8-dynamic', 'int8-static')
+
+
+# YOLO 模型的最大下采样倍数，输入宽高必须是它的整数倍
+MODEL_STRIDE = 32
+
+
+def parse_imgsz(imgsz: Union[int, str, Sequence[int]]) -> Tuple[int, int]:
+    """
+    把推理尺寸统一成 (高, 宽)
+
+    支持 640（正方形）、(320, 640)（高, 宽）以及配置文件中的 '640x320'（宽x高）。
+    """
+    if isinstance(imgsz, str):
+        parts = imgsz.lower().replace('×', 'x').split('x')
+        if len(parts) == 1:
+            imgsz = int(parts[0])
+        elif len(parts) == 2:
+            imgsz = (int(parts[1]), int(parts[0]))
+        else:
+            raise ValueError(f"无效的推理尺寸: {imgsz}，格式为 宽x高，例如 640x320")
+    h, w = (imgsz, imgsz) if isinstance(imgsz, int) else (int(imgsz[0]), int(imgsz[1]))
+    if h <= 0 or w <= 0 or h % MODEL_STRIDE or w % MODEL_STRIDE:
+        raise ValueError(f"推理尺寸的宽高必须是 {MODEL_STRIDE} 的正整数倍: {w}x{h}")
+    return h, w
+
+
+def model_path(name: str) -> str:
+    """返回 models 目录下模型文件的绝对路径"""
+    return os.path.join(MODELS_DIR, name)
+
+
+def variant_path(name: str, variant: str = 'fp32') -> str:
+    """
+    返回模型精度变体的路径，例如 slider-v2 + int8-dynamic -> slider-v2.int8-dynamic.onnx
+
+    变体文件不存在（未生成或未通过一致性检查）时退回 FP32 模型。
+    """
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"无效的模型变体: {variant}，可选值: {MODEL_VARIANTS}")
+    fp32_path = model_path(f'{name}.onnx')
+    if variant == 'fp32':
+        return fp32_path
+    path = model_path(f'{name}.{variant}.onnx')
+    if not os.path.exists(path):
+        logger.warning(f"模型变体不存在，使用 FP32 模型: {path}")
+        return fp32_path
+    return path
+
+
+def fused_path(path: str) -> Optional[str]:
+    """
+    返回模型文件对应的融合模型路径（captcha_recognizer.compose 生成，内置预处理和 NMS），
+    例如 slider-v2.onnx -> slider-v2.fused.onnx、slider-v2.fp16.onnx -> slider-v2.fp16.fused.onnx
+
+    融合模型不存在时返回 None。
+    """
+    fused = f'{os.path.splitext(path)[0]}.fused.onnx'
+    return fused if os.path.exists(fused) else None
+
+
+def fused_imgsz(session: ort.InferenceSession) -> Optional[Tuple[int, int]]:
+    """融合模型内置的 letterbox 尺寸 (高, 宽)，由 compose 写入模型元数据 imgsz（宽x高），旧的融合模型没有时返回 None"""
+    value = session.get_modelmeta().custom_metadata_map.get('imgsz')
+    try:
+        return parse_imgsz(value) if value else None
+    except ValueError:
+        return None
+
+
+class SessionRegistry:
+    """
+    进程内共享的 ONNX Runtime 会话注册表（线程安全）
+
+    同一个模型文件 + 同一组会话参数只会构建一次 InferenceSession，
+    所有 SliderV2 实例复用同一个会话（InferenceSession.run 本身是线程安全的）。
+
+    开启 optimized_model_cache 后，首次构建会把图优化后的模型写到 cache_dir，
+    之后的进程直接加载优化后的模型并跳过图优化。
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple, ort.InferenceSession] = {}
+        self._lock = threading.Lock()
+        self._options = {
+            'intra_op_threads': 0,
+            'inter_op_threads': 0,
+            'graph_optimization': 'all',
+            'execution_mode': 'sequential',
+            'optimized_model_cache': True,
+            'cache_dir': os.path.join(MODELS_DIR, 'cache'),
+        }
+
+    def configure(self, **options) -> None:
+        """
+        更新会话参数，只影响之后新建的会话
+
+        参数:
+            intra_op_threads: 单个算子内部的线程数（0 表示由 ORT 决定）
+            inter_op_threads: 算子间并行的线程数（仅 parallel 模式有效）
+            graph_optimization: disable / basic / extended / all
+            execution_mode: sequential / parallel
+            optimized_model_cache: 是否把优化后的图缓存到磁盘
+            cache_dir: 优化模型缓存目录
+        """
+        unknown = set(options) - set(self._options)
+        if unknown:
+            raise ValueError(f"未知的会话参数: {', '.join(sorted(unknown))}")
+        if options.get('graph_optimization', 'all') not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"无效的图优化级别: {options['graph_optimization']}")
+        if options.get('execution_mode', 'sequential') not in EXECUTION_MODES:
+            raise ValueError(f"无效的执行模式: {options['execution_mode']}")
+        with self._lock:
+            self._options.update(options)
+
+    @property
+    def options(self) -> Dict:
+        with self._lock:
+            return dict(self._options)
+
+    @staticmethod
+    def providers():
+        return ["CUDAExecutionProvider", "CPUExecutionProvider"] if ort.get_device() == 'GPU' else [
+            "CPUExecutionProvider"]
+
+    def get(self, path: str, **overrides) -> ort.InferenceSession:
+        """获取（必要时构建）指定模型的共享会话，overrides 可临时覆盖会话参数"""
+        path = os.path.abspath(path)
+        with self._lock:
+            options = dict(self._options, **overrides)
+            key = (path,) + tuple(sorted(options.items()))
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._build(path, options)
+                self._sessions[key] = session
+            return session
+
+    def _session_options(self, options: Dict, level: str) -> ort.SessionOptions:
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = int(options['intra_op_threads'])
+        sess_options.inter_op_num_threads = int(options['inter_op_threads'])
+        sess_options.execution_mode = EXECUTION_MODES[options['execution_mode']]
+        sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[level]
+        return sess_options
+
+    def _cache_path(self, path: str, options: Dict) -> str:
+        # 以源模型内容签名 + ORT 版本 + 优化级别区分缓存，模型更新或升级 ORT 后自动失效
+        stat = os.stat(path)
+        signature = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{ort.__version__}|{options['graph_optimization']}"
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:12]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(options['cache_dir'], f"{stem}.{digest}.opt.onnx")
+
+    def _build(self, path: str, options: Dict) -> ort.InferenceSession:
+        level = options['graph_optimization']
+        if not options['optimized_model_cache'] or level == 'disable':
+            return ort.InferenceSession(path, self._session_options(options, level), providers=self.providers())
+
+        cache_path = self._cache_path(path, options)
+        if os.path.exists(cache_path):
+            try:
+                # 缓存的模型已完成图优化，加载时不再重复优化
+                session = ort.InferenceSession(cache_path, self._session_options(options, 'disable'),
+                                               providers=self.providers())
+                logger.info(f"已加载优化模型缓存: {cache_path}")
+                return session
+            except Exception as e:
+                logger.warning(f"优化模型缓存不可用，重新构建: {cache_path}, {e}")
+                os.remove(cache_path)
+
+        os.makedirs(options['cache_dir'], exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        sess_options = self._session_options(options, level)
+        sess_options.optimized_model_filepath = tmp_path
+        session = ort.InferenceSession(path, sess_options, providers=self.providers())
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, cache_path)
+            logger.info(f"优化模型已缓存: {cache_path}")
+        return session
+
+    def profiling_session(self, path: str, prefix: str) -> ort.InferenceSession:
+        """
+        新建（不进入共享缓存）开启 ORT 性能分析的会话，分析文件以 prefix 开头，
+        end_profiling() 返回文件路径。有优化模型缓存时直接加载缓存，避免重复图优化。
+        """
+        path = os.path.abspath(path)
+        options = self.options
+        level = options['graph_optimization']
+        if options['optimized_model_cache'] and level != 'disable':
+            cache_path = self._cache_path(path, options)
+            if os.path.exists(cache_path):
+                path, level = cache_path, 'disable'
+        os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+        sess_options = self._session_options(options, level)
+        sess_options.enable_profiling = True
+        sess_options.profile_file_prefix = prefix
+        return ort.InferenceSession(path, sess_options, providers=self.providers())
+
+    def loaded_paths(self) -> List[str]:
+        """已经构建过共享会话的模型文件路径（去重，按构建顺序）"""
+        with self._lock:
+            return list(dict.fromkeys(key[0] for key in self._sessions))
+
+    @staticmethod
+    def warmup(session: ort.InferenceSession, shape: Optional[Tuple[int, ...]] = None) -> None:
+        """
+        用全零输入做一次推理，触发内存分配和内核初始化
+        :param shape: 第一个输入的形状，默认动态维度按 4 维输入的 batch=1、其余 640 处理
+        """
+        feeds = {}
+        for index, model_input in enumerate(session.get_inputs()):
+            input_shape = shape if index == 0 and shape is not None else tuple(
+                d if isinstance(d, int) and d > 0 else (1 if i == 0 and len(model_input.shape) == 4 else 640)
+                for i, d in enumerate(model_input.shape))
+            dtype = np.uint8 if model_input.type == 'tensor(uint8)' else np.float32
+            feeds[model_input.name] = np.zeros(input_shape, dtype=dtype)
+        session.run(None, feeds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+
+# 创建全局会话注册表实例
+registry = SessionRegistry()
+
+
+def get_session(path: str, **overrides) -> ort.InferenceSession:
+    return registry.get(path, **overrides)
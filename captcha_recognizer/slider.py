@@ -1,13 +1,17 @@
+import logging
 import os
 import random
+import threading
 import time
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
-import onnxruntime as ort
-from shapely.geometry import Polygon
+
+from captcha_recognizer import profiling
+from captcha_recognizer.backend import image_to_array, load_backend
+from captcha_recognizer.session import fused_imgsz, fused_path, get_session, parse_imgsz, registry, variant_path
 
 CONF_THRESHOLD = 0.25
 
@@ -15,33 +19,381 @@ IOU_THRESHOLD = 0.8
 
 Y_IOU_THRESHOLD = 0.85
 
+# NMS 实现: greedy - 逐个挑选的原始实现; fast - 向量化 IoU 矩阵; cv2 - cv2.dnn.NMSBoxesBatched;
+# none - end2end 导出的模型已在图内完成 NMS，跳过
+NMS_ENGINES = ('greedy', 'fast', 'cv2', 'none')
+
+# 掩膜解码实现: roi - 只在检测框范围内解码，返回紧凑的 RoiMasks; dense - 原始的全图解码
+MASK_ENGINES = ('roi', 'dense')
+
+# 多缺口时滑块与候选缺口的形状匹配方式: raster - 质心对齐后直接在位图上算 IoU; polygon - 轮廓 + Shapely 多边形
+MATCHERS = ('raster', 'polygon')
+
+# fast 引擎的 IoU 矩阵为 N×N，候选框超过该数量时退回 greedy，避免占用过多内存
+FAST_NMS_MAX_BOXES = 4096
+
+logger = logging.getLogger(__name__)
+
+# 每个线程各自持有的推理缓冲区，按 (会话, 输入尺寸) 区分
+_thread_buffers = threading.local()
+
+
+class LazyMasks:
+    """
+    按需解码的掩膜
+
+    只保存掩膜系数、原型和检测框，第一次调用 resolve 时才生成完整掩膜。
+    大多数验证码只有 1~5 个检测框，选框时用不到掩膜，可以省去整个掩膜解码过程。
+    """
+
+    def __init__(self, decoder, protos: np.ndarray, coefficients: np.ndarray, boxes: np.ndarray,
+                 shape: Tuple[int, int]):
+        self.decoder = decoder
+        self.protos = protos
+        self.coefficients = coefficients
+        self.boxes = boxes
+        self.shape = shape
+        self._masks = None
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    @property
+    def resolved(self) -> bool:
+        return self._masks is not None
+
+    def resolve(self) -> np.ndarray:
+        """解码并缓存掩膜"""
+        if self._masks is None:
+            self._masks = self.decoder(self.protos, self.coefficients, self.boxes, self.shape)
+        return self._masks
+
+    @staticmethod
+    def resolve_masks(masks):
+        return masks.resolve() if isinstance(masks, LazyMasks) else masks
+
+
+class RoiMasks:
+    """
+    紧凑掩膜：每个检测框只保存框内的二值位图及其在原图中的左上角偏移
+
+    与全图掩膜 (N, H, W) 等价，框外的像素全部为 False。
+    """
+
+    def __init__(self, bitmaps: List[np.ndarray], offsets: List[Tuple[int, int]], shape: Tuple[int, int]):
+        self.bitmaps = bitmaps
+        self.offsets = offsets
+        self.shape = shape
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def items(self):
+        """依次返回 (位图, (x0, y0))"""
+        return zip(self.bitmaps, self.offsets)
+
+    @classmethod
+    def from_dense(cls, masks: np.ndarray) -> 'RoiMasks':
+        """把 (N, H, W) 的全图掩膜裁剪为各自的最小外接位图"""
+        bitmaps, offsets = [], []
+        for mask in masks:
+            x, y, w, h = cv2.boundingRect(mask.astype(np.uint8))
+            bitmaps.append(mask[y:y + h, x:x + w].astype(bool))
+            offsets.append((x, y))
+        return cls(bitmaps, offsets, masks.shape[1:])
+
+    def to_dense(self) -> np.ndarray:
+        """还原为 (N, H, W) 的全图布尔掩膜"""
+        dense = np.zeros((len(self.bitmaps),) + tuple(self.shape), dtype=bool)
+        for i, (bitmap, (x0, y0)) in enumerate(self.items()):
+            dense[i, y0:y0 + bitmap.shape[0], x0:x0 + bitmap.shape[1]] = bitmap
+        return dense
+
+
+class InferenceBuffers:
+    """
+    单个线程复用的推理缓冲区（IOBinding）
+
+    持有 letterbox 画布、float32 输入张量和预先绑定的输出数组，稳态下每次推理不再分配新的数组。
+    BGR→RGB、HWC→CHW 和 /255 归一化在写入输入张量时一次完成。
+
+    注意：输出数组会被同一线程的下一次推理覆盖，结果（包括 LazyMasks 引用的 protos）需在此之前用完。
+    """
+
+    def __init__(self, session, input_name: str, imgsz: Tuple[int, int]):
+        self.session = session
+        self.imgsz = imgsz
+        self.calls = 0
+
+        h, w = imgsz
+        self.canvas = np.full((h, w, 3), 114, dtype=np.uint8)
+        self.input = np.empty((1, 3, h, w), dtype=np.float32)
+        self.geometry = None
+
+        self.binding = session.io_binding()
+        self.binding.bind_cpu_input(input_name, self.input)
+        self.outputs = []
+        for output in session.get_outputs():
+            shape = [1 if i == 0 else d for i, d in enumerate(output.shape)]
+            if output.type == 'tensor(float)' and all(isinstance(d, int) and d > 0 for d in shape):
+                array = np.empty(shape, dtype=np.float32)
+                self.binding.bind_output(output.name, 'cpu', 0, np.float32, shape, array.ctypes.data)
+                self.outputs.append(array)
+            else:
+                # 动态尺寸的输出无法预先分配，由 ORT 每次分配
+                self.binding.bind_output(output.name, 'cpu')
+                self.outputs.append(None)
+
+    def load(self, img: np.ndarray) -> np.ndarray:
+        """把原图 letterbox 到画布并写入输入张量，返回输入张量"""
+        h, w = self.imgsz
+        r = min(h / img.shape[0], w / img.shape[1])
+        new_w = max(1, min(int(round(img.shape[1] * r)), w))
+        new_h = max(1, min(int(round(img.shape[0] * r)), h))
+        # 与 scale_boxes 的填充计算一致
+        top, left = int(round((h - new_h) / 2)), int(round((w - new_w) / 2))
+        geometry = (new_w, new_h, top, left)
+        if geometry != self.geometry:
+            self.canvas[...] = 114
+            self.geometry = geometry
+
+        region = self.canvas[top:top + new_h, left:left + new_w]
+        if img.shape[:2] == (new_h, new_w):
+            region[...] = img
+        else:
+            cv2.resize(img, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+
+        scale = np.float32(255)
+        for c in range(3):
+            np.divide(self.canvas[:, :, 2 - c], scale, out=self.input[0, c])
+        return self.input
+
+    def run(self, img: np.ndarray) -> List[np.ndarray]:
+        self.load(img)
+        return self.infer()
+
+    def infer(self) -> List[np.ndarray]:
+        """用已写入的输入张量推理"""
+        self.session.run_with_iobinding(self.binding)
+        self.calls += 1
+        if all(output is not None for output in self.outputs):
+            return self.outputs
+        # get_outputs 按绑定顺序返回全部输出，只把动态输出复制成新数组
+        values = self.binding.get_outputs()
+        return [output if output is not None else values[i].numpy() for i, output in enumerate(self.outputs)]
+
+    def stats(self) -> dict:
+        """调用次数和每次由 ORT 分配的动态输出个数；实际的内存分配见 benchmark.compare_io_binding"""
+        return {
+            'calls': self.calls,
+            'dynamic_outputs': sum(output is None for output in self.outputs),
+        }
+
 
 class SliderV2:
 
-    def __init__(self):
+    def __init__(self, nms_engine: str = 'fast', mask_engine: str = 'roi', matcher: str = 'raster',
+                 io_binding: bool = False, variant: str = 'fp32',
+                 imgsz: Union[int, str, Tuple[int, int]] = 640, backend: str = 'onnxruntime',
+                 model_path: Optional[str] = None, fused: bool = False, threads: Optional[int] = None):
         """
         Initialize the instance segmentation model using an ONNX model.
-        """
-        root_dir = os.path.dirname(os.path.dirname(__file__))
-        slider_model_path = os.path.join(root_dir, 'captcha_recognizer', 'models', 'slider-v2.onnx')
 
-        self.session = ort.InferenceSession(
-            slider_model_path,
-            providers=["CUDAExecutionProvider", "CPUExecutionProvider"] if ort.get_device() == 'GPU' else [
-                "CPUExecutionProvider"],
-        )
+        Backends are shared per process (the onnxruntime InferenceSession comes from the
+        session registry), so constructing SliderV2 repeatedly does not reload the model.
+
+        Args:
+            nms_engine (str): NMS implementation, one of NMS_ENGINES.
+            mask_engine (str): Mask decoding implementation, one of MASK_ENGINES.
+            matcher (str): Slider/gap shape matching used with six or more boxes, one of MATCHERS.
+            io_binding (bool): Reuse per-thread input/output buffers through ORT IOBinding in predict.
+            variant (str): Model precision variant, one of MODEL_VARIANTS in captcha_recognizer.session.
+            imgsz (int | str | tuple): Default inference size, e.g. 640, (320, 640) as (h, w) or '640x320' as WxH.
+                Rectangular sizes need a model exported with dynamic axes; models with a fixed input size
+                fall back to that size.
+            backend (str): Inference backend, one of BACKENDS in captcha_recognizer.backend or 'auto'.
+                io_binding only applies to the onnxruntime backend.
+            model_path (str): Explicit ONNX file, e.g. a candidate model from the model registry.
+                Overrides variant.
+            fused (bool): Run predict through the fused model built by captcha_recognizer.compose (letterbox,
+                normalisation and NMS inside the ONNX graph, raw uint8 BGR input). Falls back to the Python
+                pipeline, with a warning, when the fused model has not been generated or does not match the
+                backend (onnxruntime only), imgsz or nms_engine.
+            threads (int): Inference threads for the backend (see load_backend). None keeps the defaults.
+        """
+        if nms_engine not in NMS_ENGINES:
+            raise ValueError(f"Invalid NMS engine {nms_engine}, valid values are {NMS_ENGINES}")
+        if mask_engine not in MASK_ENGINES:
+            raise ValueError(f"Invalid mask engine {mask_engine}, valid values are {MASK_ENGINES}")
+        self.nms_engine = nms_engine
+        if matcher not in MATCHERS:
+            raise ValueError(f"Invalid matcher {matcher}, valid values are {MATCHERS}")
+        self.mask_engine = mask_engine
+        self.matcher = matcher
+        slider_model_path = model_path or variant_path('slider-v2', variant)
+
+        self.backend = load_backend(slider_model_path, backend, shape=(1, 3) + parse_imgsz(imgsz), threads=threads)
+        # IOBinding 缓冲区只适用于 onnxruntime 后端
+        self.session = getattr(self.backend, 'session', None)
+        self.input_name = getattr(self.backend, 'input_name', None)
+        if io_binding and self.session is None:
+            logger.warning(f"推理后端 {self.backend.name} 不支持 IOBinding，已关闭")
+        self.io_binding = io_binding and self.session is not None
+        self.imgsz = self.resolve_imgsz(parse_imgsz(imgsz))
+
+        self.fused_session = None
+        self.fused_model_path = None
+        if fused:
+            self._load_fused(slider_model_path)
+        self.fused = self.fused_session is not None
 
         self.classes = {0: 's'}
 
+    def _load_fused(self, model_path: str) -> None:
+        """
+        Use the fused model only where it is equivalent to the configured Python pipeline: onnxruntime
+        backend, the same letterbox size, and a greedy NMS engine (the graph runs ONNX NonMaxSuppression).
+        """
+        fallback = "，使用 Python 预处理和 NMS"
+        if self.backend.name != 'onnxruntime':
+            logger.warning(f"融合模型只支持 onnxruntime 后端，当前推理后端为 {self.backend.name}{fallback}")
+            return
+        if self.nms_engine not in ('greedy', 'fast'):
+            logger.warning(f"融合模型图内为贪心 NMS，与 nms_engine={self.nms_engine} 不一致{fallback}")
+            return
+        path = fused_path(model_path)
+        if path is None:
+            logger.warning(f"融合模型不存在（python -m captcha_recognizer.compose 生成）{fallback}")
+            return
+        session = get_session(path)
+        size = fused_imgsz(session)
+        if size != self.imgsz:
+            found = f'{size[1]}x{size[0]}' if size else '未记录（请重新生成）'
+            logger.warning(f"融合模型的推理尺寸 {found} 与 SLIDER_IMGSZ {self.imgsz[1]}x{self.imgsz[0]} 不一致{fallback}")
+            return
+        self.fused_session = session
+        self.fused_model_path = path
+
+    def resolve_imgsz(self, imgsz: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Return imgsz if the model accepts it, otherwise the model's fixed input size.
+        """
+        fixed = tuple(self.backend.input_shape[2:]) if self.backend.input_shape else (None, None)
+        if None not in fixed and fixed != imgsz:
+            logger.warning(f"模型输入尺寸固定为 {fixed[1]}x{fixed[0]}，忽略推理尺寸 {imgsz[1]}x{imgsz[0]}，"
+                           f"矩形尺寸需要使用动态轴导出的模型")
+            return fixed
+        return imgsz
+
     def predict(self, img: np.ndarray, conf: float = 0.25, iou: float = 0.7,
-                imgsz: Union[int, Tuple[int, int]] = 640) -> List:
+                imgsz: Union[int, Tuple[int, int], None] = None, lazy_masks: bool = False) -> List:
         """
         Run inference on the input image using the ONNX model.
+
+        ``imgsz`` defaults to the instance's inference size.
+        With ``lazy_masks`` the masks are returned as LazyMasks and only decoded when resolved.
+        """
+        if self.fused and imgsz is None and img.dtype == np.uint8 and img.ndim == 3:
+            return self.predict_fused(img, conf=conf, iou=iou, lazy_masks=lazy_masks)
+        imgsz = self.imgsz if imgsz is None else parse_imgsz(imgsz)
+        if self.io_binding:
+            # 性能分析时在预先创建的分析会话上绑定缓冲区
+            buffers = self.buffers(imgsz, profiling.session_for(self.backend.path, self.session))
+            with profiling.stage('preprocess'):
+                buffers.load(img)
+            with profiling.stage('inference'):
+                outs = buffers.infer()
+            return self.postprocess(img, buffers.input, outs, conf=conf, iou=iou, lazy_masks=lazy_masks)
+
+        with profiling.stage('preprocess'):
+            prep_img = self.preprocess(img, imgsz)
+        with profiling.stage('inference'):
+            outs = self.backend.run(prep_img)
+        return self.postprocess(img, prep_img, outs, conf=conf, iou=iou, lazy_masks=lazy_masks)
+
+    def predict_fused(self, img: np.ndarray, conf: float = 0.25, iou: float = 0.7, lazy_masks: bool = False) -> List:
+        """
+        Run the fused model: the raw uint8 BGR image goes in, NMS-filtered boxes in original image
+        coordinates and their mask coefficients come out. Only mask decoding stays in Python.
+        """
+        session = profiling.session_for(self.fused_model_path, self.fused_session)
+        with profiling.stage('inference_fused'):
+            boxes, scores, coefficients, protos = session.run(None, {
+                'image': np.ascontiguousarray(img),
+                'conf_threshold': np.array([conf], dtype=np.float32),
+                'iou_threshold': np.array([iou], dtype=np.float32),
+            })
+        pred = np.concatenate([boxes, scores[:, None], np.zeros((len(scores), 1), dtype=np.float32)], axis=1)
+        if lazy_masks:
+            masks = LazyMasks(self.process_mask, protos[0], coefficients, boxes.copy(), img.shape[:2])
+        else:
+            masks = self.process_mask(protos[0], coefficients, boxes, img.shape[:2])
+        return [[pred, masks]]
+
+    def buffers(self, imgsz: Tuple[int, int], session=None) -> InferenceBuffers:
         """
-        imgsz = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
-        prep_img = self.preprocess(img, imgsz)
-        outs = self.session.run(None, {self.session.get_inputs()[0].name: prep_img})
-        return self.postprocess(img, prep_img, outs, conf=conf, iou=iou)
+        Return the calling thread's reusable buffers for this session and input size.
+
+        Buffers for another session (the profiling session of an active profile) live only as long as that profile.
+        """
+        if session is not None and session is not self.session:
+            return profiling.active().resource(
+                ('buffers', id(session), tuple(imgsz)),
+                lambda: InferenceBuffers(session, self.input_name, tuple(imgsz)))
+        pool = getattr(_thread_buffers, 'pool', None)
+        if pool is None:
+            pool = _thread_buffers.pool = {}
+        key = (id(self.session), tuple(imgsz))
+        buffers = pool.get(key)
+        if buffers is None or buffers.session is not self.session:
+            buffers = pool[key] = InferenceBuffers(self.session, self.input_name, tuple(imgsz))
+        return buffers
+
+    def predict_batch(self, imgs: List[np.ndarray], conf: float = 0.25, iou: float = 0.7,
+                      imgsz: Union[int, Tuple[int, int], None] = None, lazy_masks: bool = False) -> List:
+        """
+        Run inference on several images with a single NCHW tensor.
+
+        Models exported with a fixed batch dimension are run in chunks of that size.
+        Returns one [boxes, masks] entry per input image, in input order.
+        """
+        if not imgs:
+            return []
+        imgsz = self.imgsz if imgsz is None else parse_imgsz(imgsz)
+        prep_img = np.concatenate([self.preprocess(img, imgsz) for img in imgs])
+
+        outs = self.run_batch(prep_img)
+        return self.postprocess(imgs, prep_img, outs, conf=conf, iou=iou, lazy_masks=lazy_masks)
+
+    @property
+    def batch_limit(self) -> Optional[int]:
+        """Largest batch the backend runs in one call (known after run_batch has probed it), None if unbounded."""
+        if self.backend.max_batch:
+            return self.backend.max_batch
+        return (self.backend.input_shape[0] if self.backend.input_shape else None) or None
+
+    def run_batch(self, blob: np.ndarray) -> List[np.ndarray]:
+        """
+        Run an NCHW batch through the backend in chunks the model actually supports.
+
+        A model whose graph returns fewer rows than it was fed (a dynamic batch axis in the
+        signature but a batch-1 Reshape inside) is detected here and run one image at a time.
+        """
+        batch = self.backend.input_shape[0] if self.backend.input_shape else None
+        step = self.backend.max_batch or batch or len(blob)
+        chunks = []
+        i = 0
+        while i < len(blob):
+            chunk = blob[i:i + step]
+            outs = self.backend.run(chunk)
+            if outs[0].shape[0] != len(chunk):
+                logger.warning(f"模型 {os.path.basename(self.backend.path)} 不支持批次 {len(chunk)}"
+                               f"（输出批次为 {outs[0].shape[0]}），改为逐张推理")
+                self.backend.max_batch = step = 1
+                continue
+            chunks.append(outs)
+            i += len(chunk)
+        return [np.concatenate(out) for out in zip(*chunks)] if len(chunks) > 1 else chunks[0]
 
     @staticmethod
     def letterbox(img: np.ndarray, new_shape: Tuple[int, int] = (640, 640)) -> np.ndarray:
@@ -63,51 +415,64 @@ class SliderV2:
         if shape[::-1] != new_unpad:
             img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
 
-        # Calculate padding
+        # Calculate padding, odd padding puts the extra pixel on the bottom/right side
+        # so the result is exactly new_shape and matches the offsets used in scale_boxes
         dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
-        dw, dh = float(dw), float(dh)
-
-        # Divide padding into 2 sides
-        top, bottom = int(round(dh / 2)), int(round(dh / 2))
-        left, right = int(round(dw / 2)), int(round(dw / 2))
+        top, left = int(round(dh / 2)), int(round(dw / 2))
+        bottom, right = dh - top, dw - left
 
         # Add padding
         img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
 
-        # Final check to ensure exact size (might need crop if rounding caused overflow)
-        if img.shape[0] != new_shape[0] or img.shape[1] != new_shape[1]:
-            img = cv2.resize(img, new_shape, interpolation=cv2.INTER_LINEAR)
-
         return img
 
-    def preprocess(self, img: np.ndarray, new_shape: Tuple[int, int]) -> np.ndarray:
+    @staticmethod
+    def preprocess(img: np.ndarray, new_shape: Tuple[int, int] = (640, 640)) -> np.ndarray:
         """
         Preprocess the input image before feeding it into the model.
         """
-        img = self.letterbox(img, new_shape)
+        img = SliderV2.letterbox(img, new_shape)
         img = img[..., ::-1].transpose([2, 0, 1])[None]
         img = np.ascontiguousarray(img)
         img = img.astype(np.float32) / 255
         return img
 
-    def postprocess(self, img: np.ndarray, prep_img: np.ndarray, outs: List, conf: float = 0.25,
-                    iou: float = 0.7) -> List:
+    def postprocess(self, img: Union[np.ndarray, List[np.ndarray]], prep_img: np.ndarray, outs: List,
+                    conf: float = 0.25, iou: float = 0.7, lazy_masks: bool = False) -> List:
         """
         Post-process model predictions to extract meaningful results.
+
+        ``img`` is either the single original image or the list of original images of a batch.
+        With ``lazy_masks`` only the mask coefficients are kept and decoding is deferred.
         """
+        imgs = img if isinstance(img, list) else [img] * prep_img.shape[0]
         preds, protos = outs
-        preds = self.non_max_suppression(preds, conf, iou, nc=len(self.classes))
+        with profiling.stage('nms'):
+            preds = self.non_max_suppression(preds, conf, iou, nc=len(self.classes))
 
         results = []
         for i, pred in enumerate(preds):
-            pred[:, :4] = self.scale_boxes(prep_img.shape[2:], pred[:, :4], img.shape)
-            masks = self.process_mask(protos[i], pred[:, 6:], pred[:, :4], img.shape[:2])
+            pred[:, :4] = self.scale_boxes(prep_img.shape[2:], pred[:, :4], imgs[i].shape)
+            if lazy_masks:
+                masks = LazyMasks(self.process_mask, protos[i], pred[:, 6:], pred[:, :4].copy(), imgs[i].shape[:2])
+            else:
+                masks = self.process_mask(protos[i], pred[:, 6:], pred[:, :4], imgs[i].shape[:2])
             results.append([pred[:, :6], masks])
 
         return results
 
     def process_mask(self, protos: np.ndarray, masks_in: np.ndarray, bboxes: np.ndarray,
-                     shape: Tuple[int, int]) -> np.ndarray:
+                     shape: Tuple[int, int]) -> Union[np.ndarray, RoiMasks]:
+        """
+        Decode masks with the configured mask engine.
+        """
+        with profiling.stage('mask'):
+            if self.mask_engine == 'roi':
+                return self.process_mask_roi(protos, masks_in, bboxes, shape)
+            return self.process_mask_dense(protos, masks_in, bboxes, shape)
+
+    def process_mask_dense(self, protos: np.ndarray, masks_in: np.ndarray, bboxes: np.ndarray,
+                           shape: Tuple[int, int]) -> np.ndarray:
         c, mh, mw = protos.shape
         masks = (masks_in @ protos.reshape(c, -1)).reshape(-1, mh, mw)
         masks = self.scale_masks(masks, shape)
@@ -115,13 +480,93 @@ class SliderV2:
         return masks > 0.0
 
     @staticmethod
-    def masks_to_segments(masks: Union[np.ndarray,], strategy: str = "largest") -> List[np.ndarray]:
+    def linear_weights(start: int, stop: int, scale: float, size: int) -> Tuple[np.ndarray, int]:
+        """
+        Build the bilinear interpolation matrix cv2.resize (INTER_LINEAR) uses for output pixels [start, stop).
+
+        Args:
+            start (int): First output pixel.
+            stop (int): End of the output pixel range (exclusive).
+            scale (float): Source size divided by output size.
+            size (int): Source size along this axis.
+
+        Returns:
+            (np.ndarray): Weights with shape (stop - start, K) over source pixels [first, first + K).
+            (int): Index of the first source pixel used.
+        """
+        f = (np.arange(start, stop, dtype=np.float64) + 0.5) * scale - 0.5
+        s0 = np.floor(f).astype(np.int64)
+        a = f - s0
+        # 与 cv2.resize 相同的边界处理：超出源图范围的坐标贴边且不插值
+        a[s0 < 0] = 0
+        s0[s0 < 0] = 0
+        edge = s0 >= size - 1
+        a[edge] = 0
+        s0[edge] = size - 1
+        s1 = np.minimum(s0 + 1, size - 1)
+
+        first = int(s0.min())
+        weights = np.zeros((stop - start, int(s1.max()) - first + 1), dtype=np.float32)
+        rows = np.arange(stop - start)
+        weights[rows, s0 - first] = 1 - a
+        # 贴边时 s1 == s0 且 a == 0，累加不影响结果
+        weights[rows, s1 - first] += a
+        return weights, first
+
+    def process_mask_roi(self, protos: np.ndarray, masks_in: np.ndarray, bboxes: np.ndarray,
+                         shape: Tuple[int, int]) -> RoiMasks:
+        """
+        Decode masks only inside each bounding box, equivalent to process_mask_dense.
+
+        For every detection the prototypes are cropped to the box region in prototype space, the
+        mask is assembled from that crop and upsampled with two small interpolation matrices that
+        reproduce cv2.resize INTER_LINEAR for exactly the output pixels inside the box.
+
+        Args:
+            protos (np.ndarray): Mask prototypes with shape (mask_dim, mask_h, mask_w).
+            masks_in (np.ndarray): Mask coefficients with shape (N, mask_dim).
+            bboxes (np.ndarray): Bounding boxes in original image coordinates with shape (N, 4).
+            shape (tuple): Original image size as (height, width).
+
+        Returns:
+            (RoiMasks): Per-box bitmaps and their offsets in the original image.
+        """
+        c, mh, mw = protos.shape
+        ih, iw = shape[:2]
+
+        # 与 scale_masks 一致：先去掉 letterbox 的填充区域
+        gain = min(mh / ih, mw / iw)
+        pad_w, pad_h = (mw - iw * gain) / 2, (mh - ih * gain) / 2
+        top, left = int(round(pad_h)), int(round(pad_w))
+        src_h, src_w = mh - 2 * top, mw - 2 * left
+
+        bitmaps, offsets = [], []
+        for coefficients, box in zip(masks_in, bboxes):
+            # crop_mask 保留满足 x1 <= x < x2、y1 <= y < y2 的像素
+            x0, x1 = (int(np.clip(np.ceil(v), 0, iw)) for v in (box[0], box[2]))
+            y0, y1 = (int(np.clip(np.ceil(v), 0, ih)) for v in (box[1], box[3]))
+            if x1 <= x0 or y1 <= y0:
+                bitmaps.append(np.zeros((0, 0), dtype=bool))
+                offsets.append((x0, y0))
+                continue
+
+            wy, sy = self.linear_weights(y0, y1, src_h / ih, src_h)
+            wx, sx = self.linear_weights(x0, x1, src_w / iw, src_w)
+            roi = protos[:, top + sy:top + sy + wy.shape[1], left + sx:left + sx + wx.shape[1]]
+            mask = (coefficients @ roi.reshape(c, -1)).reshape(roi.shape[1:])
+            bitmaps.append((wy @ mask @ wx.T) > 0.0)
+            offsets.append((x0, y0))
+
+        return RoiMasks(bitmaps, offsets, (ih, iw))
+
+    @staticmethod
+    def masks_to_segments(masks: Union[np.ndarray, RoiMasks], strategy: str = "largest") -> List[np.ndarray]:
         """
         将二值Mask转换为多边形边界点(segments)，不使用多边形简化
 
         参数:
-            masks: 输入的二值Mask，可以是numpy数组或torch张量
-                  形状为(batch_size, height, width)或(height, width)
+            masks: 输入的二值Mask，可以是numpy数组或RoiMasks
+                  numpy数组形状为(batch_size, height, width)或(height, width)
             strategy: 处理多个轮廓的策略:
                      'all' - 合并所有轮廓
                      'largest' - 只保留最大轮廓
@@ -130,19 +575,23 @@ class SliderV2:
         返回:
             包含多边形点集的列表，每个元素是(N,2)的numpy数组
         """
-        # 转换输入为numpy数组
-
-        masks_np = masks.astype("uint8")
+        if isinstance(masks, RoiMasks):
+            # 位图四周补一圈 0，轮廓坐标再加回偏移，结果与全图掩膜一致
+            items = [(np.pad(bitmap.astype("uint8"), 1), (x0 - 1, y0 - 1)) for bitmap, (x0, y0) in masks.items()]
+        else:
+            # 转换输入为numpy数组
+            masks_np = masks.astype("uint8")
 
-        # 处理单张mask的情况
-        if masks_np.ndim == 2:
-            masks_np = masks_np[np.newaxis, ...]
+            # 处理单张mask的情况
+            if masks_np.ndim == 2:
+                masks_np = masks_np[np.newaxis, ...]
+            items = [(mask, (0, 0)) for mask in masks_np]
 
         segments = []
 
-        for mask in masks_np:
+        for mask, offset in items:
             # 查找轮廓 (OpenCV 4.x返回格式)
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
 
             if not contours:  # 没有找到轮廓
                 segments.append(np.zeros((0, 2), dtype=np.float32))
@@ -162,7 +611,7 @@ class SliderV2:
 
             segments.append(contour.astype(np.float32))
 
-        return segments[0] if masks_np.shape[0] == 1 else segments
+        return segments[0] if len(items) == 1 else segments
 
     @staticmethod
     def draw_segments(image, boxes, masks,
@@ -174,7 +623,7 @@ class SliderV2:
         参数:
             image: 原始图像 (numpy数组, BGR格式)
             boxes: 预测框列表, 格式为 [[x1, y1, x2, y2, score, class_id], ...]
-            masks: 掩膜列表, 每个掩膜为二值图像 (0或255)
+            masks: 掩膜列表, 每个掩膜为二值图像 (0或255)，也可以是RoiMasks
             box_color: 框的颜色 (BGR格式), 如果为None则随机生成
             mask_alpha: 掩膜透明度 (0-1)
             box_thickness: 框的线宽
@@ -195,13 +644,14 @@ class SliderV2:
             # 创建一个空的彩色掩膜图像
             color_mask = np.zeros_like(image)
 
-            for i, mask in enumerate(masks):
+            items = masks.items() if isinstance(masks, RoiMasks) else ((mask, (0, 0)) for mask in masks)
+            for mask, (x0, y0) in items:
                 # 为每个mask生成随机颜色或使用指定颜色
 
                 color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
                 # 将二值mask转换为彩色mask
                 mask = mask.astype(bool)
-                color_mask[mask] = color
+                color_mask[y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]][mask] = color
 
             # 将彩色掩膜与原始图像混合
             output = cv2.addWeighted(output, 1, color_mask, mask_alpha, 0)
@@ -232,20 +682,7 @@ class SliderV2:
 
         return output
 
-    @staticmethod
-    def image_to_array(source: Union[str, Path, bytes, np.ndarray] = None):
-        if isinstance(source, (str, Path)):
-            # 从文件路径读取
-            return cv2.imread(str(source))
-        elif isinstance(source, bytes):
-            # 从字节流读取
-            np_arr = np.frombuffer(source, np.uint8)
-            return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        elif isinstance(source, np.ndarray):
-            # 如果已经是 numpy 数组，直接使用
-            return source
-        else:
-            raise TypeError("Unsupported source type. Only str, Path, bytes, or numpy.ndarray are supported.")
+    image_to_array = staticmethod(image_to_array)
 
     @staticmethod
     def normalize_points(points):
@@ -256,7 +693,6 @@ class SliderV2:
         """
         # 计算质心
         centroid = np.mean(points, axis=0)
-        print('centroid', centroid)
         # 将质心移到原点
         # normalized_points = points - np.array([x, 0])
         normalized_points = points - centroid
@@ -285,6 +721,8 @@ class SliderV2:
         :param poly2: 多边形2的顶点坐标，格式同上
         :return: IoU 值（范围 [0, 1]）
         """
+        from shapely.geometry import Polygon
+
         # 创建 Shapely Polygon 对象
         # poly1 = Polygon(normalize_points(poly1))  # buffer(0) 修复无效多边形（如自相交）
         p1 = self.normalize_points(poly1)
@@ -340,34 +778,122 @@ class SliderV2:
 
         return box_filtered[iou_index], segment_filtered[iou_index]
 
+    @staticmethod
+    def raster_iou(template: np.ndarray, candidates: List[np.ndarray]) -> np.ndarray:
+        """
+        把位图按质心对齐后计算 template 与每个候选位图的 IoU
+        :param template: 滑块的二值位图
+        :param candidates: 候选缺口的二值位图列表
+        :return: 形状为 (len(candidates),) 的 IoU 数组
+        """
+        bitmaps = [template] + list(candidates)
+        centers = []
+        for bitmap in bitmaps:
+            moments = cv2.moments(bitmap.astype(np.uint8), binaryImage=True) if bitmap.size else {'m00': 0}
+            if moments['m00'] == 0:
+                centers.append(None)
+                continue
+            centers.append((int(round(moments['m01'] / moments['m00'])), int(round(moments['m10'] / moments['m00']))))
+
+        valid = [(bitmap, center) for bitmap, center in zip(bitmaps, centers) if center is not None]
+        if centers[0] is None or len(valid) == 1:
+            return np.zeros(len(candidates), dtype=np.float64)
+
+        # 所有位图的质心都放到同一画布的中心
+        half_h = max(max(cy, bitmap.shape[0] - cy) for bitmap, (cy, _) in valid)
+        half_w = max(max(cx, bitmap.shape[1] - cx) for bitmap, (_, cx) in valid)
+        canvas = np.zeros((len(bitmaps), 2 * half_h, 2 * half_w), dtype=bool)
+        for i, (bitmap, center) in enumerate(zip(bitmaps, centers)):
+            if center is not None:
+                y0, x0 = half_h - center[0], half_w - center[1]
+                canvas[i, y0:y0 + bitmap.shape[0], x0:x0 + bitmap.shape[1]] = bitmap
+
+        inter = np.logical_and(canvas[1:], canvas[0]).sum(axis=(1, 2))
+        union = np.logical_or(canvas[1:], canvas[0]).sum(axis=(1, 2))
+        return np.divide(inter, union, out=np.zeros(len(candidates), dtype=np.float64), where=union > 0)
+
+    def pick_out_mask_raster(self, boxes: np.ndarray, masks: Union[np.ndarray, RoiMasks]):
+        """
+        与 pick_out_mask 相同的挑选规则，但形状匹配直接在掩膜位图上完成，不需要轮廓和 Shapely
+        :param boxes: 检测框，格式为 [[x1, y1, x2, y2, score, class_id], ...]
+        :param masks: 与检测框一一对应的掩膜（RoiMasks 或全图掩膜）
+        :return: (缺口框, 缺口位图)，找不到时返回 ([], [])
+        """
+        bitmaps = (masks if isinstance(masks, RoiMasks) else RoiMasks.from_dense(masks)).bitmaps
+        boxes_list = boxes.tolist()
+        boxes = boxes.astype(np.float64)
+
+        # x 最小的 box 为滑块
+        slider_index = int(np.argmin(boxes[:, 0]))
+        others = np.array([i for i in range(len(boxes)) if i != slider_index], dtype=np.int64)
+
+        # 先按照y值iou过滤
+        start = np.maximum(boxes[slider_index, 1], boxes[others, 1])
+        end = np.minimum(boxes[slider_index, 3], boxes[others, 3])
+        intersection = np.maximum(0, end - start)
+        union = (boxes[slider_index, 3] - boxes[slider_index, 1]) + (boxes[others, 3] - boxes[others, 1]) - intersection
+        y_ious = np.divide(intersection, union, out=np.zeros_like(union), where=union != 0)
+        filtered = others[y_ious > Y_IOU_THRESHOLD]
+
+        if len(filtered) == 0:
+            return [], []
+        if len(filtered) == 1:
+            return boxes_list[filtered[0]], bitmaps[filtered[0]]
+
+        ious = self.raster_iou(bitmaps[slider_index], [bitmaps[i] for i in filtered])
+        best = filtered[int(np.argmax(ious))]
+        return boxes_list[best], bitmaps[best]
+
+    def select_box(self, boxes: np.ndarray, masks: np.ndarray) -> Tuple[List, float]:
+        """
+        从一张图片的检测结果中选出缺口框
+        :param boxes: 检测框，格式为 [[x1, y1, x2, y2, score, class_id], ...]
+        :param masks: 与检测框一一对应的掩膜
+        :return: (box, box_conf)，未识别出缺口时返回 ([], 0)
+        """
+        box = []
+        box_conf = 0
+        if len(boxes) == 0:
+            return box, box_conf
+
+        if len(boxes) == 1:
+            box_array = boxes[0]
+            box = box_array[:4].tolist()
+            box_conf = float(box_array[4])
+        elif len(boxes) in range(2, 6):
+            # 使用max函数找到置信度最大的box
+            selected_box = max(boxes, key=lambda x: x[4])
+            box_array = selected_box
+            box = box_array[:4].tolist()
+            box_conf = float(box_array[4])
+        else:
+            masks = LazyMasks.resolve_masks(masks)
+            if self.matcher == 'raster':
+                box_array, _ = self.pick_out_mask_raster(boxes, masks)
+            else:
+                segments = self.masks_to_segments(masks)
+                box_array, segment = self.pick_out_mask(boxes, segments)
+            if box_array:
+                box = box_array[:4]
+                box_conf = float(box_array[4])
+        return box, box_conf
+
     def identify(self, source: Union[str, Path, bytes, np.ndarray], conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, show=False):
         box = []
         box_conf = 0
-        boxes = []
-        masks = []
+        boxes = np.zeros((0, 6), dtype=np.float32)
+        masks = np.zeros((0, 0, 0), dtype=bool)
 
-        original_image: np.ndarray = self.image_to_array(source)
-        results = self.predict(original_image, conf=conf, iou=iou, imgsz=640)
+        with profiling.stage('decode'):
+            original_image: np.ndarray = self.image_to_array(source)
+        results = self.predict(original_image, conf=conf, iou=iou, lazy_masks=True)
 
         if results:
             boxes, masks = results[0]
-            if len(boxes) == 1:
-                box_array = boxes[0]
-                box = box_array[:4].tolist()
-                box_conf = float(box_array[4])
-            elif len(boxes) in range(2,6):
-                # 使用max函数找到置信度最大的box
-                selected_box = max(boxes, key=lambda x: x[4])
-                box_array = selected_box
-                box = box_array[:4].tolist()
-                box_conf = float(box_array[4])     
-            else:
-                segments = self.masks_to_segments(masks)
-                box_array, segment = self.pick_out_mask(boxes, segments)
-                if box_array:
-                    box = box_array[:4]
-                    box_conf = float(box_array[4])
-        if show and boxes.size > 0 and masks.size > 0:
+            with profiling.stage('pick'):
+                box, box_conf = self.select_box(boxes, masks)
+        if show and boxes.size > 0 and len(masks) > 0:
+            masks = LazyMasks.resolve_masks(masks)
             sample = self.draw_segments(original_image, boxes, masks)
             cv2.imshow('sample', sample)
             cv2.waitKey(0)
@@ -375,6 +901,17 @@ class SliderV2:
 
         return box, box_conf
 
+    def identify_batch(self, sources: List[Union[str, Path, bytes, np.ndarray]], conf=CONF_THRESHOLD,
+                       iou=IOU_THRESHOLD) -> List[Tuple[List, float]]:
+        """
+        批量识别缺口，所有图片合并成一个批次只调用一次模型
+        :param sources: 图片源列表
+        :return: 与 sources 一一对应的 (box, box_conf) 列表，含义与 identify 相同
+        """
+        images = [self.image_to_array(source) for source in sources]
+        results = self.predict_batch(images, conf=conf, iou=iou, lazy_masks=True)
+        return [self.select_box(boxes, masks) for boxes, masks in results]
+
     def scale_boxes(self, img1_shape: Tuple[int, int], boxes: np.ndarray, img0_shape: Tuple[int, int],
                     ratio_pad: Union[Tuple, None] = None, padding: bool = True, xywh: bool = False):
         """
@@ -618,6 +1155,112 @@ class SliderV2:
 
         return resized_masks
 
+    @staticmethod
+    def nms_greedy(boxes: np.ndarray, scores: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Greedy NMS that picks the highest scoring box and drops its overlaps one box at a time.
+
+        Args:
+            boxes (np.ndarray): Boxes with shape (N, 4) in xyxy format.
+            scores (np.ndarray): Confidence scores with shape (N,).
+            threshold (float): IoU threshold for NMS.
+
+        Returns:
+            (np.ndarray): Indices of boxes to keep, in descending score order.
+        """
+        i = []
+        y1, x1, y2, x2 = boxes[:, 1], boxes[:, 0], boxes[:, 3], boxes[:, 2]
+        area = (x2 - x1) * (y2 - y1)
+        order = scores.argsort()[::-1]
+        while order.size > 0:
+            idx = order[0]
+            i.append(idx)
+            xx1 = np.maximum(x1[idx], x1[order[1:]])
+            yy1 = np.maximum(y1[idx], y1[order[1:]])
+            xx2 = np.minimum(x2[idx], x2[order[1:]])
+            yy2 = np.minimum(y2[idx], y2[order[1:]])
+            w = np.maximum(0.0, xx2 - xx1)
+            h = np.maximum(0.0, yy2 - yy1)
+            inter = w * h
+            iou = inter / (area[idx] + area[order[1:]] - inter)
+            order = order[np.where(iou <= threshold)[0] + 1]
+        return np.array(i, dtype=np.int64)
+
+    @staticmethod
+    def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        """
+        Calculate the pairwise IoU matrix of two sets of xyxy boxes.
+
+        Args:
+            boxes1 (np.ndarray): Boxes with shape (N, 4).
+            boxes2 (np.ndarray): Boxes with shape (M, 4).
+
+        Returns:
+            (np.ndarray): IoU matrix with shape (N, M).
+        """
+        area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+        area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+        w = np.maximum(0.0, np.minimum(boxes1[:, None, 2], boxes2[None, :, 2]) -
+                       np.maximum(boxes1[:, None, 0], boxes2[None, :, 0]))
+        h = np.maximum(0.0, np.minimum(boxes1[:, None, 3], boxes2[None, :, 3]) -
+                       np.maximum(boxes1[:, None, 1], boxes2[None, :, 1]))
+        inter = w * h
+        return inter / (area1[:, None] + area2[None, :] - inter)
+
+    def nms_fast(self, boxes: np.ndarray, scores: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Vectorized NMS on a single IoU matrix, keeping exactly the boxes greedy NMS keeps.
+
+        Plain fast-NMS lets an already suppressed box suppress others. Here the keep mask is
+        re-evaluated against the IoU matrix until it stops changing: each pass fixes at least
+        one more box in score order, and the only stable mask is the greedy result.
+
+        Args:
+            boxes (np.ndarray): Boxes with shape (N, 4) in xyxy format.
+            scores (np.ndarray): Confidence scores with shape (N,).
+            threshold (float): IoU threshold for NMS.
+
+        Returns:
+            (np.ndarray): Indices of boxes to keep, in descending score order.
+        """
+        order = scores.argsort()[::-1]
+        boxes = boxes[order]
+        # overlap[i, j]: 分数更高的 i 会抑制 j
+        overlap = np.triu(self.box_iou(boxes, boxes) > threshold, k=1).astype(np.float32)
+
+        keep = np.ones(len(order), dtype=bool)
+        while True:
+            new_keep = (keep.astype(np.float32) @ overlap) == 0
+            if np.array_equal(new_keep, keep):
+                break
+            keep = new_keep
+        return order[keep]
+
+    @staticmethod
+    def nms_cv2(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Class-aware NMS backed by OpenCV's cv2.dnn.NMSBoxesBatched.
+
+        Args:
+            boxes (np.ndarray): Boxes with shape (N, 4) in xyxy format.
+            scores (np.ndarray): Confidence scores with shape (N,).
+            class_ids (np.ndarray): Class indices with shape (N,), all zeros for class-agnostic NMS.
+            threshold (float): IoU threshold for NMS.
+
+        Returns:
+            (np.ndarray): Indices of boxes to keep, in descending score order.
+        """
+        xywh = np.concatenate((boxes[:, :2], boxes[:, 2:4] - boxes[:, :2]), axis=1).astype(np.float64)
+        scores = scores.astype(np.float32)
+        class_ids = class_ids.astype(np.int32)
+        if hasattr(cv2.dnn, 'NMSBoxesBatched'):
+            i = cv2.dnn.NMSBoxesBatched(xywh, scores, class_ids, 0.0, threshold)
+        else:
+            # 旧版本 OpenCV 没有 NMSBoxesBatched，用坐标偏移区分类别
+            xywh[:, :2] += class_ids[:, None] * 7680
+            i = cv2.dnn.NMSBoxes(xywh, scores, 0.0, threshold)
+        return np.array(i, dtype=np.int64).reshape(-1)
+
     def non_max_suppression(
             self,
             prediction: np.ndarray,
@@ -636,10 +1279,19 @@ class SliderV2:
             rotated: bool = False,
             end2end: bool = False,
             return_idxs: bool = False,
+            nms_engine: Union[str, None] = None,
     ):
         """
         Perform non-maximum suppression (NMS) on prediction results.
+
+        ``nms_engine`` selects the NMS implementation for axis-aligned boxes (see NMS_ENGINES),
+        defaulting to the engine the model was created with. 'none' treats the prediction as
+        an end2end export whose output is already NMS-filtered.
         """
+        engine = nms_engine or self.nms_engine
+        if engine not in NMS_ENGINES:
+            raise ValueError(f"Invalid NMS engine {engine}, valid values are {NMS_ENGINES}")
+        end2end = end2end or engine == 'none'
         assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
         assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
 
@@ -720,27 +1372,12 @@ class SliderV2:
             if rotated:
                 boxes = np.concatenate((x[:, :2] + c, x[:, 2:4], x[:, -1:]), axis=-1)
                 i = self.nms_rotated(boxes, scores, iou_thres)
+            elif engine == 'cv2':
+                i = self.nms_cv2(x[:, :4], scores, x[:, 5] * (0 if agnostic else 1), iou_thres)
+            elif engine == 'fast' and x.shape[0] <= FAST_NMS_MAX_BOXES:
+                i = self.nms_fast(x[:, :4] + c, scores, iou_thres)
             else:
-                boxes = x[:, :4] + c
-                # Custom NMS for numpy
-                i = []
-                if boxes.shape[0] > 0:
-                    y1, x1, y2, x2 = boxes[:, 1], boxes[:, 0], boxes[:, 3], boxes[:, 2]
-                    area = (x2 - x1) * (y2 - y1)
-                    order = scores.argsort()[::-1]
-                    while order.size > 0:
-                        idx = order[0]
-                        i.append(idx)
-                        xx1 = np.maximum(x1[idx], x1[order[1:]])
-                        yy1 = np.maximum(y1[idx], y1[order[1:]])
-                        xx2 = np.minimum(x2[idx], x2[order[1:]])
-                        yy2 = np.minimum(y2[idx], y2[order[1:]])
-                        w = np.maximum(0.0, xx2 - xx1)
-                        h = np.maximum(0.0, yy2 - yy1)
-                        inter = w * h
-                        iou = inter / (area[idx] + area[order[1:]] - inter)
-                        order = order[np.where(iou <= iou_thres)[0] + 1]
-                i = np.array(i)
+                i = self.nms_greedy(x[:, :4] + c, scores, iou_thres)
 
             i = i[:max_det]
 
@@ -751,6 +1388,19 @@ class SliderV2:
         return (output, keepi) if return_idxs else output
 
 
+def preload(warmup: bool = True, **options) -> SliderV2:
+    """
+    预加载共享会话，可选用空白图片跑一次完整推理预热，options 为 SliderV2 构造参数
+    """
+    model = SliderV2(**options)
+    if warmup:
+        start = time.perf_counter()
+        model.predict(np.zeros((160, 320, 3), dtype=np.uint8))
+        logger.info(f"SliderV2 预热完成，耗时 {(time.perf_counter() - start) * 1000:.1f} ms, "
+                    f"会话参数: {registry.options}")
+    return model
+
+
 if __name__ == "__main__":
     """
     单缺口
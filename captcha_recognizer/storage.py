@@ -0,0 +1,109 @@
+"""
+本地 JSON 状态文件的持久化
+
+结果缓存、模型注册表、集成识别校准表和拖动距离标定都保存为 JSON 文件:
+- write_json: 在目标目录中用 mkstemp 创建唯一的临时文件，写完后 os.replace 替换，
+  并发写入互不干扰，写入中断也不会留下损坏的文件
+- DebouncedWriter: 请求路径上频繁变化的状态只标记为待保存，delay 秒后在后台线程写一次最新快照，
+  进程退出时写出尚未保存的内容
+
+    writer = DebouncedWriter(lambda: self.path, self.snapshot, delay=2.0, label='验证码结果缓存')
+    writer.schedule()        # 状态变化后调用，不阻塞
+    writer.flush()           # 立即写出尚未保存的变化（关闭前或需要确定已落盘时）
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def write_json(path: str, data: Any, **dump_options) -> None:
+    """原子地把 data 写入 path（先写同目录下的唯一临时文件再替换），失败时抛出 OSError"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DebouncedWriter:
+    """
+    合并一段时间内的多次保存请求，在后台线程写出最新快照（线程安全）
+
+    :param path: 返回目标路径的函数，返回空值时不保存
+    :param snapshot: 返回待写入数据的函数，在写入时调用，因此总是写出最新状态
+    :param delay: 第一次 schedule 后等待多少秒再写入，0 表示同步写入
+    :param label: 日志中的名称
+    """
+
+    _instances: 'weakref.WeakSet[DebouncedWriter]' = weakref.WeakSet()
+
+    def __init__(self, path: Callable[[], Optional[str]], snapshot: Callable[[], Any], delay: float = 2.0,
+                 label: str = '状态文件', **dump_options):
+        self._path = path
+        self._snapshot = snapshot
+        self.delay = delay
+        self.label = label
+        self.dump_options = dump_options
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        DebouncedWriter._instances.add(self)
+
+    def schedule(self) -> None:
+        """标记为待保存，delay 秒内的多次调用只写一次"""
+        if self.delay <= 0:
+            with self._lock:
+                self._dirty = True
+            self.flush()
+            return
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self, force: bool = False) -> bool:
+        """立即写出待保存的状态，没有待保存的内容且 force 为 False 时不写；返回是否写入成功"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty and not force:
+                return True
+            self._dirty = False
+        path = self._path()
+        if not path:
+            return True
+        with self._write_lock:
+            try:
+                write_json(path, self._snapshot(), **self.dump_options)
+            except (OSError, TypeError, ValueError) as e:
+                logger.error(f"保存{self.label}失败: {e}")
+                return False
+        return True
+
+    @classmethod
+    def flush_all(cls) -> None:
+        for writer in list(cls._instances):
+            writer.flush()
+
+
+atexit.register(DebouncedWriter.flush_all)
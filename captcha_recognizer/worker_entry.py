@@ -0,0 +1,7 @@
+"""
+验证码推理工作进程的 __main__ 模块
+
+spawn 启动的子进程会以 __mp_main__ 的名义重新执行父进程的 __main__。
+workers 启动工作进程时把 __main__ 临时指向本模块，子进程因此不会执行 app.py 的模块级代码
+（日志文件处理器、Flask 应用），任务函数本身在 captcha_recognizer.workers 中。
+"""
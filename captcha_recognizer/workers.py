@@ -0,0 +1,355 @@
+"""
+进程外的验证码推理工作进程池
+
+SliderV2 的后处理（NMS、掩膜缩放、形状匹配）是纯 Python/numpy 代码，会占用 GIL，
+与 Flask 请求线程、Selenium I/O 线程争抢。工作进程各自持有预热好的 SliderV2 会话，
+解码后的图片通过 multiprocessing.shared_memory 传给工作进程，不经过 pickle。
+
+    pool = InferencePool(processes=2, slider_options={...})
+    future = pool.submit(image)            # concurrent.futures.Future
+    box, conf = future.result(timeout=10)
+    box, conf = pool.identify(image, timeout=10)
+
+工作进程意外退出或超时未返回时，对应任务以 WorkerCrashedError / WorkerTimeoutError 结束（都是 RuntimeError），
+进程自动重建。工作进程连续启动失败、全部被移除后 get_pool 返回 None，调用方回到本进程推理；
+单次任务失败时可以用 FallbackModel 包装进程池，改在本进程重新识别。
+
+spawn 启动的子进程默认会重新执行父进程的 __main__（app.py 的日志文件和 Flask 初始化），
+启动工作进程时把 __main__ 临时换成最小的入口模块 captcha_recognizer.worker_entry。
+"""
+import atexit
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 工作进程连续启动失败（模型加载失败等）达到该次数后不再重建
+MAX_STARTUP_FAILURES = 3
+
+# Windows 只支持 spawn，其他平台也统一使用 spawn，避免 fork 复制 Flask/Selenium 的线程状态
+_context = multiprocessing.get_context('spawn')
+
+# 替换 sys.modules['__main__'] 期间持有
+_main_lock = threading.Lock()
+
+
+class WorkerCrashedError(RuntimeError):
+    """工作进程在处理任务时退出"""
+
+
+class WorkerTimeoutError(RuntimeError):
+    """任务超时未返回，工作进程已重建"""
+
+
+@contextmanager
+def _worker_entry_main():
+    """Process.start() 期间把 __main__ 换成 worker_entry，子进程只导入该模块"""
+    from captcha_recognizer import worker_entry
+
+    with _main_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = worker_entry
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
+
+
+def _worker_main(conn, slider_options: Dict, session_options: Dict) -> None:
+    """工作进程入口：加载并预热模型，循环处理任务直到收到 None"""
+    from captcha_recognizer.session import registry
+    from captcha_recognizer.slider import preload
+
+    registry.configure(**session_options)
+    model = preload(warmup=True, **slider_options)
+    conn.send(('ready', None, None))
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        task_id, shm_name, shape, dtype, kwargs = task
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            box, conf = model.identify(image, **kwargs)
+            conn.send((task_id, ([float(v) for v in box], float(conf)), None))
+        except Exception as e:
+            conn.send((task_id, None, f"{type(e).__name__}: {e}"))
+        finally:
+            # 先释放对共享内存的引用再关闭
+            image = None
+            try:
+                shm.close()
+            except BufferError:
+                # 仍有对象引用该内存时交给进程退出时回收
+                pass
+
+
+class _Worker:
+    def __init__(self, index: int, slider_options: Dict, session_options: Dict, target=_worker_main):
+        self.index = index
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=target, args=(child_conn, slider_options, session_options),
+                                        name=f'captcha-worker-{index}', daemon=True)
+        with _worker_entry_main():
+            self.process.start()
+        child_conn.close()
+        # ready: 可以分配任务；started: 已经完成过启动（之后的退出不计为启动失败）
+        self.ready = False
+        self.started = False
+        self.task: Optional['_Task'] = None
+
+    def stop(self, timeout: float = 2.0) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError, BrokenPipeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class _Task:
+    def __init__(self, task_id: int, image: np.ndarray, kwargs: Dict, timeout: Optional[float]):
+        self.id = task_id
+        self.future: Future = Future()
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.deadline: Optional[float] = None
+        self.started = False
+        # 图片只复制一次到共享内存，由主进程负责释放
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=self.shm.buf)[...] = image
+        self.shape, self.dtype = image.shape, image.dtype.str
+
+    def message(self) -> Tuple:
+        return self.id, self.shm.name, self.shape, self.dtype, self.kwargs
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+class InferencePool:
+    """
+    验证码推理工作进程池
+
+    :param processes: 工作进程数
+    :param slider_options: 每个工作进程中 SliderV2 的构造参数
+    :param session_options: 每个工作进程中 SessionRegistry 的会话参数
+    :param task_timeout: 任务从开始执行算起的最长时间（秒），超时的工作进程会被重建
+    """
+
+    def __init__(self, processes: int = 2, slider_options: Optional[Dict] = None,
+                 session_options: Optional[Dict] = None, task_timeout: float = 30.0):
+        self.slider_options = dict(slider_options or {})
+        self.session_options = dict(session_options or {})
+        self.task_timeout = task_timeout
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._next_id = 0
+        self._closed = False
+        self.respawns = 0
+        self._startup_failures = 0
+        self._workers: List[_Worker] = [self._spawn(i) for i in range(processes)]
+        self._collector = threading.Thread(target=self._collect, name='captcha-pool-collector', daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index: int) -> _Worker:
+        return _Worker(index, self.slider_options, self.session_options)
+
+    def submit(self, image: np.ndarray, timeout: Optional[float] = None, **kwargs) -> Future:
+        """
+        提交识别任务，返回结果为 (box, conf) 的 Future
+        :param timeout: 本任务的执行超时（秒），默认使用 task_timeout
+        """
+        image = np.ascontiguousarray(image)
+        with self._lock:
+            if self._closed or not self._workers:
+                raise RuntimeError("工作进程池已关闭或没有可用的工作进程")
+            self._next_id += 1
+            task = _Task(self._next_id, image, kwargs, timeout or self.task_timeout)
+            self._pending.append(task)
+            self._dispatch()
+        return task.future
+
+    def identify(self, source, timeout: Optional[float] = None, **kwargs) -> Tuple[List[float], float]:
+        """与 SliderV2.identify 相同的接口，在工作进程中执行，timeout 为等待结果的最长时间（秒）"""
+        from captcha_recognizer.backend import image_to_array
+
+        future = self.submit(image_to_array(source), timeout=timeout, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.task_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise WorkerTimeoutError("验证码识别超时")
+
+    def _dispatch(self) -> None:
+        """把等待中的任务分配给空闲的工作进程（调用方持有锁）"""
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if not worker.ready or worker.task is not None:
+                continue
+            task = self._pending.popleft()
+            if not task.started and not task.future.set_running_or_notify_cancel():
+                task.release()
+                continue
+            task.started = True
+            try:
+                worker.conn.send(task.message())
+            except (OSError, BrokenPipeError):
+                # 工作进程已退出，任务放回队列，由收集线程重建进程
+                worker.ready = False
+                self._pending.appendleft(task)
+                continue
+            task.deadline = time.monotonic() + task.timeout
+            worker.task = task
+
+    def _collect(self) -> None:
+        """收集结果、检查超时，并重建退出的工作进程"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                workers = list(self._workers)
+            objects = {worker.conn: worker for worker in workers}
+            objects.update({worker.process.sentinel: worker for worker in workers})
+            for ready in wait(list(objects), timeout=0.2):
+                worker = objects[ready]
+                if ready is worker.conn:
+                    self._receive(worker)
+                elif not worker.process.is_alive():
+                    self._replace(worker, WorkerCrashedError(f"工作进程 {worker.process.name} 已退出"))
+            now = time.monotonic()
+            for worker in workers:
+                task = worker.task
+                if task is not None and task.deadline is not None and now > task.deadline:
+                    self._replace(worker, WorkerTimeoutError("验证码识别超时，工作进程已重建"))
+
+    def _receive(self, worker: _Worker) -> None:
+        try:
+            task_id, result, error = worker.conn.recv()
+        except (EOFError, OSError):
+            self._replace(worker, WorkerCrashedError(f"工作进程 {worker.process.name} 已退出"))
+            return
+        with self._lock:
+            if task_id == 'ready':
+                worker.ready = worker.started = True
+                self._startup_failures = 0
+            else:
+                task, worker.task = worker.task, None
+                if task is not None and task.id == task_id:
+                    task.release()
+                    if error is None:
+                        task.future.set_result(result)
+                    else:
+                        task.future.set_exception(RuntimeError(error))
+            self._dispatch()
+
+    def _replace(self, worker: _Worker, error: Exception) -> None:
+        with self._lock:
+            if self._closed or worker not in self._workers:
+                return
+            task, worker.task = worker.task, None
+            if task is not None:
+                task.release()
+                if not task.future.done():
+                    task.future.set_exception(error)
+            worker.process.kill()
+            worker.conn.close()
+            if not worker.started:
+                self._startup_failures += 1
+            if self._startup_failures >= MAX_STARTUP_FAILURES:
+                logger.error(f"验证码工作进程连续 {self._startup_failures} 次启动失败，不再重建")
+                self._workers.remove(worker)
+                if not self._workers:
+                    pending, self._pending = list(self._pending), deque()
+                    for task in pending:
+                        task.release()
+                        task.future.set_exception(WorkerCrashedError("验证码工作进程无法启动"))
+                return
+            logger.warning(f"重建验证码工作进程 {worker.process.name}: {error}")
+            self._workers[self._workers.index(worker)] = self._spawn(worker.index)
+            self.respawns += 1
+
+    @property
+    def available(self) -> bool:
+        """进程池未关闭且还有工作进程（连续启动失败的进程会被移除）"""
+        with self._lock:
+            return not self._closed and bool(self._workers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'processes': len(self._workers),
+                'ready': sum(worker.ready for worker in self._workers),
+                'busy': sum(worker.task is not None for worker in self._workers),
+                'pending': len(self._pending),
+                'respawns': self.respawns,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending, self._pending = list(self._pending), deque()
+            workers = list(self._workers)
+        self._collector.join(1.0)
+        for task in pending + [worker.task for worker in workers if worker.task is not None]:
+            task.release()
+            if not task.future.done():
+                task.future.set_exception(RuntimeError("工作进程池已关闭"))
+        for worker in workers:
+            worker.stop()
+
+
+class FallbackModel:
+    """
+    在工作进程池中识别，工作进程超时或退出时改用本进程的模型重新识别
+
+    :param pool: 工作进程池
+    :param fallback: 返回本进程模型的函数，只在需要时调用
+    """
+
+    def __init__(self, pool: InferencePool, fallback):
+        self.pool = pool
+        self.fallback = fallback
+
+    def identify(self, source, **kwargs) -> Tuple[List[float], float]:
+        try:
+            return self.pool.identify(source, **kwargs)
+        except (WorkerTimeoutError, WorkerCrashedError) as e:
+            logger.warning(f"工作进程识别失败，改在本进程识别: {e}")
+            return self.fallback().identify(source, **kwargs)
+
+
+_pool: Optional[InferencePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes: int, slider_options: Optional[Dict] = None, session_options: Optional[Dict] = None,
+             task_timeout: float = 30.0) -> Optional[InferencePool]:
+    """获取进程内共享的工作进程池，首次调用时创建；工作进程都无法启动时返回 None"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InferencePool(processes, slider_options, session_options, task_timeout)
+            atexit.register(_pool.shutdown)
+        return _pool if _pool.available else None
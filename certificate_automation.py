@@ -1,9 +1,12 @@
 # certificate_automation.py
-import time,random,os,base64,io,shutil
-from PIL import Image
+import time,random,os,base64,shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import zipfile
 
+import cv2
+import numpy as np
+
 from selenium.webdriver.common.by import By
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
@@ -13,12 +16,35 @@ import logging
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
-from captcha_recognizer.slider import SliderV2
+from captcha_recognizer.cache import result_cache
+from captcha_recognizer.cascade import CascadeDetector
+from captcha_recognizer.drag_calibration import drag_calibrator
+from captcha_recognizer.ensemble import EnsembleDetector, ensemble_stats
+from captcha_recognizer.model_registry import model_registry
+from captcha_recognizer.profiling import profile_attempt, stage
+from captcha_recognizer.refine import refine_gap_edge
+from captcha_recognizer.workers import FallbackModel, get_pool
 import subprocess
 import win32print
 
 logger = logging.getLogger(__name__)
 
+# 验证码样本落盘在后台单线程中完成，不占用识别耗时
+_sample_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='captcha-sample')
+
+# 读取滑块和拼图块当前渲染位置的脚本：取页面上的实际位置，left 和 transform 两种移动方式都适用
+SLIDER_POSITION_JS = """
+var panel = document.getElementById('mpanel2');
+if (!panel) { return null; }
+var block = panel.querySelector('.verify-move-block');
+if (!block) { return null; }
+var piece = panel.querySelector('.verify-sub-block');
+return {
+    block: block.getBoundingClientRect().left,
+    piece: piece ? piece.getBoundingClientRect().left : null
+};
+"""
+
 class CertificateAutomation:
     """证件自动化处理类 - 专注于浏览器操作"""
     
@@ -26,6 +52,14 @@ class CertificateAutomation:
         self.driver = None
         self.wait = None
         self.config = config_manager
+        # 最近一次识别的验证码缓存键，滑动失败时用于淘汰缓存结果
+        self._captcha_cache_key = None
+        # 最近一次集成识别的决策，滑动结束后记录结果
+        self._captcha_decision = None
+        # 最近一次滑动的识别结果、拖动距离和轨迹，滑动结束后写入滑动记录用于标定拖动距离
+        self._slide_attempt = None
+        # 本次登录中的第几次滑动，用于统计首次滑动通过率
+        self._slide_number = 0
     
     def __enter__(self):
         """上下文管理器入口"""
@@ -139,49 +173,48 @@ class CertificateAutomation:
         """处理登录重试逻辑"""
         # 登录(带重试机制)
         max_login_attempts = 3
+        self._slide_number = 0
         for attempt in range(max_login_attempts):
             old_url = self.driver.current_url
             logger.info(f"尝试登录，第 {attempt + 1} 次")
-            # 解决滑块验证码
-            self._solve_slider_captcha()
-
-            try:   # 点击登录按钮后，等待 URL 变化看看是否登录成功
-                # 等待 URL 变化（1 秒内）
-                WebDriverWait(self.driver, 1).until(lambda d: d.current_url != old_url)
-                logger.info("登录成功，已跳转到下一页")
-                break  # 登录成功，跳出重试循环
-                
-            except TimeoutException:
-                # 1 秒后仍在登录页 ⇒ 出现了错误提示
-                error_tip = self.driver.find_element(By.CSS_SELECTOR, ".err_tip .err_text")
-                error_text = error_tip.text.strip()
-                logger.info(f"登录失败：{error_text}")
-                
-                if error_text == "用户名或密码不正确":
-                    raise Exception("用户名或密码不正确")
-                
-                elif error_text == "请进行滑块验证":
-                    # 验证码相关错误，可以重试
-                    if attempt < max_login_attempts - 1:  # 不是最后一次尝试
-                        logger.info(f"验证码错误，准备重试 (剩余 {max_login_attempts - attempt - 1} 次)")
-                        try:
-                            # 重新解决滑块验证码
+            try:
+                # 解决滑块验证码
+                self._solve_slider_captcha()
+
+                try:   # 点击登录按钮后，等待 URL 变化看看是否登录成功
+                    # 等待 URL 变化（1 秒内）
+                    WebDriverWait(self.driver, 1).until(lambda d: d.current_url != old_url)
+                    logger.info("登录成功，已跳转到下一页")
+                    self._report_slide_outcome(passed=True)
+                    break  # 登录成功，跳出重试循环
+
+                except TimeoutException:
+                    # 1 秒后仍在登录页 ⇒ 出现了错误提示
+                    error_tip = self.driver.find_element(By.CSS_SELECTOR, ".err_tip .err_text")
+                    error_text = error_tip.text.strip()
+                    logger.info(f"登录失败：{error_text}")
+
+                    if error_text == "用户名或密码不正确":
+                        # 滑块验证已通过，只是账号密码错误
+                        self._report_slide_outcome(passed=True, error_text=error_text)
+                        raise Exception("用户名或密码不正确")
+
+                    elif error_text == "请进行滑块验证":
+                        self._report_slide_outcome(passed=False, error_text=error_text)
+                        # 验证码相关错误，可以重试：下一轮重新滑动并检查结果
+                        if attempt < max_login_attempts - 1:  # 不是最后一次尝试
+                            logger.info(f"验证码错误，准备重试 (剩余 {max_login_attempts - attempt - 1} 次)")
                             time.sleep(1)
-                            if not self._solve_slider_captcha():
-                                logger.error("重试时验证码识别失败")
-                                time.sleep(1)
-                                continue  # 继续下一次重试
-                        except Exception as refresh_e:
-                            logger.error(f"刷新验证码失败: {refresh_e}")
-                            
+                        else:
+                            # 已是最后一次尝试
+                            return False, "登录失败，验证码错误"
                     else:
-                        # 已是最后一次尝试
-                        return False, "登录失败，验证码错误"
-                else:
-                    # 其他类型错误，不重试
-                    raise Exception("登录异常")             
-        
-    
+                        # 其他类型错误，不重试
+                        raise Exception("登录异常")
+            finally:
+                # 结果未知的滑动（识别或拖动异常、其他错误提示）不记录，避免带到下一次滑动
+                self._discard_slide_state()
+
     def _navigate_to_certificate_page(self, document_type: str):
         """导航到证件页面"""
         time.sleep(2)
@@ -264,15 +297,22 @@ class CertificateAutomation:
 
             # 识别并算拖动距离
             drag_distance = self._get_drag_distance_with_retry(web_image_width, max_retry=5)
+            self._slide_number += 1
 
             # 继续拖动
             track = self._generate_human_like_track(drag_distance)
             logger.info(f"开始拖动滑块，轨迹步数: {len(track)}，总距离：{drag_distance}")
+            start_position = self._read_slider_position()
 
             for move in track:
                 action.move_by_offset(xoffset=move, yoffset=random.uniform(-1, 1)).perform()
                 time.sleep(random.uniform(0.01, 0.03))
 
+            # 松开前读取滑块实际位置，偏差超出容差时做小幅修正
+            feedback = self._correct_drag(action, start_position, drag_distance)
+            if self._slide_attempt is not None:
+                self._slide_attempt.update(track=track, slide_number=self._slide_number, **feedback)
+
             action.release().perform()
             logger.info("滑块拖动完成")
 
@@ -289,6 +329,82 @@ class CertificateAutomation:
             logger.error(f"解决滑块验证码失败: {str(e)}")
             raise Exception("验证码识别失败")
         
+    def _read_slider_position(self):
+        """读取滑块和拼图块的渲染位置（页面像素），页面结构不符或脚本出错时返回 None"""
+        try:
+            return self.driver.execute_script(SLIDER_POSITION_JS)
+        except Exception as e:
+            logger.warning(f"读取滑块位置失败: {e}")
+            return None
+
+    def _correct_drag(self, action, start_position, target: int) -> dict:
+        """
+        闭环修正拖动距离：读取滑块相对按下时的实际位移，与目标相差超过容差时补一次小幅移动，
+        直到进入容差、达到最大修正次数或滑块不再响应
+        :return: 写入滑动记录的反馈信息，dragged 为实际位移（读不到位置时为轨迹总和）
+        """
+        options = self.config.drag_feedback_options
+        commanded = target
+        if not options['enabled'] or start_position is None:
+            return {'dragged': commanded, 'feedback': False}
+
+        corrections = []
+        offset = None
+        for _ in range(options['max_corrections'] + 1):
+            position = self._read_slider_position()
+            if position is None:
+                break
+            offset = position['block'] - start_position['block']
+            error = target - offset
+            if abs(error) <= options['tolerance'] or len(corrections) >= options['max_corrections']:
+                break
+            # 按剩余偏差补移动，单步不超过 max_step，模拟人手微调
+            move = int(round(max(-options['max_step'], min(options['max_step'], error))))
+            if not move or (corrections and corrections[-1]['offset'] == round(offset, 2)):
+                # 偏差小于 1 像素或上一次修正没有让滑块移动（已到边界或页面不响应）
+                break
+            time.sleep(random.uniform(0.05, 0.12))
+            action.move_by_offset(xoffset=move, yoffset=0).perform()
+            commanded += move
+            corrections.append({'offset': round(offset, 2), 'move': move})
+
+        if offset is None:
+            return {'dragged': commanded, 'feedback': False}
+        feedback = {
+            'dragged': round(offset, 2),
+            'feedback': True,
+            'commanded': commanded,
+            'corrections': corrections,
+        }
+        if position is not None and start_position.get('piece') is not None and position.get('piece') is not None:
+            feedback['piece_offset'] = round(position['piece'] - start_position['piece'], 2)
+        logger.info(f"滑块实际位移: {offset:.2f}，目标: {target}，修正 {len(corrections)} 次")
+        return feedback
+
+    def _discard_slide_state(self):
+        """清除未上报结果的滑动状态，不计入结果缓存、集成识别统计和滑动记录"""
+        if self._slide_attempt is not None:
+            logger.info("本次滑动结果未知，不写入滑动记录")
+        self._captcha_cache_key = None
+        self._captcha_decision = None
+        self._slide_attempt = None
+
+    def _report_slide_outcome(self, passed: bool, error_text: str = ''):
+        """
+        记录一次滑动验证的结果：失败时淘汰缓存的识别结果，更新集成识别的统计和置信度校准，
+        并把识别框、拖动距离、轨迹和结果写入滑动记录（用于标定拖动距离）
+        """
+        if not passed and self._captcha_cache_key is not None:
+            # 滑动失败，缓存的识别结果不可信
+            result_cache.report_failure(self._captcha_cache_key)
+        self._captcha_cache_key = None
+        ensemble_stats.report_outcome(self._captcha_decision, passed)
+        self._captcha_decision = None
+        if self._slide_attempt is not None and 'track' in self._slide_attempt:
+            drag_calibrator.record(dict(self._slide_attempt, passed=passed, error_text=error_text,
+                                        trace_id=state_manager.get_state().trace_id))
+        self._slide_attempt = None
+
     # 计算滑块拖动距离
     def _get_drag_distance_with_retry(self, web_image_width, max_retry=None):
         """获取滑块拖动距离，识别失败会自动刷新图片重试"""
@@ -301,45 +417,55 @@ class CertificateAutomation:
                     EC.presence_of_element_located((By.CSS_SELECTOR, "#mpanel2 .backImg"))
                 )
                 src_data = captcha_img.get_attribute("src")
-                if not src_data.startswith("data:image"):
-                    raise RuntimeError("验证码图片src异常")
-
-                bg_b64 = src_data.split("base64,")[1]
-                bg_bytes = base64.b64decode(bg_b64)
+                bg_bytes, bg_image = self._decode_captcha_image(src_data)
 
-                # 保存图片到本地临时文件
-                IMG_DIR = self.config.img_dir
-                tt = time.time()
-                img_name = f'{tt}_image.png'
-                img_abs_path = os.path.join(IMG_DIR, img_name)
-
-                # 确保目录存在
-                os.makedirs(IMG_DIR, exist_ok=True)
-                
-                with open(img_abs_path, "wb") as f:
-                    f.write(bg_bytes)
+                # 样本图片在后台保存，不阻塞识别
+                if self.config.save_captcha_samples:
+                    _sample_writer.submit(self._save_captcha_sample, bg_bytes)
 
                 logger.info(f"第{attempt}次尝试：调用本地模型识别缺口位置...")
-                box, _ = SliderV2().identify(source=img_abs_path, show=False)
+                profile_options = self.config.captcha_profiling
+                state = state_manager.get_state()
+                if profile_options['enabled'] or state.profile_captcha:
+                    with profile_attempt(state.trace_id, profile_options['trace_dir'], ort=profile_options['ort'],
+                                         max_traces=profile_options['max_traces'], attempt=attempt,
+                                         workers=self.config.captcha_workers) as profile:
+                        box, conf = self._identify_gap(bg_image, final_attempt=attempt == max_retry)
+                        profile.result(box=box, conf=conf, image_shape=list(bg_image.shape))
+                else:
+                    box, conf = self._identify_gap(bg_image, final_attempt=attempt == max_retry)
 
                 if not box:
                     raise RuntimeError("未能识别出缺口位置")
 
-                raw_x = float(box[0])
-                logger.info(f"识别出的原始缺口X坐标: {raw_x}")
+                model_x = float(box[0])
+                logger.info(f"识别出的原始缺口X坐标: {model_x}")
+                raw_x, edge = self._refine_gap_edge(bg_image, box)
 
-                # 计算缩放
-                with Image.open(io.BytesIO(bg_bytes)) as img:
-                    orig_w = float(img.width)
+                # 计算缩放（原始宽度直接取自解码后的图片）
+                orig_w = float(bg_image.shape[1])
 
-                scale = web_image_width / orig_w if orig_w else 1.0
-                initial_slider_x = 12
-                distance = (raw_x - initial_slider_x) * scale
+                # 滑块初始位置、缩放修正和分段修正来自拖动距离标定，未标定时为 INITIAL_SLIDER_X 和线性缩放；
+                # 开启 DRAG_EXPLORE_RATE 时一部分滑动带有探索扰动，用于标定修正方向
+                drag_calibrator.configure(**self.config.drag_calibration_options)
+                distance, drag_info = drag_calibrator.plan(raw_x, orig_w, web_image_width)
 
                 logger.info(f"网页图片宽度: {web_image_width}, 原始图片宽度: {orig_w}")
-                logger.info(f"缩放比例: {scale:.4f}, 拖动距离: {distance:.2f}")
-
-                return max(1, int(distance))
+                logger.info(f"滑块初始x: {drag_info['offset']:.2f}, 缩放修正: {drag_info['gain']:.4f}, "
+                            f"拖动距离: {distance:.2f}, 探索扰动: {drag_info['dither']}")
+
+                self._slide_attempt = {
+                    'raw_x': raw_x,
+                    'model_x': model_x,
+                    **edge,
+                    'box': [float(v) for v in box[:4]],
+                    'conf': float(conf),
+                    'image_width': orig_w,
+                    'web_width': float(web_image_width),
+                    'distance': round(distance, 3),
+                    **drag_info,
+                }
+                return max(1, int(round(distance)))
 
             except RuntimeError as e:
                 logger.error(f"识别失败: {e}")
@@ -356,10 +482,98 @@ class CertificateAutomation:
                 else:
                     raise RuntimeError("达到最大重试次数，仍未识别出缺口位置")
     
+    def _refine_gap_edge(self, bg_image, box):
+        """
+        在原图上细化缺口左边缘，返回 (x, 细化信息)；质量分不够、未开启或落入对照组时 x 为模型的 box[0]
+        """
+        options = self.config.edge_refine_options
+        if not options['enabled']:
+            return float(box[0]), {}
+        if random.random() < options['control_rate']:
+            # 对照组不细化，用于对比首次滑动通过率
+            return float(box[0]), {'edge_refined': False}
+        with stage('refine'):
+            x, quality = refine_gap_edge(bg_image, box, options['search'], options['min_quality'])
+        applied = quality >= options['min_quality']
+        logger.info(f"缺口边缘细化: {float(box[0]):.2f} -> {x:.2f}，质量分 {quality:.3f}"
+                    f"{'' if applied else '（质量不足，未采用）'}")
+        # edge_refined 表示属于细化组（按分组对比，不论质量分是否达标）
+        return x, {'edge_refined': True, 'edge_applied': applied, 'edge_quality': round(quality, 4)}
+
+    def _identify_gap(self, bg_image, final_attempt: bool = False):
+        """按配置选择模型识别缺口，返回 (box, conf)；集成识别建议刷新时返回空框"""
+        # 与 app.preload_captcha_models 相同的注册表配置，预加载之前或不经过预加载时也使用持久化的生效模型
+        model_registry.configure(**self.config.model_registry_options)
+
+        def local_model():
+            # 注册表中的生效模型，可通过 /api/models 热切换
+            return model_registry.get('slider-v2', **self.config.slider_options)
+
+        model = None
+        if self.config.captcha_workers > 0:
+            # 在工作进程中识别，不占用本进程的 GIL（性能分析只记录总耗时）；工作进程都无法启动时返回 None，
+            # 单次任务超时或工作进程退出时回到本进程识别
+            pool = get_pool(self.config.captcha_workers, self.config.slider_options,
+                            self.config.ort_session_options, self.config.captcha_worker_timeout)
+            if pool is not None:
+                model = FallbackModel(pool, local_model)
+        if model is None:
+            model = local_model()
+        ensemble = None
+        if self.config.ensemble_enabled:
+            # 与 slider-v1 并行识别，不一致时按校准置信度选择或刷新；最后一次尝试不再刷新
+            options = dict(self.config.ensemble_options)
+            ensemble_stats.configure(options.pop('calibration_path'))
+            model = ensemble = EnsembleDetector(model, model_registry.get('slider-v1'),
+                                                allow_refresh=not final_attempt, **options)
+        if self.config.cascade_calibration:
+            # 先用边缘模板匹配快速识别，分数不够时再回退到模型
+            model = CascadeDetector(model, self.config.cascade_calibration)
+        with stage('identify'):
+            if self.config.result_cache_enabled:
+                box, conf, self._captcha_cache_key = result_cache.identify(model, bg_image, show=False)
+            else:
+                box, conf = model.identify(source=bg_image, show=False)
+        if ensemble is not None:
+            # 结果缓存或快速识别命中时没有经过集成识别
+            self._captcha_decision = ensemble.last_decision() or {'decision': 'bypass', 'answers': {}}
+        else:
+            self._captcha_decision = None
+        return box, conf
+
+    @staticmethod
+    def _decode_captcha_image(src_data: str):
+        """把 data URL 形式的验证码背景图解码为 BGR 图片，返回 (原始字节, 图片)"""
+        if not src_data or not src_data.startswith("data:image"):
+            raise RuntimeError("验证码图片src异常")
+
+        _, sep, bg_b64 = src_data.partition("base64,")
+        if not sep:
+            raise RuntimeError("验证码图片src异常")
+        bg_bytes = base64.b64decode(bg_b64)
+
+        # np.frombuffer 直接引用解码后的字节，只做一次图片解码
+        bg_image = cv2.imdecode(np.frombuffer(bg_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if bg_image is None:
+            raise RuntimeError("验证码图片解码失败")
+        return bg_bytes, bg_image
+
+    def _save_captcha_sample(self, bg_bytes: bytes):
+        """保存验证码样本图片到 IMG_DIR（在后台线程执行）"""
+        try:
+            IMG_DIR = self.config.img_dir
+            os.makedirs(IMG_DIR, exist_ok=True)
+            img_abs_path = os.path.join(IMG_DIR, f'{time.time()}_image.png')
+            with open(img_abs_path, "wb") as f:
+                f.write(bg_bytes)
+        except Exception as e:
+            logger.error(f"保存验证码样本失败: {e}")
+
     # 生成类人的拖动轨迹
     def _generate_human_like_track(self, distance):
         """生成类人的拖动轨迹"""
         track, current = [], 0.0  # track: 轨迹列表(一次拖动多少像素), current: 当前滑块位置
+        moved = 0  # 已经拖动的整数像素，按累计位置取整，避免逐步取整的误差累积
         mid = distance * random.uniform(0.6, 0.8)   # 中点，随机创建（并非每次中点都是二分之一而是在这附近）
         t, v = 0.2, 0.0
         while current < distance:
@@ -371,7 +585,10 @@ class CertificateAutomation:
             if current + move > distance: 
                 move = distance - current # 最后一次直接移动到终点
             current += move
-            track.append(int(round(move)))
+            step = int(round(current)) - moved
+            if step:
+                track.append(step)
+                moved += step
         return track
     
     # 文件解压函数
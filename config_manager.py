@@ -21,6 +21,18 @@ class ConfigManager:
     - PRINTER_NAME: 打印机名称
     - PDFTO_PRINTER_EXE: PDF打印工具路径
     - LOG_DIR: 日志目录
+    - 验证码模型推理配置: ort_session_options, preload_models, slider_options
+    - 验证码识别结果缓存: result_cache_enabled, result_cache_options
+    - 缺口快速识别标定文件: cascade_calibration
+    - 双模型集成识别: ensemble_enabled, ensemble_options
+    - 拖动距离标定: initial_slider_x, drag_calibration_options
+    - 滑块拖动闭环修正: drag_feedback_options
+    - 缺口边缘细化: edge_refine_options
+    - 验证码推理工作进程: captcha_workers, captcha_worker_timeout
+    - 验证码识别接口微批处理: captcha_solve_options
+    - 上传图片大小限制: captcha_upload_limits
+    - 验证码识别性能分析: captcha_profiling
+    - 验证码模型注册表与影子评估: model_registry_options
     - FLASK配置: host, port, debug
     - 证件类型映射: document_set
     - 证件URL映射: document_url
@@ -76,6 +88,10 @@ class ConfigManager:
     def max_retry(self) -> int:  # 最大重试次数
         return self.config.getint('DEFAULT', 'MAX_RETRY', fallback=5)
     
+    @property
+    def initial_slider_x(self) -> float:  # 滑块初始位置（原始图片像素），未标定时用于计算拖动距离
+        return self.config.getfloat('DEFAULT', 'INITIAL_SLIDER_X', fallback=12)
+
     @property
     def session_timeout(self) -> int:  # 会话超时时间（秒）
         return self.config.getint('DEFAULT', 'SESSION_TIMEOUT', fallback=1800)
@@ -104,6 +120,163 @@ class ConfigManager:
     def log_dir(self) -> str:  # 日志目录
         return self.get_resource_path(self.config.get('DEFAULT', 'LOG_DIR', fallback='logs'))
     
+    @property
+    def ort_session_options(self) -> Dict[str, Any]:  # ONNX Runtime 会话参数
+        """获取验证码模型的 ONNX Runtime 会话参数"""
+        return {
+            'intra_op_threads': self.config.getint('CAPTCHA', 'ORT_INTRA_OP_THREADS', fallback=0),
+            'inter_op_threads': self.config.getint('CAPTCHA', 'ORT_INTER_OP_THREADS', fallback=0),
+            'graph_optimization': self.config.get('CAPTCHA', 'ORT_GRAPH_OPTIMIZATION', fallback='all'),
+            'execution_mode': self.config.get('CAPTCHA', 'ORT_EXECUTION_MODE', fallback='sequential'),
+            'optimized_model_cache': self.config.getboolean('CAPTCHA', 'ORT_OPTIMIZED_MODEL_CACHE', fallback=True),
+            'cache_dir': self.get_resource_path(
+                self.config.get('CAPTCHA', 'ORT_CACHE_DIR', fallback=r'captcha_recognizer\models\cache')),
+        }
+
+    @property
+    def preload_models(self) -> bool:  # 启动时是否预加载验证码模型
+        return self.config.getboolean('CAPTCHA', 'PRELOAD_MODELS', fallback=True)
+
+    @property
+    def slider_options(self) -> Dict[str, Any]:  # SliderV2 构造参数
+        """获取 SliderV2 模型的构造参数"""
+        return {
+            'nms_engine': self.config.get('CAPTCHA', 'NMS_ENGINE', fallback='fast'),
+            'mask_engine': self.config.get('CAPTCHA', 'MASK_ENGINE', fallback='roi'),
+            'matcher': self.config.get('CAPTCHA', 'MATCHER', fallback='raster'),
+            'io_binding': self.config.getboolean('CAPTCHA', 'IO_BINDING', fallback=True),
+            'variant': self.config.get('CAPTCHA', 'MODEL_VARIANT', fallback='fp32'),
+            'imgsz': self.config.get('CAPTCHA', 'SLIDER_IMGSZ', fallback='640x640'),
+            'backend': self.config.get('CAPTCHA', 'INFERENCE_BACKEND', fallback='onnxruntime'),
+            'fused': self.config.getboolean('CAPTCHA', 'FUSED_PIPELINE', fallback=False),
+        }
+
+    @property
+    def result_cache_enabled(self) -> bool:  # 是否启用验证码识别结果缓存
+        return self.config.getboolean('CAPTCHA', 'RESULT_CACHE', fallback=True)
+
+    @property
+    def result_cache_options(self) -> Dict[str, Any]:  # 识别结果缓存参数
+        """获取验证码识别结果缓存的参数"""
+        cache_file = self.config.get('CAPTCHA', 'RESULT_CACHE_FILE', fallback='captcha_result_cache.json')
+        return {
+            'capacity': self.config.getint('CAPTCHA', 'RESULT_CACHE_SIZE', fallback=1024),
+            'max_distance': self.config.getint('CAPTCHA', 'RESULT_CACHE_MAX_DISTANCE', fallback=0),
+            'min_conf': self.config.getfloat('CAPTCHA', 'RESULT_CACHE_MIN_CONF', fallback=0.5),
+            'path': self.get_resource_path(cache_file) if cache_file else None,
+        }
+
+    @property
+    def cascade_calibration(self) -> str:  # 缺口快速识别标定文件，为空时只使用模型
+        path = self.config.get('CAPTCHA', 'CASCADE_CALIBRATION', fallback='')
+        return self.get_resource_path(path) if path else ''
+
+    @property
+    def edge_refine_options(self) -> Dict[str, Any]:  # 缺口左边缘亚像素细化参数
+        """获取缺口边缘细化的参数"""
+        return {
+            'enabled': self.config.getboolean('CAPTCHA', 'EDGE_REFINE', fallback=True),
+            'search': self.config.getfloat('CAPTCHA', 'EDGE_REFINE_SEARCH', fallback=6.0),
+            'min_quality': self.config.getfloat('CAPTCHA', 'EDGE_REFINE_MIN_QUALITY', fallback=0.3),
+            'control_rate': self.config.getfloat('CAPTCHA', 'EDGE_REFINE_CONTROL_RATE', fallback=0.0),
+        }
+
+    @property
+    def drag_feedback_options(self) -> Dict[str, Any]:  # 滑块拖动闭环修正参数
+        """获取松开滑块前按实际位置修正拖动距离的参数"""
+        return {
+            'enabled': self.config.getboolean('CAPTCHA', 'DRAG_FEEDBACK', fallback=True),
+            'tolerance': self.config.getfloat('CAPTCHA', 'DRAG_FEEDBACK_TOLERANCE', fallback=1.0),
+            'max_corrections': self.config.getint('CAPTCHA', 'DRAG_FEEDBACK_MAX_CORRECTIONS', fallback=4),
+            'max_step': self.config.getint('CAPTCHA', 'DRAG_FEEDBACK_MAX_STEP', fallback=6),
+        }
+
+    @property
+    def drag_calibration_options(self) -> Dict[str, Any]:  # 拖动距离标定参数
+        """获取滑动记录和拖动距离标定的参数"""
+        records_file = self.config.get('CAPTCHA', 'SLIDE_RECORD_FILE', fallback='captcha_slides.jsonl')
+        calibration_file = self.config.get('CAPTCHA', 'DRAG_CALIBRATION_FILE', fallback='captcha_drag.json')
+        return {
+            'records_path': self.get_resource_path(records_file) if records_file else None,
+            'calibration_path': self.get_resource_path(calibration_file) if calibration_file else None,
+            'default_offset': self.initial_slider_x,
+            'auto': self.config.getboolean('CAPTCHA', 'DRAG_AUTO_CALIBRATE', fallback=True),
+            'refit_every': self.config.getint('CAPTCHA', 'DRAG_REFIT_EVERY', fallback=20),
+            'min_samples': self.config.getint('CAPTCHA', 'DRAG_MIN_SAMPLES', fallback=20),
+            'tolerance': self.config.getfloat('CAPTCHA', 'DRAG_TOLERANCE', fallback=3.0),
+            'holdout_every': self.config.getint('CAPTCHA', 'DRAG_HOLDOUT_EVERY', fallback=4),
+            'explore_rate': self.config.getfloat('CAPTCHA', 'DRAG_EXPLORE_RATE', fallback=0.0),
+            'explore_offset': self.config.getfloat('CAPTCHA', 'DRAG_EXPLORE_OFFSET', fallback=2.0),
+            'explore_gain': self.config.getfloat('CAPTCHA', 'DRAG_EXPLORE_GAIN', fallback=0.02),
+        }
+
+    @property
+    def ensemble_enabled(self) -> bool:  # 是否启用 SliderV2 + slider-v1 集成识别
+        return self.config.getboolean('CAPTCHA', 'ENSEMBLE', fallback=False)
+
+    @property
+    def ensemble_options(self) -> Dict[str, Any]:  # 集成识别参数
+        """获取双模型集成识别的参数"""
+        calibration_file = self.config.get('CAPTCHA', 'ENSEMBLE_CALIBRATION_FILE', fallback='captcha_ensemble.json')
+        return {
+            'tolerance': self.config.getfloat('CAPTCHA', 'ENSEMBLE_TOLERANCE', fallback=4.0),
+            'policy': self.config.get('CAPTCHA', 'ENSEMBLE_POLICY', fallback='confidence'),
+            'min_conf': self.config.getfloat('CAPTCHA', 'ENSEMBLE_MIN_CONF', fallback=0.5),
+            'calibration_path': self.get_resource_path(calibration_file) if calibration_file else None,
+        }
+
+    @property
+    def captcha_workers(self) -> int:  # 验证码推理工作进程数，0 表示在本进程中推理
+        return self.config.getint('CAPTCHA', 'WORKER_PROCESSES', fallback=0)
+
+    @property
+    def captcha_worker_timeout(self) -> float:  # 单次识别的超时时间（秒）
+        return self.config.getfloat('CAPTCHA', 'WORKER_TIMEOUT', fallback=10.0)
+
+    @property
+    def model_registry_options(self) -> Dict[str, Any]:  # 模型注册表与影子评估参数
+        """获取验证码模型注册表的参数"""
+        registry_file = self.config.get('CAPTCHA', 'MODEL_REGISTRY_FILE', fallback='captcha_models.json')
+        return {
+            'path': self.get_resource_path(registry_file) if registry_file else None,
+            'sample_rate': self.config.getfloat('CAPTCHA', 'SHADOW_SAMPLE_RATE', fallback=0.2),
+            'tolerance': self.config.getfloat('CAPTCHA', 'SHADOW_TOLERANCE', fallback=3.0),
+        }
+
+    @property
+    def captcha_solve_options(self) -> Dict[str, Any]:  # /api/captcha/solve 微批处理参数
+        """获取验证码识别接口的微批处理参数"""
+        return {
+            'max_wait_ms': self.config.getfloat('CAPTCHA', 'SOLVE_BATCH_WINDOW_MS', fallback=5.0),
+            'max_batch': self.config.getint('CAPTCHA', 'SOLVE_MAX_BATCH', fallback=8),
+            'max_queue': self.config.getint('CAPTCHA', 'SOLVE_QUEUE_SIZE', fallback=64),
+            'timeout': self.config.getfloat('CAPTCHA', 'SOLVE_TIMEOUT', fallback=10.0),
+            'consumers': self.config.getint('CAPTCHA', 'SOLVE_CONSUMERS', fallback=4),
+        }
+
+    @property
+    def captcha_upload_limits(self) -> Dict[str, int]:  # 上传图片大小限制
+        """获取请求体最大字节数和验证码图片最大边长"""
+        return {
+            'max_bytes': self.config.getint('CAPTCHA', 'SOLVE_MAX_UPLOAD_KB', fallback=2048) * 1024,
+            'max_side': self.config.getint('CAPTCHA', 'SOLVE_MAX_IMAGE_SIDE', fallback=2048),
+        }
+
+    @property
+    def captcha_profiling(self) -> Dict[str, Any]:  # 验证码识别性能分析参数
+        """获取验证码识别性能分析的参数，trace 写到 LOG_DIR/captcha_traces"""
+        return {
+            'enabled': self.config.getboolean('CAPTCHA', 'PROFILE_CAPTCHA', fallback=False),
+            'ort': self.config.getboolean('CAPTCHA', 'PROFILE_ORT', fallback=True),
+            'trace_dir': os.path.join(self.log_dir, 'captcha_traces'),
+            'max_traces': self.config.getint('CAPTCHA', 'PROFILE_MAX_TRACES', fallback=200),
+            'solve_api': self.config.getboolean('CAPTCHA', 'PROFILE_SOLVE_API', fallback=False),
+        }
+
+    @property
+    def save_captcha_samples(self) -> bool:  # 是否保存验证码样本图片
+        return self.config.getboolean('CAPTCHA', 'SAVE_CAPTCHA_SAMPLES', fallback=True)
+
     @property
     def flask_config(self) -> Dict[str, Any]:  # Flask配置
         """获取Flask配置"""
@@ -1,6 +1,7 @@
 # decorators.py
 from functools import wraps
 from flask import jsonify
+from werkzeug.exceptions import HTTPException
 from state_manager import state_manager
 import logging
 
@@ -49,6 +50,9 @@ def handle_exceptions(f):
     def decorated_function(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except HTTPException:
+            # 请求体过大（413）等 HTTP 错误交给 Flask 的错误处理
+            raise
         except Exception as e:
             logger.error(f"{f.__name__}接口错误: {str(e)}", exc_info=True)
             return jsonify({'error': f'服务器内部错误: {str(e)}'}), 500
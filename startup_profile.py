@@ -0,0 +1,212 @@
+# startup_profile.py
+"""
+Flask 服务启动耗时分析与回归检查
+
+用法:
+    python startup_profile.py importtime --top 30
+    python startup_profile.py ttfr --repeat 5
+    python startup_profile.py check --budget 2.0 --baseline startup_baseline.json
+    python startup_profile.py check --update-baseline --baseline startup_baseline.json
+
+- importtime: 用 `python -X importtime -c "import app"` 统计导入耗时，按累计耗时和顶层包汇总
+- ttfr: 启动 Flask 服务，测量从进程启动到 /api/system_status 首次返回 200 的时间（time to first response）
+- check: 检查 import app 后没有加载重依赖，且首次响应时间不超过预算和基线的允许范围，不满足时以非零状态退出
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 这些模块只应在首次登录/识别验证码时导入，import app 时加载即视为回归
+HEAVY_MODULES = ('selenium', 'onnxruntime', 'cv2', 'shapely', 'sqlalchemy', 'pymysql', 'win32print',
+                 'PIL', 'certificate_automation', 'db_operations', 'captcha_recognizer.slider')
+
+# 启动服务并关闭重载器，端口通过命令行传入
+SERVER_SCRIPT = (
+    "import sys, app; "
+    "app.app.run(host='127.0.0.1', port=int(sys.argv[1]), debug=False, use_reloader=False)"
+)
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """解析 -X importtime 的输出，返回 [{module, self_us, cumulative_us, depth}]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # 表头
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append({'module': name.strip(), 'self_us': self_us, 'cumulative_us': cumulative_us, 'depth': depth})
+    return rows
+
+
+def importtime_report(target: str = 'app', top: int = 30) -> Dict:
+    """在子进程中导入 target，返回总耗时、累计耗时最长的模块和按顶层包汇总的自身耗时"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+                            cwd=BASE_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} 失败:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+
+    packages: Dict[str, int] = {}
+    for row in rows:
+        package = row['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + row['self_us']
+
+    return {
+        'target': target,
+        'python': sys.version.split()[0],
+        'modules': len(rows),
+        'total_ms': round(sum(row['self_us'] for row in rows) / 1000, 2),
+        'top_cumulative': [
+            {'module': row['module'], 'cumulative_ms': round(row['cumulative_us'] / 1000, 2),
+             'self_ms': round(row['self_us'] / 1000, 2)}
+            for row in sorted(rows, key=lambda row: row['cumulative_us'], reverse=True)[:top]
+        ],
+        'top_packages': [
+            {'package': package, 'self_ms': round(us / 1000, 2)}
+            for package, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        'heavy_modules': loaded_heavy_modules(rows),
+    }
+
+
+def loaded_heavy_modules(rows: List[Dict]) -> List[str]:
+    modules = {row['module'] for row in rows}
+    return sorted(heavy for heavy in HEAVY_MODULES
+                  if any(module == heavy or module.startswith(heavy + '.') for module in modules))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(timeout: float = 60.0, path: str = '/api/system_status') -> float:
+    """启动一次 Flask 服务，返回从启动进程到接口首次返回 200 的秒数"""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}{path}'
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT, str(port)], cwd=BASE_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务进程提前退出，返回码 {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+        raise TimeoutError(f"服务在 {timeout} 秒内没有响应: {url}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def ttfr_report(repeat: int = 5, timeout: float = 60.0) -> Dict:
+    samples = [time_to_first_response(timeout) for _ in range(repeat)]
+    return {
+        'repeat': repeat,
+        'median_s': round(statistics.median(samples), 3),
+        'min_s': round(min(samples), 3),
+        'max_s': round(max(samples), 3),
+        'samples_s': [round(sample, 3) for sample in samples],
+    }
+
+
+def check(budget: float, baseline_path: Optional[str], tolerance: float, repeat: int,
+          update_baseline: bool = False) -> Dict:
+    """启动回归检查，返回报告，report['passed'] 为 False 时表示回归"""
+    imports = importtime_report(top=10)
+    ttfr = ttfr_report(repeat)
+    failures = []
+
+    if imports['heavy_modules']:
+        failures.append(f"import app 加载了重依赖: {', '.join(imports['heavy_modules'])}")
+    if ttfr['median_s'] > budget:
+        failures.append(f"首次响应时间 {ttfr['median_s']}s 超过预算 {budget}s")
+
+    baseline = None
+    if baseline_path and os.path.exists(baseline_path) and not update_baseline:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        limit = baseline['median_s'] * (1 + tolerance)
+        if ttfr['median_s'] > limit:
+            failures.append(f"首次响应时间 {ttfr['median_s']}s 比基线 {baseline['median_s']}s "
+                            f"慢 {tolerance:.0%} 以上")
+    if baseline_path and update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({'median_s': ttfr['median_s'], 'import_total_ms': imports['total_ms'],
+                       'python': imports['python']}, f, ensure_ascii=False, indent=2)
+
+    return {
+        'passed': not failures,
+        'failures': failures,
+        'budget_s': budget,
+        'baseline': baseline,
+        'ttfr': ttfr,
+        'import_total_ms': imports['total_ms'],
+        'top_cumulative': imports['top_cumulative'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Flask 服务启动耗时分析与回归检查')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    importtime_parser = subparsers.add_parser('importtime', help='import app 的导入耗时明细')
+    importtime_parser.add_argument('--target', default='app', help='要导入的模块')
+    importtime_parser.add_argument('--top', type=int, default=30)
+
+    ttfr_parser = subparsers.add_parser('ttfr', help='从启动到 /api/system_status 首次响应的时间')
+    ttfr_parser.add_argument('--repeat', type=int, default=5)
+    ttfr_parser.add_argument('--timeout', type=float, default=60.0)
+
+    check_parser = subparsers.add_parser('check', help='启动耗时回归检查，失败时返回非零状态')
+    check_parser.add_argument('--budget', type=float, default=3.0, help='首次响应时间上限（秒）')
+    check_parser.add_argument('--baseline', help='基线 JSON 文件')
+    check_parser.add_argument('--tolerance', type=float, default=0.5, help='允许比基线慢的比例')
+    check_parser.add_argument('--repeat', type=int, default=5)
+    check_parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线文件')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'importtime':
+        report = importtime_report(args.target, args.top)
+    elif args.command == 'ttfr':
+        report = ttfr_report(args.repeat, args.timeout)
+    else:
+        if args.update_baseline and not args.baseline:
+            parser.error('--update-baseline 需要指定 --baseline')
+        report = check(args.budget, args.baseline, args.tolerance, args.repeat, args.update_baseline)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.command == 'check' and not report['passed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,7 @@ class CertificationState:
         self.cert_name: str = ''
         self.username: str = ''
         self.trace_id: str = ''
+        self.profile_captcha: bool = False  # 本次任务是否记录验证码识别性能分析 trace
         
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -55,7 +56,8 @@ class CertificationState:
             'system_num': self.system_num,
             'cert_name': self.cert_name,
             'username': self.username,
-            'trace_id': self.trace_id
+            'trace_id': self.trace_id,
+            'profile_captcha': self.profile_captcha
         }
 
 class StateManager:
@@ -86,7 +88,8 @@ class StateManager:
                 return True
             return time.time() - self._state.last_login_time > self.session_timeout
     
-    def start_processing(self, username: str, user_type: str, document_type: str) -> bool:
+    def start_processing(self, username: str, user_type: str, document_type: str,
+                         profile_captcha: bool = False) -> bool:
         """开始处理任务"""
         with self._lock:
             if self._state.status == TaskStatus.PROCESSING:
@@ -102,6 +105,7 @@ class StateManager:
             self._state.user_type = user_type
             self._state.document_type = document_type
             self._state.trace_id = f"{int(time.time())}_{username}"
+            self._state.profile_captcha = profile_captcha
             
             # 设置系统编号
             if document_type in ["1", "2", "3", "4"]:
@@ -0,0 +1,116 @@
+"""
+动态微批处理：合批、队列满时拒绝、submit_call 与识别请求共用队列、模型异常传给每个请求
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from captcha_recognizer.batcher import LatencyHistogram, MicroBatcher, QueueFullError
+
+
+class BatchModel:
+    def __init__(self, batch_limit=None, gate=None):
+        self.batch_limit = batch_limit
+        self.gate = gate
+        self.batches = []
+
+    def identify_batch(self, images):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(len(images))
+        return [([float(image[0, 0, 0]), 0.0, 10.0, 10.0], 0.9) for image in images]
+
+
+def _image(value: int) -> np.ndarray:
+    return np.full((4, 4, 3), value, np.uint8)
+
+
+@pytest.fixture
+def batcher_factory():
+    created = []
+
+    def create(model, **options):
+        batcher = MicroBatcher(model, **options)
+        created.append(batcher)
+        return batcher
+
+    yield create
+    for batcher in created:
+        batcher.shutdown()
+
+
+def test_requests_are_batched_and_results_routed(batcher_factory):
+    gate = threading.Event()
+    model = BatchModel(gate=gate)
+    batcher = batcher_factory(model, max_batch=4, max_wait_ms=200, consumers=1)
+    futures = [batcher.submit(_image(value)) for value in range(4)]
+    gate.set()
+    results = [future.result(timeout=5) for future in futures]
+    assert [result['box'][0] for result in results] == [0.0, 1.0, 2.0, 3.0]
+    assert model.batches == [4]
+    assert all(result['timing']['batch_size'] == 4 for result in results)
+    assert batcher.stats()['batch_sizes'] == {4: 1}
+
+
+def test_batch_limit_of_model_is_respected(batcher_factory):
+    model = BatchModel(batch_limit=1)
+    batcher = batcher_factory(model, max_batch=8, max_wait_ms=50, consumers=1)
+    assert batcher.batch_limit() == 1
+    futures = [batcher.submit(_image(value)) for value in range(3)]
+    assert [future.result(timeout=5)['box'][0] for future in futures] == [0.0, 1.0, 2.0]
+    assert model.batches == [1, 1, 1]
+
+
+def test_full_queue_rejects(batcher_factory):
+    gate = threading.Event()
+    batcher = batcher_factory(BatchModel(gate=gate), max_batch=1, max_wait_ms=0, max_queue=2, consumers=1)
+    running = batcher.submit(_image(0))
+    # 等批处理线程取走第一个请求并阻塞在模型中
+    deadline = time.time() + 5
+    while batcher.stats()['queue_size'] and time.time() < deadline:
+        time.sleep(0.01)
+    queued = [batcher.submit(_image(1)), batcher.submit_call(lambda: 'call')]
+    with pytest.raises(QueueFullError):
+        batcher.submit(_image(2))
+    assert batcher.stats()['rejected'] == 1
+    gate.set()
+    assert running.result(timeout=5)['box'][0] == 0.0
+    assert queued[0].result(timeout=5)['box'][0] == 1.0
+    assert queued[1].result(timeout=5) == 'call'
+
+
+def test_model_and_call_errors_reach_futures(batcher_factory):
+    class FailingModel:
+        def identify_batch(self, images):
+            raise ValueError('boom')
+
+    batcher = batcher_factory(FailingModel(), max_batch=2, max_wait_ms=0, consumers=1)
+    with pytest.raises(ValueError):
+        batcher.submit(_image(0)).result(timeout=5)
+
+    def fail():
+        raise KeyError('call')
+
+    with pytest.raises(KeyError):
+        batcher.submit_call(fail).result(timeout=5)
+    assert batcher.stats()['failed_batches'] == 1
+
+
+def test_shutdown_rejects_new_requests():
+    batcher = MicroBatcher(BatchModel(), consumers=1)
+    batcher.shutdown()
+    with pytest.raises(RuntimeError):
+        batcher.submit(_image(0))
+
+
+def test_latency_histogram_quantiles():
+    histogram = LatencyHistogram(buckets=(1, 10, 100))
+    for value in [0.5] * 50 + [5] * 45 + [50] * 4 + [500]:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(0.95) == 10
+    assert histogram.quantile(0.99) == 100
+    assert histogram.quantile(1.0) == 500
+    assert histogram.stats()['buckets'] == {'le_1': 50, 'le_10': 45, 'le_100': 4, 'inf': 1}
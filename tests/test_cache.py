@@ -0,0 +1,92 @@
+"""
+验证码结果缓存：命中/未命中、LRU 淘汰、失效和持久化
+"""
+import numpy as np
+
+from captcha_recognizer.cache import ResultCache
+
+
+def _image(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (160, 320, 3), dtype=np.uint8)
+
+
+class CountingModel:
+    def __init__(self, box=(10.0, 20.0, 60.0, 70.0), conf=0.9):
+        self.box, self.conf = list(box), conf
+        self.calls = 0
+
+    def identify(self, image, **kwargs):
+        self.calls += 1
+        return list(self.box), self.conf
+
+
+def test_hit_and_miss():
+    cache = ResultCache(save_delay=0)
+    model = CountingModel()
+    image = _image(0)
+
+    box, conf, key = cache.identify(model, image)
+    assert (box, conf) == (model.box, model.conf)
+    # 同一张图再次出现时命中缓存，不再推理
+    assert cache.identify(model, image.copy())[:2] == (model.box, model.conf)
+    assert model.calls == 1
+    cache.identify(model, _image(1))
+    assert model.calls == 2
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+
+
+def test_lru_eviction():
+    cache = ResultCache(capacity=2, save_delay=0)
+    a, b, c = (160, 320, 1), (160, 320, 2), (160, 320, 3)
+    cache.put(a, [1, 1, 2, 2], 0.9)
+    cache.put(b, [2, 2, 3, 3], 0.9)
+    # 访问 a 后 b 成为最久未使用的条目
+    assert cache.get(a) is not None
+    cache.put(c, [3, 3, 4, 4], 0.9)
+    assert cache.get(b) is None
+    assert cache.get(a) == ([1.0, 1.0, 2.0, 2.0], 0.9)
+    assert cache.get(c) is not None
+    assert cache.stats()['evictions'] == 1
+
+    cache.configure(capacity=1)
+    assert cache.stats()['size'] == 1
+    assert cache.get(c) is not None
+
+
+def test_rejects_low_confidence_and_empty_box():
+    cache = ResultCache(min_conf=0.5, save_delay=0)
+    assert not cache.put((1, 1, 1), [1, 1, 2, 2], 0.4)
+    assert not cache.put((1, 1, 2), [], 0.9)
+    assert cache.get((1, 1, 1)) is None
+    assert cache.stats()['rejected'] == 2
+
+
+def test_near_duplicate_and_report_failure():
+    cache = ResultCache(max_distance=2, save_delay=0)
+    cache.put((160, 320, 0b1111), [1, 1, 2, 2], 0.9)
+    assert cache.get((160, 320, 0b1100)) is not None
+    assert cache.get((160, 320, 0b0000)) is None
+    # 尺寸不同的图片不会互相命中
+    assert cache.get((160, 321, 0b1111)) is None
+
+    assert cache.report_failure((160, 320, 0b1110))
+    assert cache.get((160, 320, 0b1111)) is None
+    assert not cache.report_failure((160, 320, 0b1111))
+
+
+def test_persisted_entries_are_reloaded(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResultCache(path=path, save_delay=60)
+    key = cache.key(_image(0))
+    cache.put(key, [1, 1, 2, 2], 0.9)
+    cache.save()
+
+    restored = ResultCache(save_delay=0)
+    restored.configure(path=path)
+    assert restored.get(key) == ([1.0, 1.0, 2.0, 2.0], 0.9)
+
+    # 哈希位数不同的文件不加载
+    other = ResultCache(hash_size=8, save_delay=0)
+    other.configure(path=path)
+    assert other.stats()['size'] == 0
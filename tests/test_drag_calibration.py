@@ -0,0 +1,108 @@
+"""
+拖动距离标定：从模拟的滑动记录恢复滑块初始位置、留出记录决定是否替换、探索扰动不超过容差
+"""
+import random
+
+import numpy as np
+import pytest
+
+from captcha_recognizer.drag_calibration import (DragCalibrator, DragModel, consistency, fit, split_holdout)
+
+TRUE_OFFSET = 14.0
+DEFAULT_OFFSET = 12.0
+TOLERANCE = 3.0
+
+
+def _simulate(count: int, seed: int = 0, explore: float = 2.0):
+    """按默认公式（加探索扰动）拖动，真实距离按 TRUE_OFFSET 计算，误差不超过容差即通过"""
+    rng = np.random.default_rng(seed)
+    records = []
+    for _ in range(count):
+        raw_x = float(rng.uniform(80, 280))
+        image_width, web_width = 320.0, float(rng.choice([256.0, 320.0, 400.0]))
+        scale = web_width / image_width
+        offset = DEFAULT_OFFSET + float(rng.uniform(-explore, explore))
+        dragged = scale * (raw_x - offset) + float(rng.normal(0, 0.8))
+        truth = scale * (raw_x - TRUE_OFFSET)
+        records.append({'raw_x': raw_x, 'image_width': image_width, 'web_width': web_width,
+                        'dragged': dragged, 'passed': abs(dragged - truth) <= TOLERANCE})
+    return records
+
+
+def test_fit_recovers_offset_and_beats_default():
+    records = _simulate(800)
+    model, report = fit(records, DEFAULT_OFFSET, TOLERANCE)
+    assert model is not None
+    assert abs(model.offset - TRUE_OFFSET) <= 1.0
+    assert abs(model.gain - 1.0) <= 0.02
+    assert report['consistency'] > report['default_consistency']
+
+    # 新参数在未参与拟合的记录上也更好
+    fresh = _simulate(400, seed=1)
+    assert consistency(model, fresh, TOLERANCE) > consistency(DragModel(DEFAULT_OFFSET), fresh, TOLERANCE)
+
+
+def test_fit_needs_enough_passed_slides():
+    records = _simulate(30)
+    for record in records[5:]:
+        record['passed'] = False
+    model, report = fit(records, DEFAULT_OFFSET, TOLERANCE, min_samples=20)
+    assert model is None and 'reason' in report
+
+
+def test_split_holdout_interleaves():
+    records = [{'i': i} for i in range(10)]
+    train, holdout = split_holdout(records, 4)
+    assert [r['i'] for r in holdout] == [3, 7]
+    assert len(train) + len(holdout) == len(records)
+    assert split_holdout(records, 1) == (records, [])
+
+
+def test_model_round_trip():
+    model = DragModel(13.5, 1.01, [(50.0, 0.5), (150.0, -0.5)], {'samples': 10})
+    restored = DragModel.from_dict(model.to_dict())
+    assert restored.meta == {'samples': 10}
+    assert restored.distance(200, 320, 256) == pytest.approx(model.distance(200, 320, 256), abs=1e-3)
+    assert DragModel.from_dict({**model.to_dict(), 'version': 0}) is None
+
+
+@pytest.fixture
+def calibrator(tmp_path):
+    calibrator = DragCalibrator()
+    calibrator.configure(records_path=str(tmp_path / 'slides.jsonl'),
+                         calibration_path=str(tmp_path / 'drag.json'),
+                         default_offset=DEFAULT_OFFSET, auto=False, tolerance=TOLERANCE)
+    return calibrator
+
+
+def test_refit_applies_only_when_holdout_improves(calibrator, tmp_path):
+    for record in _simulate(800):
+        calibrator.record(record)
+    report = calibrator.refit()
+    assert report['applied']
+    assert report['holdout_consistency'] > report['current_consistency']
+    assert abs(calibrator.model.offset - TRUE_OFFSET) <= 1.0
+
+    # 重新加载保存的标定文件
+    reloaded = DragCalibrator()
+    reloaded.configure(calibration_path=str(tmp_path / 'drag.json'), default_offset=DEFAULT_OFFSET)
+    assert reloaded.model.offset == pytest.approx(calibrator.model.offset, abs=1e-3)
+
+    # 同样的记录再拟合一次不会严格更好，保留当前参数
+    model = calibrator.model
+    assert not calibrator.refit()['applied']
+    assert calibrator.model is model
+
+
+def test_plan_dither_is_bounded(calibrator):
+    distance, info = calibrator.plan(200, 320, 256)
+    assert info['dither'] is None and distance == pytest.approx(info['nominal_distance'], abs=1e-3)
+
+    random.seed(0)
+    calibrator.configure(records_path=calibrator.records_path, calibration_path=calibrator.calibration_path,
+                         default_offset=DEFAULT_OFFSET, auto=False, tolerance=TOLERANCE, explore_rate=1.0,
+                         explore_offset=20.0, explore_gain=0.2)
+    for _ in range(50):
+        distance, info = calibrator.plan(200, 320, 256)
+        assert info['dither'] is not None
+        assert abs(distance - info['nominal_distance']) <= TOLERANCE + 1e-3
@@ -0,0 +1,67 @@
+"""
+集成识别的置信度校准：未校准时返回原始置信度、样本增多后趋近实测正确率、滑动结果按模型更新、持久化
+"""
+import pytest
+
+from captcha_recognizer.ensemble import ConfidenceCalibration, EnsembleStats
+
+
+def test_uncalibrated_model_keeps_raw_confidence():
+    calibration = ConfidenceCalibration()
+    assert calibration.calibrated('slider-v2', 0.73) == 0.73
+
+
+def test_calibration_converges_to_observed_rate():
+    calibration = ConfidenceCalibration(bins=10, prior=5.0)
+    # 0.9 桶实测只有 60% 正确，0.3 桶全部正确
+    for i in range(200):
+        calibration.update('slider-v2', 0.92, i % 5 < 3)
+        calibration.update('slider-v2', 0.35, True)
+    assert calibration.calibrated('slider-v2', 0.95) == pytest.approx(0.6, abs=0.02)
+    assert calibration.calibrated('slider-v2', 0.31) == pytest.approx(1.0, abs=0.02)
+    # 没有样本的桶仍为原始置信度，其他模型不受影响
+    assert calibration.calibrated('slider-v2', 0.55) == pytest.approx(0.55)
+    assert calibration.calibrated('slider-v1', 0.95) == 0.95
+
+
+def test_few_samples_stay_near_prior():
+    calibration = ConfidenceCalibration(bins=10, prior=5.0)
+    calibration.update('slider-v2', 0.9, False)
+    assert calibration.calibrated('slider-v2', 0.9) == pytest.approx(4.5 / 6)
+
+
+def test_calibration_round_trip():
+    calibration = ConfidenceCalibration()
+    calibration.update('slider-v1', 0.8, True)
+    calibration.update('slider-v1', 0.8, False)
+    restored = ConfidenceCalibration()
+    assert restored.load_dict(calibration.to_dict())
+    assert restored.calibrated('slider-v1', 0.8) == calibration.calibrated('slider-v1', 0.8)
+    assert not ConfidenceCalibration(bins=5).load_dict(calibration.to_dict())
+
+
+def _decision(chosen, answers):
+    return {'decision': 'primary', 'box': chosen, 'tolerance': 4.0, 'answers': answers}
+
+
+def test_report_outcome_updates_each_model(tmp_path):
+    stats = EnsembleStats(str(tmp_path / 'ensemble.json'))
+    chosen = [100.0, 10.0, 150.0, 60.0]
+    answers = {'slider-v2': (chosen, 0.95), 'slider-v1': ([120.0, 10.0, 170.0, 60.0], 0.85)}
+
+    # 通过：与采用的框一致的模型记为正确，不一致的记为错误
+    stats.report_outcome(_decision(chosen, answers), passed=True)
+    table = stats.calibration.to_dict()['models']
+    assert table['slider-v2']['hits'][9] == 1 and table['slider-v1']['hits'][8] == 0
+    assert table['slider-v1']['counts'][8] == 1
+
+    # 失败：只有与采用的框一致的模型记为错误
+    stats.report_outcome(_decision(chosen, answers), passed=False)
+    table = stats.calibration.to_dict()['models']
+    assert table['slider-v2']['counts'][9] == 2 and table['slider-v2']['hits'][9] == 1
+    assert table['slider-v1']['counts'][8] == 1
+    assert stats.stats()['outcomes']['primary'] == {'passed': 1, 'failed': 1}
+
+    stats.save()
+    reloaded = EnsembleStats(str(tmp_path / 'ensemble.json'))
+    assert reloaded.calibration.to_dict() == stats.calibration.to_dict()
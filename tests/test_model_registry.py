@@ -0,0 +1,91 @@
+"""
+模型注册表：配置之前创建的 slot 在配置持久化文件后使用文件中的生效模型；候选模型路径限制在 models 目录内
+"""
+import json
+import os
+import uuid
+
+import pytest
+
+from captcha_recognizer.model_registry import ModelRegistry, ModelSlot, _inside_models_dir, resolve_model_path
+from captcha_recognizer.session import MODELS_DIR
+
+
+def _registry_file(tmp_path, name: str, model_path: str) -> str:
+    path = str(tmp_path / 'model_registry.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({name: model_path}, f)
+    return path
+
+
+def test_configure_after_get_restores_saved_model(tmp_path):
+    saved = os.path.join(MODELS_DIR, 'slider-v2.saved.onnx')
+    registry = ModelRegistry()
+    slot = registry.get('slider-v2')
+    assert slot.active_path is None
+
+    registry.configure(path=_registry_file(tmp_path, 'slider-v2', saved))
+    assert slot.active_path == saved
+    assert registry.get('slider-v2') is slot
+
+
+def test_configure_keeps_swapped_slot(tmp_path):
+    registry = ModelRegistry()
+    slot = registry.get('slider-v2')
+    slot.swaps = 1
+
+    registry.configure(path=_registry_file(tmp_path, 'slider-v2', os.path.join(MODELS_DIR, 'other.onnx')))
+    assert slot.active_path is None
+
+
+@pytest.fixture
+def models_file():
+    """models 目录下的临时模型文件（相对路径）"""
+    name = f'test-{uuid.uuid4().hex}.onnx'
+    path = os.path.join(MODELS_DIR, name)
+    with open(path, 'wb') as f:
+        f.write(b'onnx')
+    yield name
+    os.remove(path)
+
+
+def test_resolve_accepts_file_inside_models_dir(models_file):
+    assert resolve_model_path(models_file) == os.path.realpath(os.path.join(MODELS_DIR, models_file))
+    assert resolve_model_path(os.path.join('.', models_file)) == resolve_model_path(models_file)
+
+
+@pytest.mark.parametrize('path', ['', 'missing.onnx', '../config.ini', '../../etc/passwd', 'sub/../../app.py'])
+def test_resolve_rejects_relative_escape_and_missing(path):
+    with pytest.raises(ValueError):
+        resolve_model_path(path)
+
+
+def test_resolve_rejects_absolute_path(models_file):
+    with pytest.raises(ValueError):
+        resolve_model_path(os.path.join(MODELS_DIR, models_file))
+    with pytest.raises(ValueError):
+        resolve_model_path(os.path.abspath(__file__))
+
+
+def test_resolve_rejects_symlink_out_of_models_dir(tmp_path):
+    target = tmp_path / 'outside.onnx'
+    target.write_bytes(b'onnx')
+    name = f'test-{uuid.uuid4().hex}.onnx'
+    link = os.path.join(MODELS_DIR, name)
+    try:
+        os.symlink(target, link)
+    except (OSError, NotImplementedError):
+        pytest.skip('当前系统不能创建符号链接')
+    try:
+        assert not _inside_models_dir(link)
+        with pytest.raises(ValueError):
+            resolve_model_path(name)
+    finally:
+        os.remove(link)
+
+
+def test_load_candidate_rejects_escape_before_loading():
+    slot = ModelSlot('slider-v2')
+    with pytest.raises(ValueError):
+        slot.load_candidate('../app.py')
+    assert slot.status()['candidate'] is None
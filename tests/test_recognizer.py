@@ -0,0 +1,69 @@
+"""
+Recognizer 的预处理画布和解码
+"""
+import cv2
+import numpy as np
+import pytest
+
+from captcha_recognizer.recognizer import Recognizer
+
+# 旧实现 ceil(416 * (L / 416)) 会得到 L + 1 的边长
+WIDTHS = [27, 54, 108, 254, 255, 417, 430, 1229, 2560]
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+def test_canvas_fits_image_exactly(width):
+    height = width // 2 + 1
+    image = np.full((height, width, 3), 200, np.uint8)
+    blob, scale = Recognizer.preprocess(image, (416, 416))
+    assert Recognizer.canvas_shape(height, width, (416, 416)) == (width, width, width / 416)
+    assert scale == width / 416
+
+    # 与按 max(h, w) 正方形画布生成的输入完全一致
+    canvas = np.zeros((width, width, 3), np.uint8)
+    canvas[:height, :width] = image
+    expected = cv2.dnn.blobFromImage(canvas, scalefactor=1 / 255, size=(416, 416), swapRB=True)
+    np.testing.assert_array_equal(blob, expected)
+
+
+def test_canvas_shape_all_sizes():
+    for side in range(1, 3000):
+        assert Recognizer.canvas_shape(side, side, (416, 416))[:2] == (side, side)
+        # 矩形推理尺寸 (224, 416)：画布宽高比与推理尺寸一致，且能放下原图
+        canvas_h, canvas_w, scale = Recognizer.canvas_shape(side, side, (224, 416))
+        assert canvas_h >= side and canvas_w >= side
+        assert abs(canvas_h / 224 - scale) * 224 < 1 and abs(canvas_w / 416 - scale) * 416 < 1
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+def test_decoded_boxes_map_back_to_image(width):
+    scale = Recognizer.canvas_shape(width // 2 + 1, width, (416, 416))[2]
+    # 原图坐标中的缺口框 [x1, y1, x2, y2]，换算成模型输出的 (cx, cy, w, h)
+    box = np.array([0.6 * width, 0.1 * width, 0.7 * width, 0.2 * width])
+    outputs = np.zeros((1, 4 + 3, 2), dtype=np.float32)
+    outputs[0, :4, 0] = [(box[0] + box[2]) / 2 / scale, (box[1] + box[3]) / 2 / scale,
+                         (box[2] - box[0]) / scale, (box[3] - box[1]) / scale]
+    outputs[0, 4, 0] = 0.9
+    boxes, scores, class_ids = Recognizer.decode(outputs, scale)
+    assert len(boxes) == 1 and class_ids == [0]
+    np.testing.assert_allclose(boxes[0], box, atol=1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('conf', [0.0, 0.25, 0.6])
+def test_decode_matches_loop(seed, conf):
+    rng = np.random.default_rng(seed)
+    outputs = np.empty((1, 4 + 3, 3549), dtype=np.float32)
+    outputs[0, :2] = rng.uniform(0, 416, (2, outputs.shape[2]))
+    outputs[0, 2:4] = rng.uniform(1, 200, (2, outputs.shape[2]))
+    outputs[0, 4:] = rng.uniform(0, 1, (3, outputs.shape[2]))
+    # 类别分数相同时两种实现都取第一个最大值
+    outputs[0, 5, :100] = outputs[0, 4, :100]
+    scale = Recognizer.canvas_shape(160, 417 + seed, (416, 416))[2]
+
+    boxes, scores, class_ids = Recognizer.decode(outputs, scale, conf)
+    loop_boxes, loop_scores, loop_class_ids = Recognizer.decode_loop(outputs, scale, conf)
+    assert len(boxes) == len(loop_boxes) > 0
+    assert boxes == loop_boxes
+    assert class_ids == loop_class_ids
+    np.testing.assert_allclose(scores, loop_scores, rtol=1e-6)
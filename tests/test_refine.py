@@ -0,0 +1,57 @@
+"""
+缺口左边缘细化：合成阶跃边缘上的亚像素定位，没有边缘时保留模型的 x
+"""
+import numpy as np
+import pytest
+
+from captcha_recognizer.refine import refine_gap_edge
+
+
+def _step_image(edge: float, noise: float = 0.0, seed: int = 0) -> np.ndarray:
+    """edge（边界坐标）左侧亮度 60、右侧 180 的灰度图，跨越边缘的像素按覆盖比例混合"""
+    coverage = np.clip(np.arange(320) + 1 - edge, 0, 1)
+    row = 60 + 120 * coverage
+    image = np.tile(row, (160, 1))
+    if noise:
+        image = image + np.random.default_rng(seed).normal(0, noise, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('edge', [100.0, 100.25, 100.5, 100.75])
+@pytest.mark.parametrize('offset', [-3.0, 0.0, 2.5])
+def test_step_edge_is_refined(edge, offset):
+    image = _step_image(edge, noise=4.0)
+    box = [edge + offset, 40.0, edge + offset + 50, 90.0]
+    x, quality = refine_gap_edge(image, box)
+    assert quality >= 0.3
+    assert abs(x - edge) <= 0.5
+
+
+def test_bgr_input_matches_gray():
+    gray = _step_image(120.3)
+    bgr = np.repeat(gray[:, :, None], 3, axis=2)
+    box = [121.5, 40.0, 171.5, 90.0]
+    assert refine_gap_edge(bgr, box) == refine_gap_edge(gray, box)
+
+
+def test_flat_or_noisy_band_keeps_model_x():
+    box = [100.0, 40.0, 150.0, 90.0]
+    flat = np.full((160, 320), 128, np.uint8)
+    assert refine_gap_edge(flat, box) == (100.0, 0.0)
+
+    # 纯纹理上偶尔会有恰好对齐的列，但绝大多数情况保留模型的 x
+    accepted = 0
+    for seed in range(100):
+        noise = np.random.default_rng(seed).integers(0, 256, (160, 320), dtype=np.uint8)
+        x, quality = refine_gap_edge(noise, box)
+        if quality < 0.3:
+            assert x == 100.0
+        else:
+            accepted += 1
+    assert accepted <= 20
+
+
+def test_degenerate_box_keeps_model_x():
+    image = _step_image(100.0)
+    assert refine_gap_edge(image, [100.0, 40.0, 150.0, 41.0]) == (100.0, 0.0)
+    assert refine_gap_edge(image, [319.0, 40.0, 330.0, 90.0])[0] == 319.0
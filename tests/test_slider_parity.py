@@ -0,0 +1,167 @@
+"""
+SliderV2 快速实现与原始实现的一致性测试
+
+- nms_fast 与 nms_greedy 在随机检测框上保留完全相同的框
+- process_mask_roi 与 process_mask_dense 逐像素一致
+- 位图匹配 raster_iou 与多边形匹配 polygon_iou 挑出相同的缺口
+
+依赖模型的用例在模型文件不存在时跳过。
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from captcha_recognizer.session import variant_path
+from captcha_recognizer.slider import LazyMasks, RoiMasks, SliderV2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_IMAGES = ['image.png', 'image-1.png', 'image-2.png']
+
+# polygon_iou 按轮廓顶点的均值对齐（顶点在斜边上密、直边上疏，不是面积质心），raster_iou 按像素质心对齐，
+# 两者的 IoU 数值不可直接比较，一致性只要求挑出的缺口相同；多边形匹配前两名相差不超过该值时不比较
+PICK_MARGIN = 0.1
+
+
+@pytest.fixture(scope='module')
+def model():
+    if not os.path.exists(variant_path('slider-v2', 'fp32')):
+        pytest.skip('slider-v2 模型文件不存在')
+    return SliderV2(mask_engine='roi')
+
+
+def random_boxes(rng: np.random.Generator, n: int) -> np.ndarray:
+    """成簇的随机框，保证有足够多的重叠"""
+    centers = rng.uniform(0, 640, (max(1, n // 8), 2))[rng.integers(0, max(1, n // 8), n)]
+    xy = centers + rng.normal(0, 15, (n, 2))
+    wh = rng.uniform(10, 120, (n, 2))
+    return np.concatenate([xy - wh / 2, xy + wh / 2], axis=1).astype(np.float32)
+
+
+def test_nms_fast_matches_greedy():
+    rng = np.random.default_rng(0)
+    slider = SliderV2.__new__(SliderV2)
+    for _ in range(300):
+        n = int(rng.integers(1, 200))
+        boxes = random_boxes(rng, n)
+        # 分数量化后会出现并列，两种实现的排序规则也必须一致
+        scores = np.round(rng.uniform(0.25, 1.0, n), 2).astype(np.float32)
+        threshold = float(rng.choice([0.3, 0.45, 0.7]))
+        np.testing.assert_array_equal(slider.nms_fast(boxes, scores, threshold),
+                                      SliderV2.nms_greedy(boxes, scores, threshold))
+
+
+@pytest.mark.parametrize('shape', [(344, 344), (883, 1229), (949, 813), (1432, 2560)])
+def test_roi_masks_match_dense(shape):
+    rng = np.random.default_rng(shape[0])
+    slider = SliderV2.__new__(SliderV2)
+    ih, iw = shape
+    protos = rng.normal(size=(32, 160, 160)).astype(np.float32)
+    coefficients = rng.normal(size=(20, 32)).astype(np.float32)
+    # 包括超出图片、跨越边缘和宽高为 0 的框
+    xy = rng.uniform(-40, [iw, ih], (20, 2))
+    boxes = np.concatenate([xy, xy + rng.uniform(0, 300, (20, 2))], axis=1).astype(np.float32)
+    boxes[0, 2] = boxes[0, 0]
+
+    roi = slider.process_mask_roi(protos, coefficients, boxes, shape)
+    dense = slider.process_mask_dense(protos, coefficients, boxes, shape)
+    assert isinstance(roi, RoiMasks)
+    np.testing.assert_array_equal(roi.to_dense(), dense)
+
+
+@pytest.mark.parametrize('name', SAMPLE_IMAGES)
+def test_roi_masks_match_dense_on_samples(model, name):
+    image = cv2.imread(os.path.join(ROOT, name))
+    boxes, masks = model.predict(image, imgsz=640, lazy_masks=True)[0]
+    assert isinstance(masks, LazyMasks)
+    # 大图上全图掩膜很占内存，只比较前 20 个检测框
+    args = (masks.protos, masks.coefficients[:20], masks.boxes[:20], masks.shape)
+    np.testing.assert_array_equal(model.process_mask_roi(*args).to_dense(), model.process_mask_dense(*args))
+
+
+def puzzle_mask(size: int, tabs: tuple, angle: float = 0.0, canvas: int = 160) -> np.ndarray:
+    """画一个带凸起的拼图块掩膜，tabs 为上右下左四边是否有凸起"""
+    mask = np.zeros((canvas, canvas), dtype=np.uint8)
+    c, half, r = canvas // 2, size // 2, size // 5
+    cv2.rectangle(mask, (c - half, c - half), (c + half, c + half), 1, -1)
+    for tab, (dx, dy) in zip(tabs, [(0, -1), (1, 0), (0, 1), (-1, 0)]):
+        if tab:
+            cv2.circle(mask, (c + dx * half, c + dy * half), r, 1, -1)
+    rotation = cv2.getRotationMatrix2D((c, c), angle, 1.0)
+    mask = cv2.warpAffine(mask, rotation, (canvas, canvas), flags=cv2.INTER_NEAREST)
+    x, y, w, h = cv2.boundingRect(mask)
+    return mask[y:y + h, x:x + w].astype(bool)
+
+
+def single_region(bitmap: np.ndarray) -> bool:
+    """位图是否为单个无孔的连通区域（此时最大轮廓围成的多边形与位图表示同一形状）"""
+    if not bitmap.any():
+        return False
+    count, _ = cv2.connectedComponents(bitmap.astype(np.uint8))
+    background, _ = cv2.connectedComponents((~np.pad(bitmap, 1)).astype(np.uint8))
+    return count == 2 and background == 2
+
+
+def compare_matchers(slider: SliderV2, template: np.ndarray, candidates: list):
+    masks = RoiMasks([template] + candidates, [(0, 0)] * (len(candidates) + 1), (160, 160))
+    segments = slider.masks_to_segments(masks)
+    polygon = np.array([slider.polygon_iou(segments[0], segment) for segment in segments[1:]])
+    raster = slider.raster_iou(template, candidates)
+    return polygon, raster
+
+
+def assert_same_pick(polygon: np.ndarray, raster: np.ndarray) -> bool:
+    """多边形匹配的结果明确时，两种方式挑出的缺口必须相同；返回是否做了比较"""
+    ranked = np.sort(polygon)
+    if len(ranked) >= 2 and ranked[-1] - ranked[-2] <= PICK_MARGIN:
+        return False
+    assert np.argmax(raster) == np.argmax(polygon)
+    return True
+
+
+def test_raster_matcher_matches_polygon_on_shapes():
+    pytest.importorskip('shapely')
+    rng = np.random.default_rng(1)
+    slider = SliderV2.__new__(SliderV2)
+    compared = correct = polygon_correct = 0
+    for _ in range(100):
+        size = int(rng.integers(30, 80))
+        tabs = tuple(rng.integers(0, 2, 4))
+        template = puzzle_mask(size, tabs)
+        # 同形状（略有旋转和缩放）的缺口和若干凸起不同的干扰块
+        candidates = [puzzle_mask(int(size * rng.uniform(0.95, 1.05)), tabs, rng.uniform(-5, 5))]
+        for _ in range(int(rng.integers(2, 5))):
+            decoy = tuple(1 - t if rng.random() < 0.5 else t for t in tabs)
+            if decoy == tabs:
+                decoy = (1 - tabs[0],) + tabs[1:]
+            candidates.append(puzzle_mask(int(size * rng.uniform(0.8, 1.2)), decoy, rng.uniform(-30, 30)))
+        order = rng.permutation(len(candidates))
+        candidates = [candidates[i] for i in order]
+
+        polygon, raster = compare_matchers(slider, template, candidates)
+        compared += assert_same_pick(polygon, raster)
+        gap = int(np.flatnonzero(order == 0)[0])
+        correct += int(np.argmax(raster) == gap)
+        polygon_correct += int(np.argmax(polygon) == gap)
+    assert compared >= 90
+    # 两种方式都应几乎总能挑出真正的缺口（不一致只出现在多边形匹配前两名接近时）
+    assert correct >= 95 and polygon_correct >= 95
+
+
+@pytest.mark.parametrize('name', SAMPLE_IMAGES)
+def test_raster_matcher_matches_polygon_on_samples(model, name):
+    pytest.importorskip('shapely')
+    image = cv2.imread(os.path.join(ROOT, name))
+    boxes, masks = model.predict(image, imgsz=640, lazy_masks=True)[0]
+    masks = LazyMasks.resolve_masks(masks)
+    regions = [i for i, bitmap in enumerate(masks.bitmaps) if single_region(bitmap)]
+    if len(regions) < 3:
+        pytest.skip(f'{name} 上只有 {len(regions)} 个单连通掩膜')
+
+    slider_index = regions[int(np.argmin(boxes[regions, 0]))]
+    others = [i for i in regions if i != slider_index]
+    segments = model.masks_to_segments(masks)
+    polygon = np.array([model.polygon_iou(segments[slider_index], segments[i]) for i in others])
+    raster = model.raster_iou(masks.bitmaps[slider_index], [masks.bitmaps[i] for i in others])
+    assert_same_pick(polygon, raster)
@@ -0,0 +1,76 @@
+"""
+JSON 状态文件的原子写入和合并写入
+"""
+import json
+import os
+
+import pytest
+
+from captcha_recognizer import storage
+from captcha_recognizer.storage import DebouncedWriter, write_json
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_interrupted_dump_keeps_previous_file(tmp_path):
+    path = str(tmp_path / 'state.json')
+    write_json(path, {'version': 1})
+    # 序列化到一半失败：临时文件已写入部分内容
+    with pytest.raises(TypeError):
+        write_json(path, {'items': list(range(10000)), 'bad': object()})
+    assert _read(path) == {'version': 1}
+    assert os.listdir(tmp_path) == ['state.json']
+
+
+def test_interrupted_replace_keeps_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'state.json')
+    write_json(path, {'version': 1})
+
+    def interrupted(src, dst):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(storage.os, 'replace', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        write_json(path, {'version': 2})
+    monkeypatch.undo()
+    assert _read(path) == {'version': 1}
+    assert os.listdir(tmp_path) == ['state.json']
+
+
+def test_debounced_writer_coalesces_and_writes_latest(tmp_path):
+    path = str(tmp_path / 'sub' / 'state.json')
+    state = {'value': 0}
+    snapshots = []
+
+    def snapshot():
+        snapshots.append(dict(state))
+        return dict(state)
+
+    writer = DebouncedWriter(lambda: path, snapshot, delay=60)
+    for value in range(1, 6):
+        state['value'] = value
+        writer.schedule()
+    assert not os.path.exists(path)
+
+    assert writer.flush()
+    assert _read(path) == {'value': 5}
+    assert len(snapshots) == 1
+    # 没有新的变化时不再写入
+    assert writer.flush()
+    assert len(snapshots) == 1
+
+
+def test_debounced_writer_failure_keeps_previous_file(tmp_path):
+    path = str(tmp_path / 'state.json')
+    state = {'value': 1}
+    writer = DebouncedWriter(lambda: path, lambda: dict(state), delay=0)
+    writer.schedule()
+    assert _read(path) == {'value': 1}
+
+    state['value'] = object()
+    assert not writer.flush(force=True)
+    assert _read(path) == {'value': 1}
+    assert os.listdir(tmp_path) == ['state.json']
@@ -0,0 +1,59 @@
+"""
+工作进程池在工作进程卡住时的行为：任务以 WorkerTimeoutError 结束、进程被重建，FallbackModel 回到本进程识别
+"""
+import time
+
+import numpy as np
+import pytest
+
+from captcha_recognizer.workers import FallbackModel, InferencePool, WorkerTimeoutError, _Worker
+
+
+def _stalled_worker(conn, slider_options, session_options):
+    """报告就绪后接收任务但永不返回结果"""
+    conn.send(('ready', None, None))
+    while conn.recv() is not None:
+        time.sleep(3600)
+
+
+class StalledPool(InferencePool):
+    def _spawn(self, index: int) -> _Worker:
+        return _Worker(index, self.slider_options, self.session_options, target=_stalled_worker)
+
+
+class LocalModel:
+    def __init__(self):
+        self.calls = 0
+
+    def identify(self, source, **kwargs):
+        self.calls += 1
+        return [1.0, 2.0, 3.0, 4.0], 0.9
+
+
+@pytest.fixture
+def pool():
+    pool = StalledPool(processes=1, task_timeout=0.5)
+    yield pool
+    pool.shutdown()
+
+
+def test_stalled_worker_times_out_and_is_respawned(pool):
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    future = pool.submit(image)
+    with pytest.raises(WorkerTimeoutError):
+        future.result(timeout=10)
+    # 调用方按 RuntimeError 处理识别失败（刷新重试）
+    assert isinstance(future.exception(), RuntimeError)
+    assert pool.stats()['respawns'] == 1
+
+    # 等待结果的超时先到时同样是 WorkerTimeoutError
+    with pytest.raises(WorkerTimeoutError):
+        pool.identify(image, timeout=0.2)
+
+
+def test_fallback_model_uses_local_model_when_worker_stalls(pool):
+    local = LocalModel()
+    model = FallbackModel(pool, lambda: local)
+    box, conf = model.identify(np.zeros((8, 8, 3), dtype=np.uint8), show=False)
+    assert (box, conf) == ([1.0, 2.0, 3.0, 4.0], 0.9)
+    assert local.calls == 1